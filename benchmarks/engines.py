@@ -0,0 +1,90 @@
+"""
+Benchmark the color engines
+
+Times each engine on the thumbnails themes are generated from, the thumbnail
+is made once per image so only the engine itself is measured.
+
+Usage:
+    python benchmarks/engines.py [--repeat N] [--engines a,b] [images ...]
+
+When no images are given, synthetic wallpapers are created in memory.
+"""
+import argparse
+import random
+import time
+
+from PIL import Image
+
+from kadai import themer
+from kadai.engine.color_thief_engine import TooFewColors
+
+ENGINES = ("vibrance", "hue", "pastel", "pastel_hue", "pillow", "kmeans")
+SYNTHETIC_IMAGE_COUNT = 8
+
+
+def create_synthetic_images():
+    """Create noisy gradients with a random amount of detail"""
+    images = []
+    for seed in range(SYNTHETIC_IMAGE_COUNT):
+        rng = random.Random(seed)
+        size = themer.THUMBNAIL_SIZE
+        gradient = Image.linear_gradient("L").resize(size)
+        noise = Image.effect_noise(size, rng.randint(8, 96))
+        image = Image.merge("RGB", (gradient, noise, gradient.rotate(90)))
+        images.append((f"synthetic-{seed}", image))
+    return images
+
+
+def time_engine(engine_name: str, image: Image.Image, repeat: int, options):
+    """Time making the palette with an engine, None if it failed"""
+    engine = themer.get_engine(engine_name)
+    start = time.perf_counter()
+    try:
+        for _ in range(repeat):
+            engine(image, **options).get_palette()
+    except TooFewColors:
+        return None
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("images", nargs="*", help="images to benchmark with")
+    parser.add_argument("--repeat", type=int, default=5, metavar="N")
+    parser.add_argument(
+        "--engines",
+        type=lambda engines: engines.split(","),
+        default=ENGINES,
+        metavar="a,b",
+        help=f"engines to benchmark, defaults to {','.join(ENGINES)}",
+    )
+    parser.add_argument("--quantizer", default="colorthief", help="colorthief or numpy")
+    args = parser.parse_args()
+
+    if args.images:
+        images = [(path, themer.create_thumbnail(path)) for path in args.images]
+    else:
+        images = create_synthetic_images()
+
+    options = {"quantizer": args.quantizer}
+    totals = dict.fromkeys(args.engines, 0.0)
+
+    print(f"{'image':<24}" + "".join(f"{engine:>14}" for engine in args.engines))
+    for name, image in images:
+        row = f"{name[-24:]:<24}"
+        for engine_name in args.engines:
+            elapsed = time_engine(engine_name, image, args.repeat, options)
+            if elapsed is None:
+                row += f"{'failed':>14}"
+                continue
+            totals[engine_name] += elapsed
+            row += f"{elapsed * 1000:>14.2f}"
+        print(row)
+
+    print(
+        f"{'total (ms)':<24}" + "".join(f"{t * 1000:>14.1f}" for t in totals.values())
+    )
+
+
+if __name__ == "__main__":
+    main()
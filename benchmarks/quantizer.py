@@ -0,0 +1,102 @@
+"""
+Benchmark the median cut quantizers
+
+Compares colorthief's pure python median cut against kadai.engine.mmcq, the
+numpy implementation, on the thumbnails themes are generated from. The swatches
+of both are compared as well, they are expected to be identical.
+
+Usage:
+    python benchmarks/quantizer.py [--repeat N] [--size WxH] [images ...]
+
+When no images are given, synthetic wallpapers are created in memory.
+"""
+import argparse
+import random
+import time
+
+from PIL import Image
+
+from kadai import themer
+from kadai.engine import color_thief_engine, mmcq
+
+QUANTIZERS = {
+    "colorthief": color_thief_engine.get_swatches,
+    "numpy": mmcq.get_swatches,
+}
+SYNTHETIC_IMAGE_COUNT = 8
+
+
+def create_synthetic_images(size):
+    """Create noisy gradients with a random amount of detail"""
+    images = []
+    for seed in range(SYNTHETIC_IMAGE_COUNT):
+        rng = random.Random(seed)
+        gradient = Image.linear_gradient("L").resize(size)
+        noise = Image.effect_noise(size, rng.randint(8, 96))
+        image = Image.merge("RGB", (gradient, noise, gradient.rotate(90)))
+        images.append((f"synthetic-{seed}", image))
+    return images
+
+
+def time_quantizer(quantizer, image: Image.Image, repeat: int):
+    """Time a quantizer, returning the mean seconds and the swatches"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        swatches = quantizer(image, color_count=16, quality=3)
+    return (time.perf_counter() - start) / repeat, swatches
+
+
+def parse_size(size: str):
+    """Parse a WxH size"""
+    width, height = size.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("images", nargs="*", help="images to benchmark with")
+    parser.add_argument("--repeat", type=int, default=3, metavar="N")
+    parser.add_argument(
+        "--size",
+        type=parse_size,
+        default=themer.THUMBNAIL_SIZE,
+        metavar="WxH",
+        help="size of the synthetic images, defaults to the thumbnail size",
+    )
+    args = parser.parse_args()
+
+    if args.images:
+        images = [(path, themer.create_thumbnail(path)) for path in args.images]
+    else:
+        images = create_synthetic_images(args.size)
+
+    totals = dict.fromkeys(QUANTIZERS, 0.0)
+    mismatches = 0
+
+    print(f"{'image':<24}" + "".join(f"{name + ' (ms)':>18}" for name in QUANTIZERS))
+    for name, image in images:
+        results = {
+            quantizer: time_quantizer(function, image, args.repeat)
+            for quantizer, function in QUANTIZERS.items()
+        }
+        for quantizer, (elapsed, _) in results.items():
+            totals[quantizer] += elapsed
+
+        swatches = [result[1] for result in results.values()]
+        identical = all(swatch == swatches[0] for swatch in swatches)
+        mismatches += not identical
+
+        print(
+            f"{name[-24:]:<24}"
+            + "".join(f"{elapsed * 1000:>18.2f}" for elapsed, _ in results.values())
+            + ("" if identical else "  swatches differ")
+        )
+
+    baseline = totals["colorthief"]
+    for quantizer, total in totals.items():
+        print(f"{quantizer}: {total * 1000:.1f}ms total, {baseline / total:.1f}x")
+    print(f"{mismatches} of {len(images)} images with differing swatches")
+
+
+if __name__ == "__main__":
+    main()
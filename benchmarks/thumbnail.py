@@ -0,0 +1,110 @@
+"""
+Benchmark the thumbnail stage of theme generation
+
+Compares the full decode the thumbnail used to be made with against
+kadai.themer.create_thumbnail, reporting the wall time and the peak resident
+memory of each. Every measurement runs in a fresh process so the peak memory
+of one does not hide the other.
+
+Usage:
+    python benchmarks/thumbnail.py [--repeat N] [images ...]
+
+When no images are given, large synthetic JPEG and PNG wallpapers are created
+in a temporary directory.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from PIL import Image
+
+from kadai import themer
+
+SYNTHETIC_SIZES = ((3840, 2160), (7680, 4320))
+
+
+def full_decode_thumbnail(image_path: str) -> Image.Image:
+    """The thumbnail as it was made before reduced resolution decoding"""
+    return (
+        Image.open(image_path)
+        .resize(themer.THUMBNAIL_SIZE, Image.Resampling.NEAREST)
+        .convert("RGB")
+    )
+
+
+METHODS = {
+    "full decode": full_decode_thumbnail,
+    "reduced decode": themer.create_thumbnail,
+}
+
+
+def measure(method: str, image_path: str, repeat: int, queue):
+    """
+    Time a method in this process and report the peak rss in KiB, no method
+    measures an idle process
+    """
+    elapsed = 0.0
+    if method is not None:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            METHODS[method](image_path)
+        elapsed = (time.perf_counter() - start) / repeat
+
+    queue.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def run_isolated(method: str, image_path: str, repeat: int):
+    """Run a measurement in a fresh process"""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=measure, args=(method, image_path, repeat, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def create_synthetic_images(directory: str):
+    """Create noisy wallpapers that are expensive to decode"""
+    images = []
+    for width, height in SYNTHETIC_SIZES:
+        image = Image.effect_mandelbrot((width, height), (-2, -1.2, 1, 1.2), 100)
+        image = Image.merge(
+            "RGB",
+            (image, Image.effect_noise((width, height), 64), image.rotate(180)),
+        )
+        for extension in ("jpg", "png"):
+            image_path = os.path.join(directory, f"{width}x{height}.{extension}")
+            image.save(image_path)
+            images.append(image_path)
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("images", nargs="*", help="images to benchmark with")
+    parser.add_argument("--repeat", type=int, default=5, metavar="N")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        images = args.images or create_synthetic_images(directory)
+        _, baseline_rss = run_isolated(None, images[0], args.repeat)
+
+        print(f"{'image':<24}{'method':<16}{'time (ms)':>12}{'peak rss (MiB)':>16}")
+        for image_path in images:
+            for method in METHODS:
+                elapsed, peak_rss = run_isolated(method, image_path, args.repeat)
+                print(
+                    f"{os.path.basename(image_path):<24}{method:<16}"
+                    f"{elapsed * 1000:>12.1f}"
+                    f"{(peak_rss - baseline_rss) / 1024:>16.1f}"
+                )
+
+    print("peak rss is relative to an idle worker process")
+
+
+if __name__ == "__main__":
+    main()
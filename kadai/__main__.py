@@ -20,11 +20,20 @@ import sys
 import os.path
 import logging
 import shutil
+from typing import Dict
 
 from kadai import log
 from kadai.config_handler import ConfigHandler
 from kadai.utils import file_utils
-from kadai.themer import Themer
+from kadai.themer import ALL_ENGINES, Themer
+from kadai.client import send_request
+from kadai.daemon import (
+    DaemonAlreadyRunning,
+    InvalidLastImage,
+    configure_themer,
+    run_daemon,
+    run_request,
+)
 
 WARRANTY = """Copyright (C) 2021 slapelachie
 
@@ -39,10 +48,6 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 GNU General Public License for more details."""
 
 
-class InvalidLastImage(Exception):
-    """Raised when the last image used does not exist or is invalid"""
-
-
 def get_args():
     """Get the args parsed from the command line and does arg handling stuff"""
 
@@ -67,7 +72,11 @@ def get_args():
     arg.add_argument(
         "--clear", action="store_true", help="Clear all data relating to KADAI"
     )
-    arg.add_argument("--backend", metavar="name", help="vibrance/hue/pastel/pastel_hue")
+    arg.add_argument(
+        "--backend",
+        metavar="name",
+        help="vibrance/hue/pastel/pastel_hue/pillow/kmeans, or all with -g",
+    )
     arg.add_argument(
         "--progress", action="store_true", help="Show progress of theme generation"
     )
@@ -75,6 +84,39 @@ def get_args():
         "--warranty", action="store_true", help="Show the programs warranty"
     )
     arg.add_argument("--light", action="store_true", help="Enable light theme")
+    arg.add_argument(
+        "-r",
+        "--recursive",
+        action="store_true",
+        help="Include images in subdirectories of the input directory",
+    )
+    arg.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        metavar="N",
+        help="Amount of processes used to generate themes (0 for all cores)",
+    )
+    arg.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Run in the background, other invocations are handed to it",
+    )
+    arg.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Run in this process even when a daemon is running",
+    )
+    arg.add_argument(
+        "--watch",
+        metavar='"path/to/dir"',
+        help="Generate themes for images as they are added to a directory",
+    )
+    arg.add_argument(
+        "--quantizer",
+        choices=("colorthief", "numpy"),
+        help="Median cut implementation, numpy is faster with identical colors",
+    )
 
     return arg
 
@@ -93,6 +135,8 @@ def parse_args(parser: argparse.ArgumentParser, config_handler: ConfigHandler):
     logger = log.setup_logger(
         __name__, log.defaultLoggingHandler(), level=logging.WARNING
     )
+    if args.verbose:
+        log.set_level(logging.DEBUG)
 
     if len(sys.argv) <= 1:
         parser.print_help()
@@ -118,81 +162,119 @@ def parse_args(parser: argparse.ArgumentParser, config_handler: ConfigHandler):
         config_handler.load_config(args.config)
         config = config_handler.get_config()
 
-    if args.input:
-        themer = Themer(
-            args.input,
-            config=config,
-        )
-
-        if args.override:
-            themer.set_override(args.override)
-
-        if args.backend:
-            themer.set_engine_name(args.backend)
-
-        if args.progress:
-            themer.set_display_progress(args.progress)
-
-        if args.light:
-            themer.set_use_light_theme(args.light)
+    if args.backend == ALL_ENGINES and not (args.generate or args.watch):
+        logger.critical("The all backend can only be used to generate themes!")
+        sys.exit(1)
 
-        if args.theme:
-            themer.set_custom_theme_path(args.theme)
+    if args.daemon:
+        if args.config:
+            config_handler.set_config_file_path(args.config)
+        try:
+            run_daemon(config_handler)
+        except DaemonAlreadyRunning as error:
+            logger.critical(error)
+            sys.exit(1)
+        sys.exit(0)
 
-        if args.generate:
-            themer.generate()
-        else:
-            update_theme(themer)
+    if args.watch:
+        try:
+            watch_themer(args, config)
+        except NotADirectoryError as error:
+            logger.critical(error)
+            sys.exit(1)
+        sys.exit(0)
 
+    if args.input:
+        request = {
+            "action": "generate" if args.generate else "update",
+            "image_path": os.path.abspath(os.path.expanduser(args.input)),
+        }
     elif args.preserve:
-        last_image = os.path.join(config["data_directory"], "image")
+        request = {"action": "preserve"}
+    else:
+        logger.critical("No options specified. Exiting...")
+        sys.exit(1)
+
+    request["options"] = get_request_options(args)
 
-        if file_utils.check_if_image(last_image):
-            themer = Themer(
-                os.readlink(last_image),
-                config=config,
-            )
+    # The daemon has its own config and can not show the progress or its logs
+    if not (args.no_daemon or args.config or args.progress or args.verbose):
+        response = send_request(request)
+        if response is not None:
+            if response["status"] != "ok":
+                logger.critical(response["message"])
+                sys.exit(1)
+            return
 
-            if args.override:
-                themer.set_override(args.override)
+    themer = Themer(request.get("image_path", config["data_directory"]), config=config)
+    try:
+        run_request(themer, request, config)
+    except InvalidLastImage as error:
+        logger.critical(error)
+        sys.exit(1)
+    finally:
+        themer.close()
 
-            if args.backend:
-                themer.set_engine_name(args.backend)
 
-            if args.progress:
-                themer.set_display_progress(args.progress)
+def watch_themer(args: argparse.Namespace, config: Dict):
+    """
+    Watches the directory given on the command line, generating themes for
+    images as they are added to it
 
-            if args.light:
-                themer.set_use_light_theme(args.light)
+    Arguments:
+        args (argparse.Namespace): the parsed arguments
+        config (Dict): the config
 
-            update_theme(themer)
-        else:
-            logger.critical("Last image invalid or does not exist!")
-            sys.exit(1)
+    Raises:
+        (NotADirectoryError): when the path given is not a directory
+    """
+    # The watcher is only imported here, it is not needed by the other options
+    from kadai.watcher import run_watcher  # pylint: disable=import-outside-toplevel
 
-    else:
-        logger.critical("No options specified. Exiting...")
-        sys.exit(1)
+    themer = Themer(os.path.abspath(os.path.expanduser(args.watch)), config=config)
+    configure_themer(themer, get_request_options(args), config)
+    try:
+        run_watcher(themer)
+    finally:
+        themer.close()
 
 
-def update_theme(themer: Themer):
+def get_request_options(args: argparse.Namespace) -> Dict:
     """
-    Updates the theme, if the theme was not generate it, do so
+    Gets the themer options set on the command line
 
     Arguments:
-        themer (kadai.Themer): the themer to update from
+        args (argparse.Namespace): the parsed arguments
+
+    Returns:
+        (Dict): the options of the request, see kadai.daemon.run_request
     """
-    try:
-        themer.update()
-    except file_utils.NoPreGenThemeError:
-        themer.generate()
-        themer.update()
+    options = {}
+    if args.override:
+        options["override"] = True
+    if args.backend:
+        options["engine_name"] = args.backend
+    if args.progress:
+        options["display_progress"] = True
+    if args.light:
+        options["use_light_theme"] = True
+    if args.jobs is not None:
+        options["jobs"] = args.jobs
+    if args.recursive:
+        options["recursive"] = True
+    if args.quantizer:
+        options["quantizer"] = args.quantizer
+    if args.theme:
+        options["custom_theme_path"] = os.path.abspath(os.path.expanduser(args.theme))
+
+    return options
 
 
 def main():
     """The main function that gets called"""
     config_object = ConfigHandler()
-    config_object.save_config()
+    if config_object.has_unsaved_changes():
+        config_object.save_config()
     config = config_object.get_config()
 
     # Create required directories
@@ -0,0 +1,113 @@
+"""
+Client of the background daemon, kept free of heavy imports so handing a
+request to the daemon is fast
+
+kadai - Simple wallpaper manager for tiling window managers.
+Copyright (C) 2020  slapelachie
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+Find the full license in the root of this project
+"""
+import json
+import os
+import socket
+import tempfile
+from typing import Dict, Optional
+
+SOCKET_NAME = "kadai.sock"
+# The seconds the client waits to connect before running the request itself
+CONNECT_TIMEOUT = 0.5
+
+
+def get_socket_path() -> str:
+    """
+    Gets the socket the daemon listens on, within XDG_RUNTIME_DIR or a
+    directory of the user in the temporary directory when it is not set
+
+    Returns:
+        (str): the path to the socket
+    """
+    runtime_directory = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_directory:
+        return os.path.join(runtime_directory, "kadai", SOCKET_NAME)
+
+    return os.path.join(tempfile.gettempdir(), f"kadai-{os.getuid()}", SOCKET_NAME)
+
+
+def is_listening(socket_path: str) -> bool:
+    """
+    Checks if anything is listening on a socket
+
+    Arguments:
+        socket_path (str): the path to the socket
+
+    Returns:
+        (bool): whether a connection could be made
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(CONNECT_TIMEOUT)
+        try:
+            client.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+def send_request(request: Dict, socket_path: str = None) -> Optional[Dict]:
+    """
+    Sends a request to the daemon and waits for it to be run
+
+    Arguments:
+        request (Dict): the request, see kadai.daemon.run_request
+        socket_path (str): the socket of the daemon, defaults to get_socket_path
+
+    Returns:
+        (Optional[Dict]): the response, None when no daemon is running. When
+                          the daemon went away after the request was sent it
+                          may have run, so an error is returned instead
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(CONNECT_TIMEOUT)
+        try:
+            client.connect(socket_path or get_socket_path())
+        except OSError:
+            return None
+
+        # Generating themes can take a long time
+        client.settimeout(None)
+        try:
+            client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            with client.makefile("rb") as response_file:
+                line = response_file.readline()
+        except OSError as error:
+            return get_connection_error(str(error))
+
+    if not line:
+        return get_connection_error("The daemon closed the connection")
+    return json.loads(line)
+
+
+def get_connection_error(message: str) -> Dict:
+    """
+    Makes the response of a request the daemon did not respond to
+
+    Arguments:
+        message (str): why there was no response
+
+    Returns:
+        (Dict): the error response, as the daemon would send it
+    """
+    return {
+        "status": "error",
+        "error": "ConnectionError",
+        "message": f"No response from the daemon: {message}",
+    }
@@ -20,6 +20,7 @@ Find the full license in the root of this project
 import copy
 import os
 import json
+from typing import Optional
 
 from kadai.utils import file_utils
 
@@ -34,6 +35,15 @@ DEFAULT_CONFIG = {
     "progress": False,
     "debug": False,
     "use_custom_theme": False,
+    "jobs": 0,
+    "hash_algorithm": "blake2b",
+    "recursive": False,
+    "quantizer": "colorthief",
+    "kmeans_iterations": 50,
+    "kmeans_sample_size": 2048,
+    "theme_store": "sqlite",
+    "hook_timeout": 30,
+    "prerender": False,
 }
 
 
@@ -46,7 +56,8 @@ class ConfigHandler:
             file_utils.get_config_path(), "config.json"
         )
         self._config_file_out_path = self._config_file_path
-        self._config = parse_config(self._config_file_path)
+        self._file_config = read_config_file(self._config_file_path)
+        self._config = parse_config(self._config_file_path, self._file_config)
 
     def set_config_file_path(self, path: str):
         """
@@ -56,7 +67,8 @@ class ConfigHandler:
             path(str): the path to the config file
         """
         self._config_file_path = path
-        self._config = parse_config(self._config_file_path)
+        self._file_config = read_config_file(self._config_file_path)
+        self._config = parse_config(self._config_file_path, self._file_config)
 
     def get_config_file_path(self) -> str:
         """
@@ -103,11 +115,20 @@ class ConfigHandler:
         """
         return self._config
 
+    def has_unsaved_changes(self) -> bool:
+        """
+        Checks if the current config differs from the config file it was read
+        from, which is also the case when the config file does not exist, such
+        as when a key was added to the default config since it was written
+
+        Returns:
+            (bool): whether the config needs to be saved
+        """
+        return self._config != self._file_config
+
     def save_config(self):
         """Saves the current config to the config_file_out_path"""
-        config_path = os.path.dirname(self._config_file_out_path)
-        if not os.path.isdir(config_path):
-            os.mkdir(config_path)
+        os.makedirs(os.path.dirname(self._config_file_out_path), exist_ok=True)
 
         with open(self._config_file_out_path, "wb") as config_file:
             config_file.write(
@@ -116,35 +137,55 @@ class ConfigHandler:
                 )
             )
 
+        if self._config_file_out_path == self._config_file_path:
+            self._file_config = copy.deepcopy(self._config)
+
     def load_config(self, config_file_path: str):
         """
-        Loads and overrides the config from a given path
+        Loads and overrides the config from a given path, keys missing from
+        the config file are taken from the default config
 
         Arguments:
             config_file_path (str): the path to the config file
         """
         with open(config_file_path, "rb") as config_file:
-            self._config = json.load(config_file)
+            self._config = parse_config(config_file_path, json.load(config_file))
 
 
-def parse_config(config_file_path: str) -> dict:
+def parse_config(config_file_path: str, loaded_config: dict = None) -> dict:
     """
     Parses the config by returning the config at the path, if it doesnt exist
     it will return the default config
 
     Arguments:
         config_file_path (str): the path to the config file
+        loaded_config (dict): the contents of the config file when they were
+                              already read, the file is not read again
 
     Returns:
         (dict): the config file
     """
     config = copy.copy(DEFAULT_CONFIG)
 
+    if loaded_config is None:
+        loaded_config = read_config_file(config_file_path)
+    config.update(loaded_config or {})
+
+    return config
+
+
+def read_config_file(config_file_path: str) -> Optional[dict]:
+    """
+    Reads the config file as it is, without the defaults
+
+    Arguments:
+        config_file_path (str): the path to the config file
+
+    Returns:
+        (Optional[dict]): the config file, None when it does not exist
+    """
     try:
         with open(config_file_path, "rb") as config_file:
-            loaded_config = json.load(config_file)
-            config.update(loaded_config)
+            return json.load(config_file)
     except IOError:
-        pass
-
-    return config
+        return None
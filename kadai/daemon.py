@@ -0,0 +1,365 @@
+"""
+Background daemon keeping the themer warm, and the client reaching it
+
+kadai - Simple wallpaper manager for tiling window managers.
+Copyright (C) 2020  slapelachie
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+Find the full license in the root of this project
+"""
+import json
+import logging
+import os
+import signal
+import socketserver
+from concurrent.futures import Executor
+from typing import Dict, Optional
+
+from kadai import log
+from kadai.client import get_socket_path, is_listening
+from kadai.config_handler import ConfigHandler
+from kadai.themer import Themer
+from kadai.utils import file_utils
+
+logger = log.setup_logger(
+    __name__ + ".default", log.defaultLoggingHandler(), level=logging.WARNING
+)
+
+
+class InvalidLastImage(Exception):
+    """Raised when the last image used does not exist or is invalid"""
+
+
+class DaemonAlreadyRunning(Exception):
+    """Raised when a daemon is already listening on the socket"""
+
+
+class Daemon:
+    """
+    Serves requests over a unix socket, keeping the config, the themer with
+    its caches and compiled templates, and a process pool in memory between
+    them. Requests are handled one at a time
+    """
+
+    def __init__(
+        self,
+        socket_path: str = None,
+        config_handler: ConfigHandler = None,
+        **kwargs,
+    ):
+        """
+        Arguments:
+            socket_path (str): the socket to listen on, defaults to
+                               get_socket_path
+            config_handler (ConfigHandler): the config, it is read again when
+                                            the config file changes
+            **kwargs: extra keyword arguments the themer is created with
+        """
+        self._socket_path = socket_path or get_socket_path()
+        self._config_handler = config_handler or ConfigHandler()
+        self._config_mtime = self._get_config_mtime()
+        self._themer_kwargs = kwargs
+        self._themer = None
+        self._executor = None
+        self._executor_jobs = None
+        self._server = None
+
+    def get_socket_path(self) -> str:
+        """
+        Gets the socket the daemon listens on
+
+        Returns:
+            (str): the path to the socket
+        """
+        return self._socket_path
+
+    def get_themer(self) -> Themer:
+        """
+        Gets the themer requests are run with, it is created again when the
+        config file changed since the last request and its caches are loaded
+        again when they were saved by another process
+
+        Returns:
+            (Themer): the themer
+        """
+        config_mtime = self._get_config_mtime()
+        if config_mtime != self._config_mtime:
+            logger.info("Config changed, reloading")
+            self._config_handler.set_config_file_path(
+                self._config_handler.get_config_file_path()
+            )
+            self._config_mtime = config_mtime
+            self._close_themer()
+
+        if self._themer is None:
+            config = self._config_handler.get_config()
+            self._themer = Themer(
+                config["data_directory"],
+                config=config,
+                **self._themer_kwargs,
+            )
+        else:
+            # Generating outside of the daemon saves the caches too
+            self._themer.reload_caches()
+
+        return self._themer
+
+    def get_executor(self, jobs: int) -> Optional[Executor]:
+        """
+        Gets the process pool themes are generated on. It is started again
+        when the amount of jobs changed, or when it broke, such as when a
+        worker was killed
+
+        Arguments:
+            jobs (int): the amount of processes, 0 uses every available core
+
+        Returns:
+            (Optional[Executor]): the process pool, None when the themes are
+                                  generated in process
+        """
+        # pylint: disable=import-outside-toplevel
+        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
+
+        jobs = jobs or os.cpu_count() or 1
+        if jobs <= 1:
+            return None
+
+        if self._executor is not None:
+            try:
+                if jobs == self._executor_jobs:
+                    self._executor.submit(os.getpid)
+                    return self._executor
+                logger.info("Restarting the process pool with %s jobs", jobs)
+            except BrokenProcessPool:
+                logger.warning("Process pool broke, restarting it")
+            self._executor.shutdown(wait=False)
+
+        self._executor = ProcessPoolExecutor(max_workers=jobs)
+        self._executor_jobs = jobs
+        # Start the workers now rather than on the first generate
+        for _ in range(jobs):
+            self._executor.submit(os.getpid)
+
+        return self._executor
+
+    def handle(self, request: Dict) -> Dict:
+        """
+        Runs a request
+
+        Arguments:
+            request (Dict): the request, see run_request
+
+        Returns:
+            (Dict): the response, the status is 'ok' or 'error' with the type
+                    and message of the error
+        """
+        try:
+            themer = self.get_themer()
+            config = self._config_handler.get_config()
+            themer.set_executor(
+                self.get_executor(
+                    request.get("options", {}).get("jobs", config["jobs"])
+                )
+            )
+            run_request(themer, request, config)
+        except Exception as exception:  # pylint: disable=broad-except
+            logger.error("Request %s failed: %s", request, exception)
+            return {
+                "status": "error",
+                "error": type(exception).__name__,
+                "message": str(exception),
+            }
+
+        return {"status": "ok"}
+
+    def serve_forever(self):
+        """
+        Listens for requests until shutdown is called
+
+        Raises:
+            (DaemonAlreadyRunning): when another daemon is listening
+        """
+        socket_directory = os.path.dirname(self._socket_path)
+        os.makedirs(socket_directory, mode=0o700, exist_ok=True)
+        if os.stat(socket_directory).st_uid != os.getuid():
+            raise PermissionError(f"{socket_directory} is not owned by this user")
+
+        if os.path.exists(self._socket_path):
+            if is_listening(self._socket_path):
+                raise DaemonAlreadyRunning(
+                    f"A daemon is already listening on {self._socket_path}"
+                )
+            os.remove(self._socket_path)
+
+        self._close_themer()
+        self.get_themer()
+        self.get_executor(self._config_handler.get_config()["jobs"])
+
+        self._server = DaemonServer(self._socket_path, self)
+        logger.info("Listening on %s", self._socket_path)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            try:
+                os.remove(self._socket_path)
+            except FileNotFoundError:
+                pass
+            self._close_themer()
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def shutdown(self):
+        """Stops serve_forever, must be called from another thread"""
+        if self._server is not None:
+            self._server.shutdown()
+
+    def _close_themer(self):
+        if self._themer is not None:
+            self._themer.close()
+            self._themer = None
+
+    def _get_config_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self._config_handler.get_config_file_path()).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+
+class DaemonServer(socketserver.UnixStreamServer):
+    """The socket server of a daemon"""
+
+    def __init__(self, socket_path: str, daemon: Daemon):
+        """
+        Arguments:
+            socket_path (str): the socket to listen on
+            daemon (Daemon): the daemon handling the requests
+        """
+        self.daemon = daemon
+        super().__init__(socket_path, DaemonRequestHandler)
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """Reads a request as a line of json and writes the response the same way"""
+
+    def handle(self):
+        line = self.rfile.readline()
+        # Nothing is sent when only checking if the daemon is listening
+        if not line:
+            return
+
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            response = {"status": "error", "error": "ValueError", "message": str(error)}
+        else:
+            response = self.server.daemon.handle(request)
+
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+def run_daemon(config_handler: ConfigHandler = None):
+    """
+    Runs a daemon in the foreground until it is interrupted or terminated
+
+    Arguments:
+        config_handler (ConfigHandler): the config of the daemon
+    """
+
+    def terminate(*_):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        Daemon(config_handler=config_handler).serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def run_request(themer: Themer, request: Dict, config: Dict):
+    """
+    Runs a request with a themer, the same whether it runs in the daemon or in
+    process. A request is of the form
+
+    {
+        "action": "generate", "update" or "preserve",
+        "image_path": "/path/to/image/or/directory",
+        "options": {"engine_name": "hue", ...}
+    }
+
+    where the options are those set on the command line, the rest come from
+    the config
+
+    Arguments:
+        themer (Themer): the themer to run the request with
+        request (Dict): the request
+        config (Dict): the config
+
+    Raises:
+        (InvalidLastImage): when preserving and the last image is invalid
+    """
+    configure_themer(themer, request.get("options", {}), config)
+
+    if request["action"] == "preserve":
+        last_image = os.path.join(config["data_directory"], "image")
+        # The image was verified when it was set, a changed file has no theme
+        # under its new hash and is verified again when it is generated
+        if not os.path.isfile(last_image):
+            raise InvalidLastImage("Last image invalid or does not exist!")
+        themer.set_image_path(os.readlink(last_image))
+    else:
+        themer.set_image_path(request["image_path"])
+
+    if request["action"] == "generate":
+        themer.generate()
+    else:
+        update_theme(themer)
+
+
+def configure_themer(themer: Themer, options: Dict, config: Dict):
+    """
+    Sets the options of a themer, those not given are taken from the config
+
+    Arguments:
+        themer (Themer): the themer to configure
+        options (Dict): the options set on the command line, see run_request
+        config (Dict): the config
+    """
+    themer.set_override(options.get("override", False))
+    themer.set_engine_name(options.get("engine_name", config["engine"]))
+    themer.set_display_progress(options.get("display_progress", config["progress"]))
+    themer.set_use_light_theme(options.get("use_light_theme", config["light"]))
+    themer.set_jobs(options.get("jobs", config["jobs"]))
+    themer.set_recursive(options.get("recursive", config["recursive"]))
+    themer.set_quantizer(options.get("quantizer", config["quantizer"]))
+    themer.set_custom_theme_path(
+        options.get(
+            "custom_theme_path",
+            config["custom_theme_path"] if config["use_custom_theme"] else None,
+        )
+    )
+
+
+def update_theme(themer: Themer):
+    """
+    Updates the theme, if the theme was not generate it, do so
+
+    Arguments:
+        themer (kadai.Themer): the themer to update from
+    """
+    try:
+        themer.update()
+    except file_utils.NoPreGenThemeError:
+        themer.generate()
+        themer.update()
@@ -4,6 +4,8 @@ from kadai.engine.vibrance import VibranceEngine
 from kadai.engine.hue import HueEngine
 from kadai.engine.pastel import PastelEngine
 from kadai.engine.pastel import PastelHueEngine
+from kadai.engine.pillow_engine import PillowEngine
+from kadai.engine.kmeans import KMeansEngine
 
 """
 kadai - Simple wallpaper manager for tiling window managers.
@@ -16,21 +16,69 @@ GNU General Public License for more details.
 
 Find the full license in the root of this project
 """
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple, Union
+from PIL import Image
+
 from kadai.utils import color_utils
 
 
 class BaseEngine:
     """The base engine for generating colors"""
 
-    def __init__(self, image_path: str):
+    def __init__(self, image: Union[str, Image.Image, bytes], **kwargs):
         """
         Arguments:
-            image_path (str): The path to the image
+            image (Union[str, Image.Image, bytes]): The path to the image, an
+                already loaded image or a buffer of packed rgb pixels
+            **kwargs: engine specific options, unknown options are ignored
         """
-        self._image_path = image_path
+        self._image = image
+        self._options = kwargs
         self._colors = None
 
+    @classmethod
+    def get_swatch_key(cls, options: Dict) -> Optional[str]:
+        """
+        Gets the name of the quantize step of the engine, engines with the same
+        key produce the same swatches from an image so they can be shared and
+        cached instead of decoding the image again
+
+        Arguments:
+            options (Dict): the keyword arguments the engine is given
+
+        Returns:
+            (Optional[str]): the key, None when the engine has no quantize step
+                that can be reused
+        """
+        return None
+
+    @classmethod
+    def quantize(
+        cls, image: Union[str, Image.Image, bytes], **kwargs
+    ) -> List[Tuple[Tuple[int], int]]:
+        """
+        Quantize an image the way the engine does, only engines with a swatch
+        key need to implement this
+
+        Arguments:
+            image (Union[str, Image.Image, bytes]): the image to quantize
+            **kwargs: the engine specific options
+
+        Returns:
+            (List[Tuple[Tuple[int], int]]): the rgb colors with the amount of
+                pixels of each
+        """
+        raise NotImplementedError
+
+    def get_image(self) -> Image.Image:
+        """
+        Gets the image the engine was given as a loaded image
+
+        Returns:
+            (Image.Image): the image
+        """
+        return load_image(self._image)
+
     def generate(self) -> List[Tuple[int]]:
         """
         Generates a selection of 8 colors from an image
@@ -67,3 +115,23 @@ class BaseEngine:
             self._colors, light_color_values, light_color_saturations
         )
         return {"dark": dark_colors, "light": light_colors}
+
+
+def load_image(image: Union[str, Image.Image, bytes]) -> Image.Image:
+    """
+    Load an image from a path, an image or a buffer of packed rgb pixels, the
+    buffer is loaded as a single row of pixels as only the colors are needed
+
+    Arguments:
+        image (Union[str, Image.Image, bytes]): the image to load
+
+    Returns:
+        (Image.Image): the loaded image
+    """
+    if isinstance(image, Image.Image):
+        return image
+
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return Image.frombuffer("RGB", (len(image) // 3, 1), image, "raw", "RGB", 0, 1)
+
+    return Image.open(image)
@@ -16,10 +16,12 @@ GNU General Public License for more details.
 
 Find the full license in the root of this project
 """
-from typing import List, Tuple
-from colorthief import ColorThief
+from typing import Dict, List, Tuple, Union
+from colorthief import MMCQ
+from PIL import Image
 
 from kadai.engine import BaseEngine
+from kadai.engine.base_engine import load_image
 from kadai.utils import color_utils
 
 
@@ -30,14 +32,58 @@ class TooFewColors(Exception):
 class ColorThiefEngine(BaseEngine):
     """The base engine for generating colors from colorthief"""
 
-    def __init__(self, image_path: str) -> None:
-        super().__init__(image_path)
+    def __init__(self, image: Union[str, Image.Image, bytes], **kwargs) -> None:
+        """
+        Arguments:
+            image (Union[str, Image.Image, bytes]): The path to the image, an
+                already loaded image or a buffer of packed rgb pixels
+            **quantizer (str): the median cut implementation, 'colorthief' or
+                               'numpy', both produce the same colors
+            **swatches (List[Tuple[Tuple[int], int]]): the swatches of the image
+                from another engine with the same swatch key, the image is not
+                quantized again when given and may be None
+        """
+        super().__init__(image, **kwargs)
+        swatches = self._options.get("swatches")
+        self._swatches = swatches if swatches is not None else self._quantize()
         self._colors = self.generate()
 
+    def get_swatches(self) -> List[Tuple[Tuple[int], int]]:
+        """
+        Gets the quantized colors of the image
+
+        Returns:
+            (List[Tuple[Tuple[int], int]]): the rgb color of each color box with
+                the amount of pixels within it, in palette order
+        """
+        return self._swatches
+
     def generate(self) -> List[Tuple[int]]:
         raw_colors = self._gen_colors()
         return raw_colors[:7]
 
+    @classmethod
+    def get_swatch_key(cls, options: Dict) -> str:
+        # Both quantizers produce the same colors
+        return "mmcq"
+
+    @classmethod
+    def quantize(
+        cls, image: Union[str, Image.Image, bytes], **kwargs
+    ) -> List[Tuple[Tuple[int], int]]:
+        quantizer = get_quantizer(kwargs.get("quantizer", "colorthief"))
+        return quantizer(load_image(image), color_count=16, quality=3)
+
+    def _quantize(self) -> List[Tuple[Tuple[int], int]]:
+        """
+        Quantize the image once, everything else is derived from the result
+
+        Returns:
+            (List[Tuple[Tuple[int], int]]): the rgb color of each color box with
+                the amount of pixels within it, in palette order
+        """
+        return self.quantize(self.get_image(), **self._options)
+
     def _gen_colors(self) -> List[Tuple[int]]:
         """
         Create a list of colors, max of 16 and min of 8
@@ -45,8 +91,7 @@ class ColorThiefEngine(BaseEngine):
         Returns:
             (List[Tuple[int]]): the raw colors
         """
-        color_cmd = ColorThief(self._image_path).get_palette
-        raw_colors = color_cmd(color_count=16, quality=3)
+        raw_colors = [color for color, _ in self._swatches]
 
         if len(raw_colors) <= 8:
             raise TooFewColors("Not enough colors were generated")
@@ -54,8 +99,93 @@ class ColorThiefEngine(BaseEngine):
         return raw_colors
 
     def get_dominant_color(self):
-        color_cmd = ColorThief(self._image_path).get_palette
-        raw_colors = color_cmd(color_count=2, quality=3)
+        dominant_color = max(self._swatches, key=lambda swatch: swatch[1])[0]
         return color_utils.hsv_to_rgb(
-            color_utils.change_hsv_value(color_utils.rgb_to_hsv(raw_colors[0]), 0.7)
+            color_utils.change_hsv_value(color_utils.rgb_to_hsv(dominant_color), 0.7)
+        )
+
+
+def get_quantizer(quantizer_name: str):
+    """
+    Get the median cut implementation from the name given
+
+    Arguments:
+        quantizer_name (str): 'colorthief' for the pure python implementation or
+                              'numpy' for the vectorized one
+
+    Returns:
+        (Callable): a function taking the image, color count and quality and
+                    returning the swatches
+    """
+    # pylint: disable=import-outside-toplevel
+    if quantizer_name == "numpy":
+        from kadai.engine import mmcq
+
+        return mmcq.get_swatches
+
+    if quantizer_name != "colorthief":
+        raise ValueError(f"Unknown quantizer '{quantizer_name}'")
+
+    return get_swatches
+
+
+def get_image_pixels(image: Image.Image, quality: int = 1) -> List[Tuple[int]]:
+    """
+    Get the pixels of an image that should be considered when quantizing, the
+    same as colorthief, mostly transparent and white pixels are skipped
+
+    Arguments:
+        image (Image.Image): the image to get the pixels from
+        quality (int): only every nth pixel is used, 1 uses every pixel
+
+    Returns:
+        (List[Tuple[int]]): the rgb pixels
+    """
+    pixels = image.convert("RGBA").tobytes()
+    step = 4 * quality
+    return [
+        (r, g, b)
+        for r, g, b, a in zip(
+            pixels[0::step], pixels[1::step], pixels[2::step], pixels[3::step]
         )
+        if a >= 125 and not (r > 250 and g > 250 and b > 250)
+    ]
+
+
+def get_swatches(
+    image: Image.Image, color_count: int = 10, quality: int = 10
+) -> List[Tuple[Tuple[int], int]]:
+    """
+    Quantize an in memory image using the median cut algorithm, equivalent to
+    colorthief's ColorThief.get_palette but keeping the pixel count of each box
+
+    Arguments:
+        image (Image.Image): the image to quantize
+        color_count (int): the maximum amount of colors
+        quality (int): only every nth pixel is used, 1 uses every pixel
+
+    Returns:
+        (List[Tuple[Tuple[int], int]]): the rgb color of each box with the
+            amount of pixels within it, in palette order
+    """
+    cmap = MMCQ.quantize(get_image_pixels(image, quality), color_count)
+    return [(vbox["color"], vbox["vbox"].count) for vbox in cmap.vboxes.contents]
+
+
+def get_palette(
+    image: Image.Image, color_count: int = 10, quality: int = 10
+) -> List[Tuple[int]]:
+    """
+    Build a color palette from an in memory image using the median cut
+    algorithm, equivalent to colorthief's ColorThief.get_palette without
+    needing the image to be on disk
+
+    Arguments:
+        image (Image.Image): the image to get the palette from
+        color_count (int): the maximum amount of colors in the palette
+        quality (int): only every nth pixel is used, 1 uses every pixel
+
+    Returns:
+        (List[Tuple[int]]): the rgb colors of the palette
+    """
+    return [color for color, _ in get_swatches(image, color_count, quality)]
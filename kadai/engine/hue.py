@@ -78,7 +78,7 @@ def shift_hues_distance(colors: List[Tuple[int]], distance: float) -> List[Tuple
         elif new_hue < 0:
             new_hue = new_hue + 1
 
-        new_colors.append(color_utils.change_rgb_hue(color, new_hue))
+        new_colors.append(color_utils.hsv_to_rgb((new_hue, *hsv_color[1:])))
     return new_colors
 
 
@@ -94,9 +94,8 @@ def get_min_distance_hues(color: Tuple[int]) -> float:
     """
     distances = []
     distances_positive = []
+    hsv_color = color_utils.rgb_to_hsv(color)
     for color_hue in COLOR_HUES:
-        hsv_color = color_utils.rgb_to_hsv(color)
-
         distance = color_hue - (hsv_color[0] * 360)
         distances.append(distance)
         distances_positive.append(abs(distance))
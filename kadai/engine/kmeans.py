@@ -0,0 +1,255 @@
+"""
+Mini-batch k-means engine
+
+kadai - Simple wallpaper manager for tiling window managers.
+Copyright (C) 2020  slapelachie
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+Find the full license in the root of this project
+"""
+from typing import Dict, List, Tuple, Union
+import numpy as np
+from PIL import Image
+
+from kadai.engine import BaseEngine
+from kadai.engine.base_engine import load_image
+from kadai.engine.color_thief_engine import TooFewColors
+from kadai.engine.mmcq import get_pixels
+from kadai.engine.vibrance import sort_colors
+from kadai.utils import color_utils
+
+CLUSTER_COUNT = 16
+BATCH_SIZE = 256
+DEFAULT_ITERATIONS = 50
+DEFAULT_SAMPLE_SIZE = 2048
+# Stop early once no center moves further than this within an iteration
+CONVERGENCE_DISTANCE = 0.5
+SEED = 0
+
+
+class KMeansEngine(BaseEngine):
+    """
+    Engine that clusters a sample of the pixels with mini-batch k-means, the
+    work done per image is bounded by the sample size and iteration cap
+    """
+
+    def __init__(self, image: Union[str, Image.Image, bytes], **kwargs) -> None:
+        """
+        Arguments:
+            image (Union[str, Image.Image, bytes]): The path to the image, an
+                already loaded image or a buffer of packed rgb pixels
+            **kmeans_iterations (int): the maximum amount of mini-batch updates
+            **kmeans_sample_size (int): the maximum amount of pixels clustered
+            **swatches (List[Tuple[Tuple[int], int]]): the clusters of the
+                image from an earlier run with the same options, the image is
+                not clustered again when given and may be None
+        """
+        super().__init__(image, **kwargs)
+        swatches = self._options.get("swatches")
+        self._swatches = (
+            swatches
+            if swatches is not None
+            else self.quantize(self.get_image(), **self._options)
+        )
+        self._colors = self.generate()
+
+    @classmethod
+    def get_swatch_key(cls, options: Dict) -> str:
+        # The clusters change with the options, unlike the median cut engines
+        iterations = options.get("kmeans_iterations", DEFAULT_ITERATIONS)
+        sample_size = options.get("kmeans_sample_size", DEFAULT_SAMPLE_SIZE)
+        return f"kmeans-{iterations}-{sample_size}"
+
+    @classmethod
+    def quantize(
+        cls, image: Union[str, Image.Image, bytes], **kwargs
+    ) -> List[Tuple[Tuple[int], int]]:
+        return get_swatches(
+            load_image(image),
+            kwargs.get("kmeans_iterations", DEFAULT_ITERATIONS),
+            kwargs.get("kmeans_sample_size", DEFAULT_SAMPLE_SIZE),
+        )
+
+    def get_swatches(self) -> List[Tuple[Tuple[int], int]]:
+        """
+        Gets the clusters of the image
+
+        Returns:
+            (List[Tuple[Tuple[int], int]]): the rgb color of each cluster with
+                the amount of sampled pixels within it, most populated first
+        """
+        return self._swatches
+
+    def generate(self) -> List[Tuple[int]]:
+        raw_colors = [color for color, _ in self._swatches]
+
+        if len(raw_colors) <= 8:
+            raise TooFewColors("Not enough colors were generated")
+
+        return sort_colors(raw_colors)
+
+    def get_dominant_color(self) -> Tuple[int]:
+        dominant_color = max(self._swatches, key=lambda swatch: swatch[1])[0]
+        return color_utils.hsv_to_rgb(
+            color_utils.change_hsv_value(color_utils.rgb_to_hsv(dominant_color), 0.7)
+        )
+
+
+def sample_pixels(pixels: np.ndarray, sample_size: int) -> np.ndarray:
+    """
+    Take an evenly strided sample of the pixels
+
+    Arguments:
+        pixels (np.ndarray): a (N, 3) array of rgb pixels
+        sample_size (int): the maximum amount of pixels in the sample
+
+    Returns:
+        (np.ndarray): a (sample_size, 3) or smaller float array of the pixels
+    """
+    step = max(1, -(-len(pixels) // sample_size))
+    return pixels[::step].astype(np.float64)
+
+
+def init_centers(
+    pixels: np.ndarray, cluster_count: int, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Pick the starting centers with k-means++ seeding
+
+    Arguments:
+        pixels (np.ndarray): a (N, 3) float array of the pixels
+        cluster_count (int): the amount of centers to pick
+        rng (np.random.Generator): the random generator to pick with
+
+    Returns:
+        (np.ndarray): a (cluster_count, 3) array of the centers
+    """
+    centers = np.empty((cluster_count, 3))
+    centers[0] = pixels[rng.integers(len(pixels))]
+    distances = ((pixels - centers[0]) ** 2).sum(axis=1)
+
+    for i in range(1, cluster_count):
+        total = distances.sum()
+        if total == 0:
+            # Every pixel is already a center, the remaining clusters stay empty
+            centers[i:] = centers[0]
+            break
+        centers[i] = pixels[rng.choice(len(pixels), p=distances / total)]
+        distances = np.minimum(distances, ((pixels - centers[i]) ** 2).sum(axis=1))
+
+    return centers
+
+
+def assign(pixels: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """
+    Find the nearest center of each pixel
+
+    Arguments:
+        pixels (np.ndarray): a (N, 3) float array of the pixels
+        centers (np.ndarray): a (K, 3) array of the centers
+
+    Returns:
+        (np.ndarray): the index of the nearest center of each pixel
+    """
+    distances = ((pixels[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+    return distances.argmin(axis=1)
+
+
+def mini_batch_kmeans(
+    pixels: np.ndarray,
+    cluster_count: int = CLUSTER_COUNT,
+    iterations: int = DEFAULT_ITERATIONS,
+    batch_size: int = BATCH_SIZE,
+    seed: int = SEED,
+) -> np.ndarray:
+    """
+    Cluster the pixels with mini-batch k-means, each center moves towards the
+    mean of its batch members with a learning rate of one over the amount of
+    pixels it has been given so far
+
+    Arguments:
+        pixels (np.ndarray): a (N, 3) float array of the pixels
+        cluster_count (int): the amount of clusters
+        iterations (int): the maximum amount of batches
+        batch_size (int): the amount of pixels in each batch
+        seed (int): the seed of the random generator, fixed so an image always
+                    gives the same colors
+
+    Returns:
+        (np.ndarray): a (cluster_count, 3) array of the centers
+    """
+    rng = np.random.default_rng(seed)
+    centers = init_centers(pixels, cluster_count, rng)
+    counts = np.zeros(cluster_count)
+    batch_size = min(batch_size, len(pixels))
+
+    for _ in range(iterations):
+        batch = pixels[rng.choice(len(pixels), batch_size, replace=False)]
+        labels = assign(batch, centers)
+
+        batch_counts = np.bincount(labels, minlength=cluster_count)
+        batch_sums = np.stack(
+            [
+                np.bincount(labels, weights=batch[:, channel], minlength=cluster_count)
+                for channel in range(3)
+            ],
+            axis=1,
+        )
+
+        updated = batch_counts > 0
+        counts += batch_counts
+        shift = np.zeros_like(centers)
+        shift[updated] = (
+            batch_sums[updated] - batch_counts[updated, None] * centers[updated]
+        ) / counts[updated, None]
+        centers += shift
+
+        if (shift**2).sum(axis=1).max() < CONVERGENCE_DISTANCE**2:
+            break
+
+    return centers
+
+
+def get_swatches(
+    image: Image.Image,
+    iterations: int = DEFAULT_ITERATIONS,
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+    cluster_count: int = CLUSTER_COUNT,
+) -> List[Tuple[Tuple[int], int]]:
+    """
+    Cluster the colors of an image
+
+    Arguments:
+        image (Image.Image): the image to cluster
+        iterations (int): the maximum amount of mini-batch updates
+        sample_size (int): the maximum amount of pixels clustered
+        cluster_count (int): the amount of clusters
+
+    Returns:
+        (List[Tuple[Tuple[int], int]]): the distinct rgb color of each cluster
+            with the amount of sampled pixels within it, most populated first
+    """
+    pixels = sample_pixels(get_pixels(image), sample_size)
+    if len(pixels) == 0:
+        raise TooFewColors("The image has no usable pixels")
+
+    centers = mini_batch_kmeans(pixels, cluster_count, iterations)
+    populations = np.bincount(assign(pixels, centers), minlength=cluster_count)
+
+    swatches = {}
+    for index in np.argsort(-populations, kind="stable"):
+        if not populations[index]:
+            break
+        color = tuple(int(channel) for channel in np.rint(centers[index]))
+        swatches[color] = swatches.get(color, 0) + int(populations[index])
+
+    return list(swatches.items())
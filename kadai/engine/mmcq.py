@@ -0,0 +1,308 @@
+"""
+NumPy implementation of the modified median cut quantization used by colorthief
+
+kadai - Simple wallpaper manager for tiling window managers.
+Copyright (C) 2020  slapelachie
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+Find the full license in the root of this project
+"""
+from typing import List, Tuple
+import numpy as np
+from PIL import Image
+
+SIGBITS = 5
+RSHIFT = 8 - SIGBITS
+HISTO_SIZE = 1 << SIGBITS
+MAX_ITERATION = 1000
+FRACT_BY_POPULATIONS = 0.75
+
+
+class VBox:
+    """
+    A box within the 5 bit color space, the same as colorthief's VBox but with
+    the statistics computed over slices of the histogram array
+    """
+
+    def __init__(self, bounds: List[int], histo: np.ndarray):
+        """
+        Arguments:
+            bounds (List[int]): the inclusive [r1, r2, g1, g2, b1, b2] bounds
+            histo (np.ndarray): the (32, 32, 32) histogram of the pixels
+        """
+        self.bounds = bounds
+        self.histo = histo
+        self._count = None
+        self._volume = None
+
+    @property
+    def region(self) -> np.ndarray:
+        """The view of the histogram within the box"""
+        r1, r2, g1, g2, b1, b2 = self.bounds
+        return self.histo[r1 : r2 + 1, g1 : g2 + 1, b1 : b2 + 1]
+
+    @property
+    def count(self) -> int:
+        """The amount of pixels within the box"""
+        if self._count is None:
+            self._count = int(self.region.sum())
+        return self._count
+
+    @property
+    def volume(self) -> int:
+        """The size of the box in the color space"""
+        if self._volume is None:
+            r1, r2, g1, g2, b1, b2 = self.bounds
+            self._volume = (r2 - r1 + 1) * (g2 - g1 + 1) * (b2 - b1 + 1)
+        return self._volume
+
+    @property
+    def avg(self) -> Tuple[int]:
+        """The average rgb color of the pixels within the box"""
+        mult = 1 << RSHIFT
+        region = self.region
+        total = int(region.sum())
+
+        if total == 0:
+            r1, r2, g1, g2, b1, b2 = self.bounds
+            return (
+                int(mult * (r1 + r2 + 1) / 2),
+                int(mult * (g1 + g2 + 1) / 2),
+                int(mult * (b1 + b2 + 1) / 2),
+            )
+
+        # (i + 0.5) * mult is a whole number, so the sums are exact integers
+        color = []
+        for axis, start in enumerate(self.bounds[::2]):
+            other_axes = tuple(i for i in range(3) if i != axis)
+            plane_sums = region.sum(axis=other_axes, dtype=np.int64)
+            centers = (np.arange(start, start + len(plane_sums)) * 2 + 1) * mult // 2
+            color.append(int(int((plane_sums * centers).sum()) / total))
+
+        return tuple(color)
+
+    def copy(self) -> "VBox":
+        """Copies the box, the histogram is shared"""
+        return VBox(list(self.bounds), self.histo)
+
+
+class PQueue:
+    """Simple priority queue, ordered the same as colorthief's PQueue"""
+
+    def __init__(self, sort_key):
+        self.sort_key = sort_key
+        self.contents = []
+        self._sorted = False
+
+    def push(self, item):
+        """Adds an item to the queue"""
+        self.contents.append(item)
+        self._sorted = False
+
+    def pop(self):
+        """Removes and returns the item with the largest key"""
+        if not self._sorted:
+            self.contents.sort(key=self.sort_key)
+            self._sorted = True
+        return self.contents.pop()
+
+    def size(self) -> int:
+        """The amount of items in the queue"""
+        return len(self.contents)
+
+
+def get_pixels(image: Image.Image, quality: int = 1) -> np.ndarray:
+    """
+    Get the pixels of an image that should be considered when quantizing, the
+    same as colorthief, mostly transparent and white pixels are skipped
+
+    Arguments:
+        image (Image.Image): the image to get the pixels from
+        quality (int): only every nth pixel is used, 1 uses every pixel
+
+    Returns:
+        (np.ndarray): a (N, 3) array of the rgb pixels
+    """
+    pixels = np.frombuffer(image.convert("RGBA").tobytes(), dtype=np.uint8)
+    pixels = pixels.reshape(-1, 4)[::quality]
+    valid = (pixels[:, 3] >= 125) & ~np.all(pixels[:, :3] > 250, axis=1)
+    return pixels[valid, :3]
+
+
+def get_histo(pixels: np.ndarray) -> np.ndarray:
+    """
+    Build the histogram of the pixels within the 5 bit color space
+
+    Arguments:
+        pixels (np.ndarray): a (N, 3) array of rgb pixels
+
+    Returns:
+        (np.ndarray): the (32, 32, 32) amount of pixels for each color
+    """
+    shifted = (pixels >> RSHIFT).astype(np.intp)
+    red, green, blue = shifted[:, 0], shifted[:, 1], shifted[:, 2]
+    index = (red << (2 * SIGBITS)) + (green << SIGBITS) + blue
+    histo = np.bincount(index, minlength=HISTO_SIZE**3)
+    return histo.reshape(HISTO_SIZE, HISTO_SIZE, HISTO_SIZE)
+
+
+def vbox_from_histo(histo: np.ndarray) -> VBox:
+    """
+    Create the box containing every pixel of the histogram
+
+    Arguments:
+        histo (np.ndarray): the (32, 32, 32) histogram
+
+    Returns:
+        (VBox): the box around every pixel
+    """
+    bounds = []
+    for axis in range(3):
+        other_axes = tuple(i for i in range(3) if i != axis)
+        present = np.flatnonzero(histo.sum(axis=other_axes))
+        bounds.extend((int(present[0]), int(present[-1])))
+    return VBox(bounds, histo)
+
+
+def median_cut_apply(vbox: VBox):
+    """
+    Split a box in two along its longest side at the median of its pixels, with
+    the same cut point rules as colorthief
+
+    Arguments:
+        vbox (VBox): the box to split
+
+    Returns:
+        (Tuple[VBox, VBox]): the two boxes, the second is None if not split
+    """
+    if not vbox.count:
+        return (None, None)
+
+    if vbox.count == 1:
+        return (vbox.copy(), None)
+
+    r1, r2, g1, g2, b1, b2 = vbox.bounds
+    widths = [r2 - r1 + 1, g2 - g1 + 1, b2 - b1 + 1]
+    # Ties prefer red, then green, then blue
+    axis = widths.index(max(widths))
+    other_axes = tuple(i for i in range(3) if i != axis)
+
+    dim1 = vbox.bounds[axis * 2]
+    dim2 = vbox.bounds[axis * 2 + 1]
+    plane_sums = vbox.region.sum(axis=other_axes, dtype=np.int64)
+    cumulative = np.cumsum(plane_sums)
+    total = int(cumulative[-1])
+
+    partialsum = {dim1 + i: int(value) for i, value in enumerate(cumulative)}
+    lookaheadsum = {i: total - value for i, value in partialsum.items()}
+
+    for i in range(dim1, dim2 + 1):
+        if partialsum[i] > total / 2:
+            vbox1 = vbox.copy()
+            vbox2 = vbox.copy()
+            left = i - dim1
+            right = dim2 - i
+            if left <= right:
+                d2 = min(dim2 - 1, int(i + right / 2))
+            else:
+                d2 = max(dim1, int(i - 1 - left / 2))
+            # avoid 0-count boxes
+            while not partialsum.get(d2, False):
+                d2 += 1
+            count2 = lookaheadsum.get(d2)
+            while not count2 and partialsum.get(d2 - 1, False):
+                d2 -= 1
+                count2 = lookaheadsum.get(d2)
+
+            vbox1.bounds[axis * 2 + 1] = d2
+            vbox2.bounds[axis * 2] = d2 + 1
+            return (vbox1, vbox2)
+
+    return (None, None)
+
+
+def _iterate(queue: PQueue, target: float):
+    n_color = 1
+    n_iter = 0
+    while n_iter < MAX_ITERATION:
+        vbox = queue.pop()
+        if not vbox.count:
+            queue.push(vbox)
+            n_iter += 1
+            continue
+
+        vbox1, vbox2 = median_cut_apply(vbox)
+        if not vbox1:
+            raise ValueError("vbox1 not defined; shouldn't happen!")
+
+        queue.push(vbox1)
+        if vbox2:
+            queue.push(vbox2)
+            n_color += 1
+        if n_color >= target:
+            return
+        n_iter += 1
+
+
+def quantize(pixels: np.ndarray, max_color: int) -> List[Tuple[Tuple[int], int]]:
+    """
+    Quantize the pixels with modified median cut quantization
+
+    Arguments:
+        pixels (np.ndarray): a (N, 3) array of rgb pixels
+        max_color (int): the maximum amount of colors
+
+    Returns:
+        (List[Tuple[Tuple[int], int]]): the rgb color of each box with the
+            amount of pixels within it, in palette order
+    """
+    if len(pixels) == 0:
+        raise ValueError("Empty pixels when quantize.")
+    if max_color < 2 or max_color > 256:
+        raise ValueError("Wrong number of max colors when quantize.")
+
+    histo = get_histo(pixels)
+
+    queue = PQueue(lambda vbox: vbox.count)
+    queue.push(vbox_from_histo(histo))
+    _iterate(queue, FRACT_BY_POPULATIONS * max_color)
+
+    # Re-sort by the product of pixel occupancy times the size in color space
+    volume_queue = PQueue(lambda vbox: vbox.count * vbox.volume)
+    while queue.size():
+        volume_queue.push(queue.pop())
+    _iterate(volume_queue, max_color - volume_queue.size())
+
+    swatches = []
+    while volume_queue.size():
+        vbox = volume_queue.pop()
+        swatches.append((vbox.avg, vbox.count))
+    return swatches
+
+
+def get_swatches(
+    image: Image.Image, color_count: int = 10, quality: int = 10
+) -> List[Tuple[Tuple[int], int]]:
+    """
+    Quantize an in memory image, equivalent to
+    kadai.engine.color_thief_engine.get_swatches
+
+    Arguments:
+        image (Image.Image): the image to quantize
+        color_count (int): the maximum amount of colors
+        quality (int): only every nth pixel is used, 1 uses every pixel
+
+    Returns:
+        (List[Tuple[Tuple[int], int]]): the rgb color of each box with the
+            amount of pixels within it, in palette order
+    """
+    return quantize(get_pixels(image, quality), color_count)
@@ -0,0 +1,70 @@
+"""
+Engine using Pillow's built in quantizer
+
+kadai - Simple wallpaper manager for tiling window managers.
+Copyright (C) 2020  slapelachie
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+Find the full license in the root of this project
+"""
+from typing import Dict, List, Tuple, Union
+from PIL import Image
+
+from kadai.engine import VibranceEngine
+from kadai.engine.base_engine import load_image
+
+COLOR_COUNT = 16
+
+
+class PillowEngine(VibranceEngine):
+    """
+    Engine that quantizes with Pillow's median cut, which runs entirely in C,
+    the colors are then sorted the same as the vibrance engine
+    """
+
+    @classmethod
+    def get_swatch_key(cls, options: Dict) -> str:
+        return "pillow"
+
+    @classmethod
+    def quantize(
+        cls, image: Union[str, Image.Image, bytes], **kwargs
+    ) -> List[Tuple[Tuple[int], int]]:
+        return get_swatches(load_image(image), COLOR_COUNT)
+
+
+def get_swatches(
+    image: Image.Image,
+    color_count: int = COLOR_COUNT,
+    method: Image.Quantize = Image.Quantize.MEDIANCUT,
+) -> List[Tuple[Tuple[int], int]]:
+    """
+    Quantize an image with Pillow
+
+    Arguments:
+        image (Image.Image): the image to quantize
+        color_count (int): the maximum amount of colors
+        method (Image.Quantize): the quantizer Pillow should use
+
+    Returns:
+        (List[Tuple[Tuple[int], int]]): the distinct rgb colors with the amount
+            of pixels of each, most common first
+    """
+    quantized = image.convert("RGB").quantize(colors=color_count, method=method)
+    palette = quantized.getpalette()
+
+    swatches = {}
+    for count, index in sorted(quantized.getcolors(color_count), reverse=True):
+        color = tuple(palette[index * 3 : index * 3 + 3])
+        swatches[color] = swatches.get(color, 0) + count
+
+    return list(swatches.items())
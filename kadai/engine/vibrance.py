@@ -47,7 +47,7 @@ def sort_by_vibrance(colors: List[Tuple[int]]) -> List[Tuple[int]]:
 
 def calculate_vibrance(color: Tuple[int]) -> float:
     """
-    Calculate the vibrance of a given color
+    Calculate the vibrance of a given color, black is the least vibrant
 
     Arguments:
         color (Tuple[int]): the rgb color
@@ -58,6 +58,9 @@ def calculate_vibrance(color: Tuple[int]) -> float:
     hsv_color = [*color_utils.rgb_to_hsv(color)]
     ideal_brightness = 1
 
+    if hsv_color[2] == 0:
+        return float("-inf")
+
     # Basically the closer the brightness is to the ideal brightness and
     # the higher the saturation is the larger: the output value
     return hsv_color[1] * (
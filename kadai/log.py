@@ -18,7 +18,6 @@ Find the full license in the root of this project
 """
 
 import logging
-import tqdm
 import sys
 
 DEFAULT_FORMAT = "[%(levelname)s\033[0m] " "\033[1;31m%(module)s\033[0m: " "%(message)s"
@@ -58,14 +57,28 @@ class defaultLoggingHandler(logging.StreamHandler):
     #        self.handleError(record)
 
 
+# The level set with set_level, it also applies to loggers set up later on
+minimum_level = None
+loggers = []
+
+
 def setup_logger(name, handler, level=logging.WARNING):
     """Sets up the logger"""
     logger = logging.getLogger(name)
-    logger.setLevel(level)
+    logger.setLevel(level if minimum_level is None else min(level, minimum_level))
     logger.addHandler(handler)
+    loggers.append(logger)
     return logger
 
 
+def set_level(level):
+    """Lowers the level of every logger to the level given, such as for --verbose"""
+    global minimum_level  # pylint: disable=global-statement,invalid-name
+    minimum_level = level
+    for logger in loggers:
+        logger.setLevel(min(logger.level, level))
+
+
 logging.addLevelName(logging.ERROR, "\033[1;31mE")
 logging.addLevelName(logging.INFO, "\033[1;32mI")
 logging.addLevelName(logging.WARNING, "\033[1;33mW")
@@ -0,0 +1,243 @@
+"""
+Persistent index of the generated themes
+
+kadai - Simple wallpaper manager for tiling window managers.
+Copyright (C) 2020  slapelachie
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+Find the full license in the root of this project
+"""
+import contextlib
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Set, Tuple
+
+from kadai import log
+from kadai.utils import file_utils
+
+INDEX_VERSION = 1
+THEME_FILE_PATTERN = re.compile(r"^([0-9a-f]+)-(\w+)\.json$")
+
+logger = log.setup_logger(
+    __name__ + ".default", log.defaultLoggingHandler(), level=logging.WARNING
+)
+
+
+class ThemeIndex:
+    """
+    Index of the themes in the themes directory, keyed by (image hash, engine
+    name) so checking whether a theme exists does not need a directory scan
+    """
+
+    def __init__(self, cache_path: str):
+        """
+        Arguments:
+            cache_path (str): the cache directory holding the themes directory
+        """
+        self._theme_directory = os.path.join(cache_path, "themes")
+        self._index_path = os.path.join(cache_path, "themes.index.json")
+        self._themes: Dict[str, Set[str]] = {}
+        self._transaction_depth = 0
+        self._dirty = False
+
+        os.makedirs(self._theme_directory, exist_ok=True)
+        self.load()
+
+    def get_theme_directory(self) -> str:
+        """
+        Gets the directory the themes are stored in
+
+        Returns:
+            (str): the theme directory
+        """
+        return self._theme_directory
+
+    def get_index_path(self) -> str:
+        """
+        Gets the path of the index file
+
+        Returns:
+            (str): the path to the index file
+        """
+        return self._index_path
+
+    def get_theme_path(self, image_hash: str, engine_name: str) -> str:
+        """
+        Gets the path of the theme file for an image and engine
+
+        Arguments:
+            image_hash (str): the hash of the image
+            engine_name (str): the name of the engine
+
+        Returns:
+            (str): the path to the theme file, which may not exist
+        """
+        return os.path.join(
+            self._theme_directory, f"{get_theme_name(image_hash, engine_name)}.json"
+        )
+
+    def contains(self, image_hash: str, engine_name: str) -> bool:
+        """
+        Checks if a theme has been generated for an image and engine
+
+        Arguments:
+            image_hash (str): the hash of the image
+            engine_name (str): the name of the engine
+
+        Returns:
+            (bool): whether the theme exists
+        """
+        return engine_name in self._themes.get(image_hash, ())
+
+    def get_engine_names(self, image_hash: str) -> List[str]:
+        """
+        Gets the engines a theme has been generated with for an image
+
+        Arguments:
+            image_hash (str): the hash of the image
+
+        Returns:
+            (List[str]): the names of the engines
+        """
+        return sorted(self._themes.get(image_hash, ()))
+
+    def get_keys(self) -> List[Tuple[str, str]]:
+        """
+        Gets every theme in the index
+
+        Returns:
+            (List[Tuple[str, str]]): the image hash and engine name of each theme
+        """
+        return [
+            (image_hash, engine_name)
+            for image_hash, engine_names in sorted(self._themes.items())
+            for engine_name in sorted(engine_names)
+        ]
+
+    def add(self, image_hash: str, engine_name: str):
+        """
+        Adds a theme to the index, saved straight away unless in a transaction
+
+        Arguments:
+            image_hash (str): the hash of the image
+            engine_name (str): the name of the engine
+        """
+        self._themes.setdefault(image_hash, set()).add(engine_name)
+        self._changed()
+
+    def remove(self, image_hash: str, engine_name: str):
+        """
+        Removes a theme from the index, saved straight away unless in a
+        transaction
+
+        Arguments:
+            image_hash (str): the hash of the image
+            engine_name (str): the name of the engine
+        """
+        engine_names = self._themes.get(image_hash, set())
+        engine_names.discard(engine_name)
+        if not engine_names:
+            self._themes.pop(image_hash, None)
+        self._changed()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Groups changes to the index so they are saved once, when the outermost
+        transaction ends. Changes made before an error are still saved as their
+        theme files have already been written
+        """
+        self._transaction_depth += 1
+        try:
+            yield self
+        finally:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0 and self._dirty:
+                self.save()
+
+    def load(self):
+        """
+        Loads the index from disk, rebuilding it from the themes directory when
+        it is missing, corrupt or the directory was changed by something else
+        """
+        try:
+            with open(self._index_path, "rb") as index_file:
+                index_data = json.load(index_file)
+
+            if (
+                index_data["version"] != INDEX_VERSION
+                or index_data["directory_mtime"] != self._get_directory_mtime()
+            ):
+                raise ValueError("Theme index is out of date")
+
+            self._themes = {
+                image_hash: set(engine_names)
+                for image_hash, engine_names in index_data["themes"].items()
+            }
+            self._dirty = False
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            logger.info("Rebuilding the theme index...")
+            self.rebuild()
+
+    def rebuild(self):
+        """Rebuilds the index from the files in the themes directory"""
+        self._themes = {}
+        for theme_file in os.scandir(self._theme_directory):
+            match = THEME_FILE_PATTERN.match(theme_file.name)
+            if match:
+                self._themes.setdefault(match.group(1), set()).add(match.group(2))
+
+        self.save()
+
+    def save(self):
+        """Saves the index to disk atomically"""
+        themes = {
+            image_hash: sorted(engine_names)
+            for image_hash, engine_names in sorted(self._themes.items())
+        }
+
+        index_data = {
+            "version": INDEX_VERSION,
+            "directory_mtime": self._get_directory_mtime(),
+            "themes": themes,
+        }
+        file_utils.atomic_write(
+            self._index_path, json.dumps(index_data).encode("utf-8")
+        )
+        self._dirty = False
+
+    def _changed(self):
+        self._dirty = True
+        if self._transaction_depth == 0:
+            self.save()
+
+    def _get_directory_mtime(self) -> int:
+        return os.stat(self._theme_directory).st_mtime_ns
+
+    def __len__(self) -> int:
+        return sum(len(engine_names) for engine_names in self._themes.values())
+
+
+def get_theme_name(image_hash: str, engine_name: str) -> str:
+    """
+    Gets the name a theme is stored under
+
+    Arguments:
+        image_hash (str): the hash of the image
+        engine_name (str): the name of the engine
+
+    Returns:
+        (str): the theme name
+    """
+    return f"{image_hash}-{engine_name}"
@@ -0,0 +1,623 @@
+"""
+Storage of the generated themes
+
+kadai - Simple wallpaper manager for tiling window managers.
+Copyright (C) 2020  slapelachie
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+Find the full license in the root of this project
+"""
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from kadai import log
+from kadai.theme_index import THEME_FILE_PATTERN, ThemeIndex
+from kadai.utils import file_utils
+
+SQLITE_SCHEMA_VERSION = 3
+# Rows put within a transaction are inserted together once this many are queued
+SQLITE_BATCH_SIZE = 256
+
+logger = log.setup_logger(
+    __name__ + ".default", log.defaultLoggingHandler(), level=logging.WARNING
+)
+
+
+class ThemeStore:
+    """
+    The interface of a store of generated themes, keyed by (image hash, engine
+    name). A theme is a dictionary of the form
+
+    {
+        "colors": {"dark": {...}, "light": {...}},
+        "wallpaper": "/path/to/image",
+        "primary": "#ffffff"
+    }
+
+    The swatches engines quantize an image into are kept as well, keyed by
+    (image hash, swatch key), so themes can be generated again without
+    decoding the image
+    """
+
+    def contains(self, image_hash: str, engine_name: str) -> bool:
+        """
+        Checks if a theme has been generated for an image and engine
+
+        Arguments:
+            image_hash (str): the hash of the image
+            engine_name (str): the name of the engine
+
+        Returns:
+            (bool): whether the theme exists
+        """
+        raise NotImplementedError
+
+    def get_engine_names(self, image_hash: str) -> List[str]:
+        """
+        Gets the engines a theme has been generated with for an image
+
+        Arguments:
+            image_hash (str): the hash of the image
+
+        Returns:
+            (List[str]): the names of the engines
+        """
+        raise NotImplementedError
+
+    def get_keys(self) -> List[Tuple[str, str]]:
+        """
+        Gets every theme in the store
+
+        Returns:
+            (List[Tuple[str, str]]): the image hash and engine name of each theme
+        """
+        raise NotImplementedError
+
+    def get(self, image_hash: str, engine_name: str) -> Optional[Dict]:
+        """
+        Gets a theme
+
+        Arguments:
+            image_hash (str): the hash of the image
+            engine_name (str): the name of the engine
+
+        Returns:
+            (Optional[Dict]): the theme, None if it has not been generated
+        """
+        raise NotImplementedError
+
+    def put(self, image_hash: str, engine_name: str, theme: Dict):
+        """
+        Stores a theme, replacing any existing theme for the image and engine
+
+        Arguments:
+            image_hash (str): the hash of the image
+            engine_name (str): the name of the engine
+            theme (Dict): the theme
+        """
+        raise NotImplementedError
+
+    def remove(self, image_hash: str, engine_name: str):
+        """
+        Removes a theme, if it exists
+
+        Arguments:
+            image_hash (str): the hash of the image
+            engine_name (str): the name of the engine
+        """
+        raise NotImplementedError
+
+    def rename(self, old_hash: str, new_hash: str, engine_name: str) -> bool:
+        """
+        Moves a theme to a different image hash
+
+        Arguments:
+            old_hash (str): the hash the theme is stored under
+            new_hash (str): the hash to store the theme under
+            engine_name (str): the name of the engine
+
+        Returns:
+            (bool): whether there was a theme to move
+        """
+        raise NotImplementedError
+
+    def get_swatches(
+        self, image_hash: str, swatch_key: str
+    ) -> Optional[List[Tuple[Tuple[int], int]]]:
+        """
+        Gets the cached swatches of an image
+
+        Arguments:
+            image_hash (str): the hash of the image
+            swatch_key (str): the swatch key of the engine that quantized it
+
+        Returns:
+            (Optional[List[Tuple[Tuple[int], int]]]): the rgb colors with the
+                amount of pixels of each, None if they have not been cached
+        """
+        raise NotImplementedError
+
+    def put_swatches(
+        self, image_hash: str, swatch_key: str, swatches: List[Tuple[Tuple[int], int]]
+    ):
+        """
+        Caches the swatches of an image, replacing any existing swatches
+
+        Arguments:
+            image_hash (str): the hash of the image
+            swatch_key (str): the swatch key of the engine that quantized it
+            swatches (List[Tuple[Tuple[int], int]]): the rgb colors with the
+                amount of pixels of each
+        """
+        raise NotImplementedError
+
+    def remove_swatches(self, image_hash: str):
+        """
+        Removes every cached swatch of an image
+
+        Arguments:
+            image_hash (str): the hash of the image
+        """
+        raise NotImplementedError
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Groups changes so they are written together when the outermost
+        transaction ends, the sqlite store discards them on an error while the
+        json store has already written those made before it
+        """
+        yield self
+
+    def close(self):
+        """Writes anything outstanding and releases the store"""
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class JsonThemeStore(ThemeStore):
+    """
+    Stores each theme as its own json file in the themes directory, with a
+    ThemeIndex so lookups do not need a directory scan. The swatches are kept
+    together in swatches.json, which is only read once they are needed
+    """
+
+    def __init__(self, cache_path: str):
+        """
+        Arguments:
+            cache_path (str): the cache directory holding the themes directory
+        """
+        self._theme_index = ThemeIndex(cache_path)
+        self._swatches_path = os.path.join(cache_path, "swatches.json")
+        self._swatches = None
+        self._swatches_changed = False
+        self._transaction_depth = 0
+
+    def get_theme_path(self, image_hash: str, engine_name: str) -> str:
+        """
+        Gets the path of the theme file for an image and engine
+
+        Arguments:
+            image_hash (str): the hash of the image
+            engine_name (str): the name of the engine
+
+        Returns:
+            (str): the path to the theme file, which may not exist
+        """
+        return self._theme_index.get_theme_path(image_hash, engine_name)
+
+    def contains(self, image_hash: str, engine_name: str) -> bool:
+        return self._theme_index.contains(image_hash, engine_name)
+
+    def get_engine_names(self, image_hash: str) -> List[str]:
+        return self._theme_index.get_engine_names(image_hash)
+
+    def get_keys(self) -> List[Tuple[str, str]]:
+        return self._theme_index.get_keys()
+
+    def get(self, image_hash: str, engine_name: str) -> Optional[Dict]:
+        try:
+            with open(
+                self.get_theme_path(image_hash, engine_name), "r", encoding="UTF-8"
+            ) as json_data:
+                return json.load(json_data)
+        except FileNotFoundError:
+            return None
+
+    def put(self, image_hash: str, engine_name: str, theme: Dict):
+        file_utils.atomic_write(
+            self.get_theme_path(image_hash, engine_name),
+            json.dumps(theme, indent=4, separators=(",", ": ")).encode("utf-8"),
+        )
+        self._theme_index.add(image_hash, engine_name)
+
+    def remove(self, image_hash: str, engine_name: str):
+        try:
+            os.remove(self.get_theme_path(image_hash, engine_name))
+        except FileNotFoundError:
+            pass
+        self._theme_index.remove(image_hash, engine_name)
+
+    def rename(self, old_hash: str, new_hash: str, engine_name: str) -> bool:
+        try:
+            os.replace(
+                self.get_theme_path(old_hash, engine_name),
+                self.get_theme_path(new_hash, engine_name),
+            )
+        except FileNotFoundError:
+            return False
+
+        with self._theme_index.transaction():
+            self._theme_index.remove(old_hash, engine_name)
+            self._theme_index.add(new_hash, engine_name)
+        return True
+
+    def get_swatches(
+        self, image_hash: str, swatch_key: str
+    ) -> Optional[List[Tuple[Tuple[int], int]]]:
+        swatches = self._load_swatches().get(image_hash, {}).get(swatch_key)
+        return None if swatches is None else decode_swatches(swatches)
+
+    def put_swatches(
+        self, image_hash: str, swatch_key: str, swatches: List[Tuple[Tuple[int], int]]
+    ):
+        self._load_swatches().setdefault(image_hash, {})[swatch_key] = swatches
+        self._swatches_changed = True
+        if self._transaction_depth == 0:
+            self._save_swatches()
+
+    def remove_swatches(self, image_hash: str):
+        if self._load_swatches().pop(image_hash, None) is None:
+            return
+        self._swatches_changed = True
+        if self._transaction_depth == 0:
+            self._save_swatches()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        self._transaction_depth += 1
+        try:
+            with self._theme_index.transaction():
+                yield self
+        finally:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self._save_swatches()
+
+    def close(self):
+        self._save_swatches()
+
+    def _load_swatches(self) -> Dict:
+        if self._swatches is None:
+            try:
+                with open(self._swatches_path, "r", encoding="UTF-8") as json_data:
+                    self._swatches = json.load(json_data)
+            except FileNotFoundError:
+                self._swatches = {}
+            except ValueError:
+                logger.warning("Ignoring unreadable %s", self._swatches_path)
+                self._swatches = {}
+        return self._swatches
+
+    def _save_swatches(self):
+        if not self._swatches_changed:
+            return
+
+        file_utils.atomic_write(
+            self._swatches_path, json.dumps(self._swatches).encode("utf-8")
+        )
+        self._swatches_changed = False
+
+    def __len__(self) -> int:
+        return len(self._theme_index)
+
+
+class SqliteThemeStore(ThemeStore):
+    """
+    Stores every theme in a single sqlite database, looked up by its primary key
+    """
+
+    def __init__(self, cache_path: str):
+        """
+        Arguments:
+            cache_path (str): the cache directory to keep the database in, json
+                themes found in its themes directory are imported when the
+                database is created
+        """
+        os.makedirs(cache_path, exist_ok=True)
+        self._database_path = os.path.join(cache_path, "themes.db")
+        self._pending = []
+        self._pending_swatches = []
+        self._transaction_depth = 0
+
+        # Transactions are managed explicitly, see transaction
+        self._connection = sqlite3.connect(
+            self._database_path, isolation_level=None, check_same_thread=False
+        )
+        self._create_schema(os.path.join(cache_path, "themes"))
+
+    def get_database_path(self) -> str:
+        """
+        Gets the path of the database file
+
+        Returns:
+            (str): the path to the database
+        """
+        return self._database_path
+
+    def contains(self, image_hash: str, engine_name: str) -> bool:
+        return (
+            self._query_one(
+                "SELECT 1 FROM themes WHERE image_hash = ? AND engine_name = ?",
+                (image_hash, engine_name),
+            )
+            is not None
+        )
+
+    def get_engine_names(self, image_hash: str) -> List[str]:
+        self._flush()
+        rows = self._connection.execute(
+            "SELECT engine_name FROM themes WHERE image_hash = ? ORDER BY engine_name",
+            (image_hash,),
+        )
+        return [engine_name for (engine_name,) in rows]
+
+    def get_keys(self) -> List[Tuple[str, str]]:
+        self._flush()
+        rows = self._connection.execute(
+            "SELECT image_hash, engine_name FROM themes"
+            " ORDER BY image_hash, engine_name"
+        )
+        return [tuple(row) for row in rows]
+
+    def get(self, image_hash: str, engine_name: str) -> Optional[Dict]:
+        row = self._query_one(
+            "SELECT colors, wallpaper, primary_color FROM themes"
+            " WHERE image_hash = ? AND engine_name = ?",
+            (image_hash, engine_name),
+        )
+        if row is None:
+            return None
+
+        colors, wallpaper, primary_color = row
+        return {
+            "colors": json.loads(colors),
+            "wallpaper": wallpaper,
+            "primary": primary_color,
+        }
+
+    def put(self, image_hash: str, engine_name: str, theme: Dict):
+        self._pending.append(
+            (
+                image_hash,
+                engine_name,
+                json.dumps(theme["colors"]),
+                theme["wallpaper"],
+                theme["primary"],
+            )
+        )
+        self._flush_if_needed()
+
+    def remove(self, image_hash: str, engine_name: str):
+        self._flush()
+        self._connection.execute(
+            "DELETE FROM themes WHERE image_hash = ? AND engine_name = ?",
+            (image_hash, engine_name),
+        )
+
+    def rename(self, old_hash: str, new_hash: str, engine_name: str) -> bool:
+        self._flush()
+        with self.transaction():
+            self._connection.execute(
+                "DELETE FROM themes WHERE image_hash = ? AND engine_name = ?",
+                (new_hash, engine_name),
+            )
+            cursor = self._connection.execute(
+                "UPDATE themes SET image_hash = ?"
+                " WHERE image_hash = ? AND engine_name = ?",
+                (new_hash, old_hash, engine_name),
+            )
+        return cursor.rowcount > 0
+
+    def get_swatches(
+        self, image_hash: str, swatch_key: str
+    ) -> Optional[List[Tuple[Tuple[int], int]]]:
+        row = self._query_one(
+            "SELECT swatches FROM swatches WHERE image_hash = ? AND swatch_key = ?",
+            (image_hash, swatch_key),
+        )
+        return None if row is None else decode_swatches(json.loads(row[0]))
+
+    def put_swatches(
+        self, image_hash: str, swatch_key: str, swatches: List[Tuple[Tuple[int], int]]
+    ):
+        self._pending_swatches.append((image_hash, swatch_key, json.dumps(swatches)))
+        self._flush_if_needed()
+
+    def remove_swatches(self, image_hash: str):
+        self._flush()
+        self._connection.execute(
+            "DELETE FROM swatches WHERE image_hash = ?", (image_hash,)
+        )
+
+    @contextlib.contextmanager
+    def transaction(self):
+        if self._transaction_depth == 0:
+            self._connection.execute("BEGIN")
+        self._transaction_depth += 1
+        try:
+            yield self
+            if self._transaction_depth == 1:
+                self._flush()
+        except BaseException:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self._rollback()
+            raise
+
+        self._transaction_depth -= 1
+        if self._transaction_depth == 0:
+            self._connection.execute("COMMIT")
+
+    def import_json(self, theme_directory: str) -> int:
+        """
+        Imports the themes of a json theme store, the json files are left as
+        they are
+
+        Arguments:
+            theme_directory (str): the themes directory of the json store
+
+        Returns:
+            (int): the amount of themes imported
+        """
+        imported = 0
+        with self.transaction():
+            for theme_file in os.scandir(theme_directory):
+                match = THEME_FILE_PATTERN.match(theme_file.name)
+                if not match:
+                    continue
+
+                try:
+                    with open(theme_file.path, "r", encoding="UTF-8") as json_data:
+                        theme = json.load(json_data)
+                    self.put(match.group(1), match.group(2), theme)
+                except (OSError, ValueError, KeyError, TypeError) as error:
+                    logger.warning("Could not import %s: %s", theme_file.path, error)
+                    continue
+                imported += 1
+
+        return imported
+
+    def close(self):
+        self._flush()
+        self._connection.close()
+
+    def _create_schema(self, theme_directory: str):
+        (version,) = self._connection.execute("PRAGMA user_version").fetchone()
+        if version == SQLITE_SCHEMA_VERSION:
+            return
+
+        # Every version so far only added tables, so older databases are kept.
+        # The json themes are only imported along with the themes table, an
+        # upgraded database may hold newer themes. The import is part of the
+        # same transaction, an interrupted import is rolled back and run again
+        with self.transaction():
+            created = (
+                self._query_one(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                    ("themes",),
+                )
+                is None
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS themes ("
+                " image_hash TEXT NOT NULL,"
+                " engine_name TEXT NOT NULL,"
+                " colors TEXT NOT NULL,"
+                " wallpaper TEXT NOT NULL,"
+                " primary_color TEXT NOT NULL,"
+                " PRIMARY KEY (image_hash, engine_name)"
+                ") WITHOUT ROWID"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS swatches ("
+                " image_hash TEXT NOT NULL,"
+                " swatch_key TEXT NOT NULL,"
+                " swatches TEXT NOT NULL,"
+                " PRIMARY KEY (image_hash, swatch_key)"
+                ") WITHOUT ROWID"
+            )
+
+            if created and os.path.isdir(theme_directory):
+                imported = self.import_json(theme_directory)
+                if imported:
+                    logger.info("Imported %s themes from %s", imported, theme_directory)
+
+            self._connection.execute(f"PRAGMA user_version = {SQLITE_SCHEMA_VERSION}")
+
+    def _query_one(self, query: str, parameters: tuple):
+        self._flush()
+        return self._connection.execute(query, parameters).fetchone()
+
+    def _rollback(self):
+        self._pending = []
+        self._pending_swatches = []
+        # Some errors already rolled the transaction back
+        if self._connection.in_transaction:
+            self._connection.execute("ROLLBACK")
+
+    def _flush_if_needed(self):
+        pending = len(self._pending) + len(self._pending_swatches)
+        if self._transaction_depth == 0 or pending >= SQLITE_BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO themes"
+                " (image_hash, engine_name, colors, wallpaper, primary_color)"
+                " VALUES (?, ?, ?, ?, ?)",
+                self._pending,
+            )
+            self._pending = []
+
+        if self._pending_swatches:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO swatches (image_hash, swatch_key, swatches)"
+                " VALUES (?, ?, ?)",
+                self._pending_swatches,
+            )
+            self._pending_swatches = []
+
+    def __len__(self) -> int:
+        (count,) = self._query_one("SELECT COUNT(*) FROM themes", ())
+        return count
+
+
+def decode_swatches(swatches: List) -> List[Tuple[Tuple[int], int]]:
+    """
+    Converts swatches read back from json to the form the engines give them in
+
+    Arguments:
+        swatches (List): the swatches as lists
+
+    Returns:
+        (List[Tuple[Tuple[int], int]]): the rgb colors as tuples with the
+            amount of pixels of each
+    """
+    return [(tuple(color), count) for color, count in swatches]
+
+
+def get_theme_store(store_name: str, cache_path: str) -> ThemeStore:
+    """
+    Get the theme store from the name given
+
+    Arguments:
+        store_name (str): 'sqlite' for a single database file or 'json' for a
+                          file per theme
+        cache_path (str): the cache directory to store the themes in
+
+    Returns:
+        (ThemeStore): the theme store
+    """
+    if store_name == "json":
+        return JsonThemeStore(cache_path)
+
+    if store_name != "sqlite":
+        raise ValueError(f"Unknown theme store '{store_name}'")
+
+    return SqliteThemeStore(cache_path)
@@ -22,18 +22,37 @@ import logging
 import json
 import random
 import errno
-from io import TextIOWrapper
-from typing import Dict, List
-import tqdm
-from PIL import Image
-
-from kadai.utils import file_utils, color_utils
+import hashlib
+import shutil
+import tempfile
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Dict, List, Tuple, Type, Union
+
+from kadai.utils import file_utils, template_utils
+from kadai.utils.stat_cache import StatCache
+from kadai.utils.directory_scanner import DirectoryScanner
 from kadai.config_handler import ConfigHandler
-from kadai.engine import BaseEngine
+from kadai.theme_store import ThemeStore, get_theme_store
 from kadai import log
 
-
-TMP_FILE = "/tmp/kadai-tmp.png"
+# Pillow, numpy, tqdm, the engines and multiprocessing are only imported once
+# themes are generated, updating to a generated theme does not need them
+if TYPE_CHECKING:
+    from PIL import Image
+    from kadai.engine import BaseEngine
+
+THUMBNAIL_SIZE = (100, 50)
+# Themes were named after the md5 of the image before the hash was selectable
+LEGACY_HASH_ALGORITHM = "md5"
+# The themes that were stored when the hash algorithm was switched, and so
+# are named after the legacy hash, until they are migrated
+LEGACY_THEMES_FILE = "legacy-themes.json"
+REDUCIBLE_MODES = ("L", "LA", "RGB", "RGBA", "CMYK", "YCbCr", "I", "F")
+ENGINE_NAMES = ("vibrance", "hue", "pastel", "pastel_hue", "pillow", "kmeans")
+# The engine name that generates the themes of every engine at once
+ALL_ENGINES = "all"
+# Random picks tried before every image of a directory is checked for a theme
+RANDOM_PICK_ATTEMPTS = 32
 
 logger = log.setup_logger(
     __name__ + ".default", log.defaultLoggingHandler(), level=logging.WARNING
@@ -42,8 +61,6 @@ tqdm_logger = log.setup_logger(
     __name__ + ".tqdm", log.TqdmLoggingHandler(), level=logging.WARNING
 )
 
-config_handler = ConfigHandler()
-config = config_handler.get_config()
 
 # pylint: disable=too-many-instance-attributes,too-many-public-methods
 class Themer:
@@ -66,10 +83,26 @@ class Themer:
             **user_template_path (str): the path to the users templates
             **user_hooks_path (str): the path to the users hooks
             **custom_theme_path (str): the path to the custom theme
+            **jobs (int): the amount of processes used to generate themes,
+                          0 uses every available core
+            **hash_algorithm (str): the hashlib algorithm themes are named by
+            **recursive (bool): whether to include images in subdirectories
+            **quantizer (str): the median cut implementation, 'colorthief' or
+                               'numpy'
+            **kmeans_iterations (int): the iteration cap of the kmeans engine
+            **kmeans_sample_size (int): the amount of pixels the kmeans engine
+                                        clusters
+            **theme_store_name (str): where themes are stored, 'sqlite' or 'json'
+            **hook_timeout (float): the seconds a hook may run for before it is
+                                    killed
+            **executor (Executor): a process pool to generate themes on instead
+                                   of starting one for each generate
+            **prerender (bool): whether generate also renders the templates of
+                                each theme, so update only switches a link
         """
         self._image_path = image_path
 
-        self._config = kwargs.get("config", config)
+        self._config = kwargs.get("config") or ConfigHandler().get_config()
         self._override = kwargs.get("override", False)
         self._run_hooks = kwargs.get("run_hooks", True)
         self._display_progress = kwargs.get(
@@ -93,14 +126,47 @@ class Themer:
             if self._config["use_custom_theme"]
             else None,
         )
+        self._jobs = kwargs.get("jobs", self._config["jobs"])
+        self._hash_algorithm = kwargs.get(
+            "hash_algorithm", self._config["hash_algorithm"]
+        )
+        self._recursive = kwargs.get("recursive", self._config["recursive"])
+        self._quantizer = kwargs.get("quantizer", self._config["quantizer"])
+        self._kmeans_iterations = kwargs.get(
+            "kmeans_iterations", self._config["kmeans_iterations"]
+        )
+        self._kmeans_sample_size = kwargs.get(
+            "kmeans_sample_size", self._config["kmeans_sample_size"]
+        )
+        self._theme_store_name = kwargs.get(
+            "theme_store_name", self._config["theme_store"]
+        )
+        self._hook_timeout = kwargs.get("hook_timeout", self._config["hook_timeout"])
+        self._executor = kwargs.get("executor", None)
+        self._prerender = kwargs.get("prerender", self._config["prerender"])
 
-        self._engine = get_engine(self._engine_name)
-        self._theme_out_path = os.path.join(self._cache_path, "themes/")
+        self._load_caches()
         self._template_path = os.path.join(
             os.path.abspath(os.path.dirname(__file__)), "data/template.json"
         )
 
-        os.makedirs(self._theme_out_path, exist_ok=True)
+    def set_image_path(self, image_path: str):
+        """
+        Sets the image or directory of images themes are used from
+
+        Arguments:
+            image_path (str): the path to the image or directory
+        """
+        self._image_path = image_path
+
+    def get_image_path(self) -> str:
+        """
+        Gets the image or directory of images themes are used from
+
+        Returns:
+            (str): the path to the image or directory
+        """
+        return self._image_path
 
     def set_override(self, state: bool):
         """
@@ -182,7 +248,6 @@ class Themer:
             engine_name (str): the name of the engine to use
         """
         self._engine_name = engine_name
-        self._engine = get_engine(engine_name)
 
     def get_engine_name(self) -> bool:
         """
@@ -193,6 +258,18 @@ class Themer:
         """
         return self._engine_name
 
+    def get_engine_names(self) -> List[str]:
+        """
+        Gets the names of the engines themes are generated with, every engine
+        when the engine name is 'all'
+
+        Returns:
+            (List[str]): the names of the engines
+        """
+        if self._engine_name == ALL_ENGINES:
+            return list(ENGINE_NAMES)
+        return [self._engine_name]
+
     def set_out_path(self, path: str):
         """
         Sets the path to export the theme to
@@ -219,8 +296,8 @@ class Themer:
             path (str): the cache path
         """
         self._cache_path = path
-        self._theme_out_path = os.path.join(self._cache_path, "themes/")
-        os.makedirs(self._theme_out_path, exist_ok=True)
+        self._theme_store.close()
+        self._load_caches()
 
     def get_cache_path(self) -> str:
         """
@@ -286,6 +363,616 @@ class Themer:
             (str): the path to the custom theme file
         """
 
+    def set_jobs(self, jobs: int):
+        """
+        Sets the amount of processes used to generate themes
+
+        Arguments:
+            jobs (int): the amount of processes, 0 uses every available core
+        """
+        self._jobs = jobs
+
+    def get_jobs(self) -> int:
+        """
+        Gets the amount of processes used to generate themes
+
+        Returns:
+            (int): the amount of processes, 0 uses every available core
+        """
+        return self._jobs
+
+    def set_hash_algorithm(self, algorithm: str):
+        """
+        Sets the hashlib algorithm themes are named by
+
+        Arguments:
+            algorithm (str): the name of the algorithm ('blake2b', 'md5', ...)
+        """
+        self._hash_algorithm = algorithm
+
+    def get_hash_algorithm(self) -> str:
+        """
+        Gets the hashlib algorithm themes are named by
+
+        Returns:
+            (str): the name of the algorithm
+        """
+        return self._hash_algorithm
+
+    def set_recursive(self, state: bool):
+        """
+        Sets whether images in subdirectories of the image path are included
+
+        Arguments:
+            state (bool): the state to update to
+        """
+        self._recursive = state
+
+    def get_recursive(self) -> bool:
+        """
+        Gets whether images in subdirectories of the image path are included
+
+        Returns:
+            (bool): the recursive state
+        """
+        return self._recursive
+
+    def set_quantizer(self, quantizer: str):
+        """
+        Sets the median cut implementation used by the engines, both produce
+        the same colors
+
+        Arguments:
+            quantizer (str): 'colorthief' or 'numpy'
+        """
+        self._quantizer = quantizer
+
+    def get_quantizer(self) -> str:
+        """
+        Gets the median cut implementation used by the engines
+
+        Returns:
+            (str): the name of the quantizer
+        """
+        return self._quantizer
+
+    def set_kmeans_iterations(self, iterations: int):
+        """
+        Sets the maximum amount of mini-batch updates of the kmeans engine
+
+        Arguments:
+            iterations (int): the iteration cap
+        """
+        self._kmeans_iterations = iterations
+
+    def get_kmeans_iterations(self) -> int:
+        """
+        Gets the maximum amount of mini-batch updates of the kmeans engine
+
+        Returns:
+            (int): the iteration cap
+        """
+        return self._kmeans_iterations
+
+    def set_kmeans_sample_size(self, sample_size: int):
+        """
+        Sets the maximum amount of pixels the kmeans engine clusters
+
+        Arguments:
+            sample_size (int): the amount of pixels
+        """
+        self._kmeans_sample_size = sample_size
+
+    def get_kmeans_sample_size(self) -> int:
+        """
+        Gets the maximum amount of pixels the kmeans engine clusters
+
+        Returns:
+            (int): the amount of pixels
+        """
+        return self._kmeans_sample_size
+
+    def set_theme_store_name(self, store_name: str):
+        """
+        Sets where the themes are stored
+
+        Arguments:
+            store_name (str): 'sqlite' for a single database file or 'json' for
+                              a file per theme
+        """
+        self._theme_store.close()
+        self._theme_store_name = store_name
+        self._theme_store = get_theme_store(store_name, self._cache_path)
+
+    def get_theme_store_name(self) -> str:
+        """
+        Gets where the themes are stored
+
+        Returns:
+            (str): the name of the theme store
+        """
+        return self._theme_store_name
+
+    def set_hook_timeout(self, timeout: float):
+        """
+        Sets the seconds a hook may run for before it is killed
+
+        Arguments:
+            timeout (float): the timeout, None to wait forever
+        """
+        self._hook_timeout = timeout
+
+    def get_hook_timeout(self) -> float:
+        """
+        Gets the seconds a hook may run for before it is killed
+
+        Returns:
+            (float): the timeout
+        """
+        return self._hook_timeout
+
+    def set_executor(self, executor: Executor):
+        """
+        Sets the process pool themes are generated on, it is not shut down by
+        the themer
+
+        Arguments:
+            executor (Executor): the process pool, None to start one for each
+                                 generate
+        """
+        self._executor = executor
+
+    def get_executor(self) -> Executor:
+        """
+        Gets the process pool themes are generated on
+
+        Returns:
+            (Executor): the process pool, None when one is started for each
+                        generate
+        """
+        return self._executor
+
+    def set_prerender(self, state: bool):
+        """
+        Sets whether generate also renders the templates of each theme, update
+        then points the current link at the rendered templates
+
+        Arguments:
+            state (bool): the prerender state
+        """
+        self._prerender = state
+
+    def get_prerender(self) -> bool:
+        """
+        Gets whether the templates of each theme are rendered by generate
+
+        Returns:
+            (bool): the prerender state
+        """
+        return self._prerender
+
+    def close(self):
+        """Writes anything outstanding and releases the theme store"""
+        self._theme_store.close()
+
+    def get_engine_options(self) -> Dict:
+        """
+        Gets the options the engines are created with
+
+        Returns:
+            (Dict): the keyword arguments passed to the engine
+        """
+        return {
+            "quantizer": self._quantizer,
+            "kmeans_iterations": self._kmeans_iterations,
+            "kmeans_sample_size": self._kmeans_sample_size,
+        }
+
+    def get_image_list(self) -> List[str]:
+        """
+        Gets the images of the image path. Directories are scanned incrementally,
+        only the directories that changed since the last scan are read and only
+        new or changed files are verified. Removed images are cleaned from the
+        caches, unless no images are left
+
+        Returns:
+            (List[str]): the absolute paths of the images
+        """
+        image_path = os.path.expanduser(self._image_path)
+        if not os.path.isdir(image_path):
+            try:
+                return file_utils.get_image_list(image_path, self._validity_cache)
+            finally:
+                self._validity_cache.save()
+
+        try:
+            images, added, removed = self._directory_scanner.scan(
+                image_path, self._recursive
+            )
+            if added or removed:
+                logger.info(
+                    "Found %s new and %s removed images", len(added), len(removed)
+                )
+            # An unmounted drive looks like an empty directory, its themes are
+            # kept for when it is back
+            if images:
+                self.clean_removed_images(removed)
+        finally:
+            self._directory_scanner.save()
+
+        if len(images) == 0:
+            raise FileNotFoundError("Specified directory does not contain any images!")
+
+        return images
+
+    def get_random_image(self) -> str:
+        """
+        Picks a random image of the image path directory, uniformly from the
+        images that have a theme for the current engine. The image is picked
+        from the listing of the last scan and the hash cache, so only the picked
+        image is touched, the directory is only scanned when no image in the
+        listing has a theme
+
+        Returns:
+            (str): the absolute path of the image
+        """
+        images = self._directory_scanner.get_cached_images(
+            self._image_path, self._recursive
+        )
+        hash_cache = self._get_hash_cache(self._hash_algorithm)
+
+        for image in iter_random_images(images):
+            digest = hash_cache.peek(image)
+            if digest is None or not self._theme_store.contains(
+                digest[:20], self._engine_name
+            ):
+                continue
+
+            # The listing may be out of date, so the picked image is checked
+            try:
+                if hash_cache.get(image) == digest:
+                    return image
+            except FileNotFoundError:
+                continue
+
+        return random.choice(self.get_image_list())
+
+    def clean_removed_images(self, image_paths: List[str]):
+        """
+        Removes images that no longer exist from the caches, along with the
+        themes that were generated from them
+
+        Arguments:
+            image_paths (List[str]): the absolute paths of the removed images
+        """
+        if not image_paths:
+            return
+
+        with self._theme_store.transaction():
+            for image_path in image_paths:
+                self._validity_cache.remove(image_path)
+                self._get_hash_cache(LEGACY_HASH_ALGORITHM).remove(image_path)
+                digest = self._get_hash_cache(self._hash_algorithm).remove(image_path)
+                if digest is not None:
+                    self._remove_themes(digest[:20], image_path)
+
+        self._validity_cache.save()
+        for hash_cache in self._hash_caches.values():
+            hash_cache.save()
+
+    def invalidate_images(self, image_paths: List[str]):
+        """
+        Updates the caches for images that were added or changed in place. The
+        directories holding them are read again on the next scan, and the
+        themes of the content a changed image replaced are removed
+
+        Arguments:
+            image_paths (List[str]): the absolute paths of the images
+        """
+        if not image_paths:
+            return
+
+        hash_cache = self._get_hash_cache(self._hash_algorithm)
+        previous_digests = [hash_cache.peek(image_path) for image_path in image_paths]
+        for image_path in image_paths:
+            self._directory_scanner.invalidate(os.path.dirname(image_path))
+        self._directory_scanner.save()
+
+        image_hashes = self.get_image_hashes(image_paths)
+        with self._theme_store.transaction():
+            for image_path, previous_digest, image_hash in zip(
+                image_paths, previous_digests, image_hashes
+            ):
+                if previous_digest is not None and previous_digest[:20] != image_hash:
+                    self._remove_themes(previous_digest[:20], image_path)
+
+    def _remove_themes(self, image_hash: str, image_path: str):
+        for engine_name in self._theme_store.get_engine_names(image_hash):
+            try:
+                theme = self._theme_store.get(image_hash, engine_name)
+            except (OSError, ValueError):
+                continue
+
+            # Another copy of the image may still use the theme
+            if theme is not None and theme.get("wallpaper") == image_path:
+                self._theme_store.remove(image_hash, engine_name)
+                remove_rendered_theme(
+                    self._get_rendered_path(), image_hash, engine_name
+                )
+
+        if not self._theme_store.get_engine_names(image_hash):
+            self._theme_store.remove_swatches(image_hash)
+
+    def get_image_hashes(
+        self, image_paths: List[str], algorithm: str = None
+    ) -> List[str]:
+        """
+        Gets the hashes the themes of images are stored under. Unchanged files
+        reuse their hash from the hash cache, the rest are hashed on a thread pool
+
+        Arguments:
+            image_paths (List[str]): the paths to the images
+            algorithm (str): the hashlib algorithm, defaults to the hash algorithm
+
+        Returns:
+            (List[str]): the hashes of the images, in the same order
+        """
+        algorithm = algorithm or self._hash_algorithm
+        hash_cache = self._get_hash_cache(algorithm)
+
+        image_paths = [os.path.abspath(os.path.expanduser(i)) for i in image_paths]
+        stat_results = [os.stat(image_path) for image_path in image_paths]
+        digests = [
+            hash_cache.get(image_path, stat_result)
+            for image_path, stat_result in zip(image_paths, stat_results)
+        ]
+
+        missing = [i for i, digest in enumerate(digests) if digest is None]
+        missing_digests = file_utils.hash_files(
+            [image_paths[i] for i in missing], algorithm
+        )
+        for i, digest in zip(missing, missing_digests):
+            digests[i] = digest
+            hash_cache.set(image_paths[i], digest, stat_results[i])
+
+        hash_cache.save()
+        return [digest[:20] for digest in digests]
+
+    def get_image_hash(self, image_path: str, algorithm: str = None) -> str:
+        """
+        Gets the hash the themes of an image are stored under, unchanged files
+        reuse the hash from the hash cache instead of being read again
+
+        Arguments:
+            image_path (str): the path to the image
+            algorithm (str): the hashlib algorithm, defaults to the hash algorithm
+
+        Returns:
+            (str): the hash of the image
+        """
+        return self.get_image_hashes([image_path], algorithm)[0]
+
+    def has_legacy_themes(self) -> bool:
+        """
+        Checks if themes may still be stored under the legacy md5 name of their
+        image. The themes stored the first time a cache is used with another
+        hash algorithm are taken to be legacy themes, until each was migrated
+        or found to be gone
+
+        Returns:
+            (bool): whether to look for themes under the legacy name
+        """
+        if self._hash_algorithm == LEGACY_HASH_ALGORITHM:
+            return False
+
+        if self._legacy_themes is None:
+            legacy_themes_path = os.path.join(self._cache_path, LEGACY_THEMES_FILE)
+            try:
+                with open(legacy_themes_path, "rb") as legacy_themes_file:
+                    self._legacy_themes = {
+                        tuple(key) for key in json.load(legacy_themes_file)
+                    }
+            except (FileNotFoundError, ValueError):
+                self._legacy_themes = set(self._theme_store.get_keys())
+                self._save_legacy_themes()
+
+        return bool(self._legacy_themes)
+
+    def _save_legacy_themes(self):
+        os.makedirs(self._cache_path, exist_ok=True)
+        file_utils.atomic_write(
+            os.path.join(self._cache_path, LEGACY_THEMES_FILE),
+            json.dumps(sorted(self._legacy_themes)).encode("utf-8"),
+        )
+
+    def migrate_legacy_themes(
+        self, images: List[List[str]], engine_name: str = None
+    ) -> List[List[str]]:
+        """
+        Renames themes stored under the legacy md5 name of an image to the name
+        of the current hash algorithm, the images are only hashed again while
+        legacy themes are left
+
+        Arguments:
+            images (List[List[str]]): [image path, image hash] pairs of images
+                                      without a theme under their current hash
+            engine_name (str): the engine of the themes, defaults to the
+                               current engine
+
+        Returns:
+            (List[List[str]]): the pairs that still have no theme
+        """
+        if not images or not self.has_legacy_themes():
+            return images
+
+        engine_name = engine_name or self._engine_name
+        legacy_hashes = self.get_image_hashes(
+            [image for image, _ in images], LEGACY_HASH_ALGORITHM
+        )
+        missing = []
+        migrated = False
+        with self._theme_store.transaction():
+            for (image, image_hash), legacy_hash in zip(images, legacy_hashes):
+                if (legacy_hash, engine_name) not in self._legacy_themes:
+                    missing.append([image, image_hash])
+                    continue
+
+                # Gone from the store when it was not renamed
+                self._legacy_themes.discard((legacy_hash, engine_name))
+                migrated = True
+                if not self._theme_store.rename(legacy_hash, image_hash, engine_name):
+                    missing.append([image, image_hash])
+
+        if migrated:
+            self._save_legacy_themes()
+
+        return missing
+
+    def get_theme(self, image_path: str) -> Dict:
+        """
+        Gets the theme of an image for the current engine, migrating a theme
+        stored under the legacy name
+
+        Arguments:
+            image_path (str): the path to the image
+
+        Raises:
+            (NoPreGenThemeError): when the theme has not been generated
+
+        Returns:
+            (Dict): the theme, with the colors, wallpaper and primary color
+        """
+        image_hash = self.get_image_hash(image_path)
+        theme = self._theme_store.get(image_hash, self._engine_name)
+
+        if theme is None and not self.migrate_legacy_themes([[image_path, image_hash]]):
+            theme = self._theme_store.get(image_hash, self._engine_name)
+
+        if theme is None:
+            raise file_utils.NoPreGenThemeError(
+                "Theme file for this image does not exist!"
+            )
+
+        return theme
+
+    def _load_caches(self):
+        self._theme_store = get_theme_store(self._theme_store_name, self._cache_path)
+        self._legacy_themes = None
+        self._hash_caches = {}
+        self._validity_cache = StatCache(os.path.join(self._cache_path, "images.json"))
+        self._template_cache = StatCache(
+            os.path.join(self._cache_path, "templates.json")
+        )
+        self._directory_scanner = DirectoryScanner(
+            os.path.join(self._cache_path, "library.json"), self._validity_cache
+        )
+
+    def reload_caches(self):
+        """
+        Loads the caches from disk again when another process saved them since,
+        so a long running themer does not overwrite what they cached
+        """
+        self._directory_scanner.reload_if_changed()
+        self._template_cache.reload_if_changed()
+        for hash_cache in self._hash_caches.values():
+            hash_cache.reload_if_changed()
+
+    def _get_rendered_path(self) -> str:
+        return os.path.join(self._cache_path, "rendered")
+
+    def get_rendered_theme_path(self, image_hash: str, engine_name: str = None) -> str:
+        """
+        Gets the directory the templates of a theme are rendered to, holding
+        the dark and light directories. It is a link to the latest render and
+        depends on the current templates, so changing a template leaves the
+        earlier renders unused
+
+        Arguments:
+            image_hash (str): the hash of the image
+            engine_name (str): the name of the engine, defaults to the engine
+                               name
+
+        Returns:
+            (str): the path to the directory
+        """
+        try:
+            fingerprint = get_templates_fingerprint(
+                self._user_templates_path, self._template_cache
+            )
+        finally:
+            self._template_cache.save()
+
+        return os.path.join(
+            self._get_rendered_path(),
+            fingerprint,
+            f"{image_hash}-{engine_name or self._engine_name}",
+        )
+
+    def prerender_theme(
+        self, image_hash: str, engine_name: str = None, replace: bool = False
+    ) -> str:
+        """
+        Renders the templates of a theme, both dark and light, unless they were
+        rendered with the current templates already
+
+        Arguments:
+            image_hash (str): the hash of the image
+            engine_name (str): the name of the engine, defaults to the engine
+                               name
+            replace (bool): whether to render again when already rendered
+
+        Raises:
+            (NoPreGenThemeError): when the theme has not been generated
+
+        Returns:
+            (str): the directory the templates were rendered to
+        """
+        engine_name = engine_name or self._engine_name
+        rendered_path = self.get_rendered_theme_path(image_hash, engine_name)
+        if os.path.isdir(rendered_path) and not replace:
+            return rendered_path
+
+        theme_data = self._theme_store.get(image_hash, engine_name)
+        if theme_data is None:
+            raise file_utils.NoPreGenThemeError(
+                "Theme file for this image does not exist!"
+            )
+
+        try:
+            results = render_theme(
+                self._user_templates_path,
+                rendered_path,
+                theme_data,
+                self._template_cache,
+            )
+        finally:
+            self._template_cache.save()
+
+        for template, result in results.items():
+            if isinstance(result, Exception):
+                logger.error("Failed to render {%s}: %s", template, result)
+
+        return rendered_path
+
+    def _update_prerendered(self):
+        image_hash = self.get_image_hash(self._image_path)
+        rendered_path = self.prerender_theme(image_hash)
+
+        file_utils.atomic_symlink(
+            os.path.join(rendered_path, "light" if self._use_light_theme else "dark"),
+            os.path.join(self._out_path, "current"),
+        )
+
+        # Renders of earlier templates are no longer linked to
+        remove_stale_renders(self._get_rendered_path(), os.path.dirname(rendered_path))
+
+    def _get_hash_cache(self, algorithm: str) -> StatCache:
+        if algorithm not in self._hash_caches:
+            self._hash_caches[algorithm] = StatCache(
+                os.path.join(self._cache_path, f"hashes-{algorithm}.json")
+            )
+        return self._hash_caches[algorithm]
+
     def get_color_palette(self) -> Dict:
         """
         Gets the generated color palette depending on if the light theme or the
@@ -303,127 +990,210 @@ class Themer:
         Returns:
             (Dict): a dictionary containing all the colors
         """
-        md5_hash = file_utils.md5_file(self._image_path)[:20]
-        theme_out_file_path = os.path.join(
-            self._theme_out_path, f"{md5_hash}-{self._engine_name}.json"
-        )
-
-        if not os.path.isfile(theme_out_file_path):
-            raise file_utils.NoPreGenThemeError(
-                "Theme file for this image does not exist!"
-            )
-
-        with open(theme_out_file_path, "r+", encoding="UTF-8") as json_data:
-            theme_data = json.load(json_data)
-
-        colors = theme_data["colors"]
+        colors = self.get_theme(self._image_path)["colors"]
 
         return colors["light"] if self._use_light_theme else colors["dark"]
 
-    def generate(self):
-        """Generates the theme"""
+    def generate(self, engine_names: List[str] = None, image_paths: List[str] = None):
+        """
+        Generates the themes, every image is decoded and quantized once no
+        matter how many engines the themes are generated with. The swatches
+        are cached in the theme store, so images are not decoded at all when
+        their themes are generated again or for another engine
+
+        Arguments:
+            engine_names (List[str]): the engines to generate the themes with,
+                                      defaults to get_engine_names
+            image_paths (List[str]): the images to generate the themes of,
+                                     defaults to get_image_list
+        """
+        engine_names = engine_names or self.get_engine_names()
+        if image_paths is None:
+            image_paths = self.get_image_list()
         path_image_names = [
-            [i, f"{file_utils.md5_file(i)[:20]}-{self._engine_name}"]
-            for i in file_utils.get_image_list(self._image_path)
+            list(i) for i in zip(image_paths, self.get_image_hashes(image_paths))
         ]
-        unprocessed_images = (
-            path_image_names
-            if self._override
-            else get_non_generated(
-                path_image_names,
-                self._theme_out_path,
+
+        # The engines each image is missing a theme for
+        missing_engines = {}
+        for engine_name in engine_names:
+            unprocessed_engine_images = (
+                path_image_names
+                if self._override
+                else self.migrate_legacy_themes(
+                    get_non_generated(path_image_names, self._theme_store, engine_name),
+                    engine_name,
+                )
             )
-        )
+            for image, image_hash in unprocessed_engine_images:
+                missing_engines.setdefault((image, image_hash), []).append(engine_name)
+
+        engines = {engine_name: get_engine(engine_name) for engine_name in engine_names}
+        engine_options = self.get_engine_options()
+        swatch_keys = {
+            engine.get_swatch_key(engine_options) for engine in engines.values()
+        } - {None}
+
+        cached_swatches = {}
+        for image, image_hash in missing_engines:
+            cached_swatches[image_hash] = {}
+            for swatch_key in swatch_keys:
+                swatches = self._theme_store.get_swatches(image_hash, swatch_key)
+                if swatches is not None:
+                    cached_swatches[image_hash][swatch_key] = swatches
+
+        unprocessed_images = [
+            [image, image_hash, cached_swatches[image_hash]]
+            for image, image_hash in missing_engines
+        ]
+        stored_themes = []
 
         if len(unprocessed_images) > 0:
-            for i in tqdm.tqdm(
-                range(len(unprocessed_images)),
+            results = generate_theme_colors_iter(
+                unprocessed_images,
+                engines,
+                not self._custom_theme_path,
+                self._jobs,
+                engine_options,
+                self._executor,
+            )
+            import tqdm  # pylint: disable=import-outside-toplevel
+
+            progress = tqdm.tqdm(
+                results,
+                total=len(unprocessed_images),
                 bar_format=log.bar_format,
-                disable=self._display_progress,
-            ):
-                image = unprocessed_images[i][0]
-                filename = unprocessed_images[i][1]
-                out_file = os.path.join(self._theme_out_path, f"{filename}.json")
+                disable=not self._display_progress,
+            )
 
-                create_tmp_image(image, TMP_FILE)
+            with self._theme_store.transaction():
+                for i, (image, image_hash, result) in enumerate(progress):
+                    if isinstance(result, Exception):
+                        tqdm_logger.error(
+                            "Failed to generate theme for {%s}: %s", image, result
+                        )
+                        continue
+
+                    tqdm_logger.log(
+                        15,
+                        "[%s/%s] Generated theme for {%s}",
+                        str(i + 1),
+                        str(len(unprocessed_images)),
+                        image,
+                    )
 
-                color_engine = self._engine(TMP_FILE)
-                dominant_color = color_utils.rgb_to_hex(
-                    color_engine.get_dominant_color()
-                )
+                    themes, swatches = result
+                    for swatch_key, image_swatches in swatches.items():
+                        if swatch_key not in cached_swatches[image_hash]:
+                            self._theme_store.put_swatches(
+                                image_hash, swatch_key, image_swatches
+                            )
+
+                    for engine_name in missing_engines[(image, image_hash)]:
+                        if self._store_theme(
+                            image, image_hash, engine_name, themes[engine_name]
+                        ):
+                            stored_themes.append((image_hash, engine_name))
+        else:
+            logger.info("No themes to generate.")
 
-                tqdm_logger.log(
-                    15,
-                    "[%s/%s] Generating theme for {%s}...",
-                    str(i + 1),
-                    str(len(unprocessed_images)),
-                    image,
-                )
+        if self._prerender:
+            for image_hash, engine_name in stored_themes:
+                self.prerender_theme(image_hash, engine_name, replace=True)
 
-                if not self._custom_theme_path:
-                    palette = color_engine.get_palette()
-                    create_template_from_palette(
-                        palette, dominant_color, str(image), out_file
-                    )
-                else:
-                    create_template_from_custom_palette(
-                        self._custom_theme_path, dominant_color, str(image), out_file
-                    )
+    def _store_theme(
+        self, image: str, image_hash: str, engine_name: str, result
+    ) -> bool:
+        if isinstance(result, Exception):
+            tqdm_logger.error(
+                "Failed to generate %s theme for {%s}: %s", engine_name, image, result
+            )
+            return False
+
+        palette, dominant_color = result
+        if not self._custom_theme_path:
+            create_template_from_palette(
+                palette,
+                dominant_color,
+                str(image),
+                self._theme_store,
+                image_hash,
+                engine_name,
+            )
         else:
-            logger.info("No themes to generate.")
+            create_template_from_custom_palette(
+                self._custom_theme_path,
+                dominant_color,
+                str(image),
+                self._theme_store,
+                image_hash,
+                engine_name,
+            )
+
+        return True
 
     def update(self):
-        """Updates the current theme"""
+        """
+        Updates the current theme. With prerender the current link is pointed
+        at the rendered templates of the theme, which are rendered first if
+        needed, otherwise the templates are rendered into the out path
+        """
         if os.path.isdir(self._image_path):
-            images = file_utils.get_image_list(self._image_path)
-            random.shuffle(images)
-            self._image_path = images[0]
+            self._image_path = self.get_random_image()
         elif not os.path.isfile(self._image_path):
             raise file_utils.NoPreGenThemeError("Provided file is not recognised!")
 
-        md5_hash = file_utils.md5_file(self._image_path)[:20]
-        theme_out_file_path = os.path.join(
-            self._theme_out_path, f"{md5_hash}-{self._engine_name}.json"
-        )
+        theme_data = self.get_theme(self._image_path)
 
-        if not os.path.isfile(theme_out_file_path):
-            raise file_utils.NoPreGenThemeError(
-                "Theme file for this image does not exist!"
-            )
+        if self._prerender:
+            self._update_prerendered()
+        else:
+            self._update_templates(theme_data)
 
-        with open(theme_out_file_path, "r+", encoding="UTF-8") as json_data:
-            theme_data = json.load(json_data)
+        # Link wallpaper to cache folder
+        symlink_image_path(theme_data["wallpaper"], self._out_path)
+
+        # Run external scripts
+        if self._run_hooks:
+            file_utils.run_hooks(
+                use_light_theme=self._use_light_theme,
+                hooks_directory=self._user_hooks_path,
+                timeout=self._hook_timeout,
+            )
 
+    def _update_templates(self, theme_data: Dict):
         colors = theme_data["colors"]
         primary_color = theme_data["primary"]
-        wallpaper = theme_data["wallpaper"]
 
         theme_colors = colors["light"] if self._use_light_theme else colors["dark"]
 
+        written = skipped = 0
         try:
-            templates = get_template_files(self._user_templates_path)
-
-            for template in templates:
-                template_path = os.path.join(self._user_templates_path, template)
-                out_file = os.path.join(self._out_path, template[:-5])
-                create_file_from_template(
-                    template_path, out_file, theme_colors, primary_color
-                )
+            results = create_files_from_templates(
+                self._user_templates_path,
+                self._out_path,
+                theme_colors,
+                primary_color,
+                self._template_cache,
+            )
         except FileNotFoundError:
             tqdm_logger.warning("No templates files found...")
+            results = {}
+        finally:
+            self._template_cache.save()
 
-        # Link wallpaper to cache folder
-        symlink_image_path(wallpaper, self._out_path)
+        for template, result in results.items():
+            if isinstance(result, Exception):
+                tqdm_logger.error("Failed to create {%s}: %s", template, result)
+            elif result:
+                written += 1
+            else:
+                skipped += 1
 
-        # Run external scripts
-        if self._run_hooks:
-            file_utils.run_hooks(
-                use_light_theme=self._use_light_theme,
-                hooks_directory=self._user_hooks_path,
-            )
+        logger.info("Wrote %s templates, skipped %s unchanged", written, skipped)
 
 
-def get_engine(engine_name: str) -> BaseEngine:
+def get_engine(engine_name: str) -> "BaseEngine":
     """
     Get the engine from the name given
 
@@ -448,11 +1218,447 @@ def get_engine(engine_name: str) -> BaseEngine:
 
         return PastelHueEngine
 
+    if engine_name == "pillow":
+        from kadai.engine import PillowEngine
+
+        return PillowEngine
+
+    if engine_name == "kmeans":
+        from kadai.engine import KMeansEngine
+
+        return KMeansEngine
+
     from kadai.engine import VibranceEngine
 
     return VibranceEngine
 
 
+def generate_theme_colors(
+    image_path: str,
+    engine: Type["BaseEngine"],
+    make_palette: bool = True,
+    engine_options: Dict = None,
+) -> Tuple[Dict, str]:
+    """
+    Generate the palette and dominant color for an image, this is what runs
+    within the worker processes so it must not touch any shared state
+
+    Arguments:
+        image_path (str): the path to the image
+        engine (Type[BaseEngine]): the engine class to generate the colors with
+        make_palette (bool): whether to generate the palette, the palette is
+                             None when this is false
+        engine_options (Dict): the keyword arguments passed to the engine
+
+    Returns:
+        (Tuple[Dict, str]): the palette and the dominant color in hex
+    """
+    from kadai.utils import color_utils  # pylint: disable=import-outside-toplevel
+
+    color_engine = engine(create_thumbnail(image_path), **(engine_options or {}))
+    dominant_color = color_utils.rgb_to_hex(color_engine.get_dominant_color())
+    palette = color_engine.get_palette() if make_palette else None
+
+    return palette, dominant_color
+
+
+def generate_themes_colors(
+    image_path: str,
+    engines: Dict[str, Type["BaseEngine"]],
+    make_palette: bool = True,
+    engine_options: Dict = None,
+    swatches: Dict[str, List[Tuple[Tuple[int], int]]] = None,
+) -> Tuple[Dict[str, Union[Tuple[Dict, str], Exception]], Dict[str, List]]:
+    """
+    Generate the palette and dominant color of an image for several engines.
+    Engines with the same swatch key share the quantized colors, so only their
+    own post-processing is repeated, and the image is only decoded when a
+    swatch key has no swatches yet
+
+    Arguments:
+        image_path (str): the path to the image
+        engines (Dict[str, Type[BaseEngine]]): the engine classes by name
+        make_palette (bool): whether to generate the palettes, the palettes are
+                             None when this is false
+        engine_options (Dict): the keyword arguments passed to the engines
+        swatches (Dict[str, List[Tuple[Tuple[int], int]]]): swatches of the
+            image cached from an earlier run, by swatch key
+
+    Returns:
+        (Tuple[Dict[str, Union[Tuple[Dict, str], Exception]], Dict[str, List]]):
+            the palette and the dominant color in hex of each engine, or the
+            exception it raised, and the swatches of the image by swatch key
+    """
+    from kadai.utils import color_utils  # pylint: disable=import-outside-toplevel
+
+    swatches = dict(swatches or {})
+    thumbnail = None
+    results = {}
+
+    for engine_name, engine in engines.items():
+        options = dict(engine_options or {})
+        swatch_key = engine.get_swatch_key(options)
+
+        try:
+            if swatch_key is not None:
+                if swatch_key not in swatches:
+                    if thumbnail is None:
+                        thumbnail = create_thumbnail(image_path)
+                    swatches[swatch_key] = engine.quantize(thumbnail, **options)
+                options["swatches"] = swatches[swatch_key]
+            elif thumbnail is None:
+                thumbnail = create_thumbnail(image_path)
+
+            color_engine = engine(thumbnail, **options)
+            dominant_color = color_utils.rgb_to_hex(color_engine.get_dominant_color())
+            palette = color_engine.get_palette() if make_palette else None
+        except Exception as exception:  # pylint: disable=broad-except
+            results[engine_name] = exception
+            continue
+
+        results[engine_name] = (palette, dominant_color)
+
+    return results, swatches
+
+
+def generate_theme_colors_iter(
+    images: List[List[str]],
+    engine: Union[Type["BaseEngine"], Dict[str, Type["BaseEngine"]]],
+    make_palette: bool = True,
+    jobs: int = 0,
+    engine_options: Dict = None,
+    executor: Executor = None,
+):
+    """
+    Generate the colors for a list of images, spreading the work over a
+    process pool when more than one job is requested. Results are yielded in
+    the order they complete, a failed image yields its exception instead of
+    the colors so the remaining images are still processed
+
+    Arguments:
+        images (List[List[str]]): a list of [image path, image hash] pairs,
+            with the cached swatches of the image as a third item when the
+            engines are given by name
+        engine (Union[Type[BaseEngine], Dict[str, Type[BaseEngine]]]): the
+            engine class to generate the colors with, or engine classes by name
+            to generate the colors of each with generate_themes_colors
+        make_palette (bool): whether to generate the palettes
+        jobs (int): the amount of processes to use, 0 uses every available core
+        engine_options (Dict): the keyword arguments passed to the engine
+        executor (Executor): a process pool to use instead of starting one, it
+                             is left running afterwards
+
+    Yields:
+        (Tuple[str, str, Union[Tuple[Dict, str], Tuple[Dict, Dict], Exception]]):
+            the image path, the image hash and the generated colors or the
+            raised exception
+    """
+    jobs = min(jobs or os.cpu_count() or 1, len(images))
+    generate_colors = (
+        generate_themes_colors if isinstance(engine, dict) else generate_theme_colors
+    )
+
+    if jobs <= 1:
+        for image, image_hash, *swatches in images:
+            try:
+                yield image, image_hash, generate_colors(
+                    image, engine, make_palette, engine_options, *swatches
+                )
+            except Exception as exception:  # pylint: disable=broad-except
+                yield image, image_hash, exception
+        return
+
+    if executor is not None:
+        yield from iter_completed(
+            executor, generate_colors, images, engine, make_palette, engine_options
+        )
+        return
+
+    # pylint: disable=import-outside-toplevel
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from iter_completed(
+            executor, generate_colors, images, engine, make_palette, engine_options
+        )
+
+
+def iter_completed(
+    executor: Executor,
+    generate_colors,
+    images: List[List[str]],
+    engine: Union[Type["BaseEngine"], Dict[str, Type["BaseEngine"]]],
+    make_palette: bool,
+    engine_options: Dict,
+):
+    """
+    Submit the images to an executor and yield the results as they complete,
+    see generate_theme_colors_iter
+
+    Arguments:
+        executor (Executor): the executor to submit to
+        generate_colors (Callable): generate_theme_colors or
+                                    generate_themes_colors
+        images (List[List[str]]): the images and their hashes
+        engine (Union[Type[BaseEngine], Dict[str, Type[BaseEngine]]]): the
+            engine class or classes
+        make_palette (bool): whether to generate the palettes
+        engine_options (Dict): the keyword arguments passed to the engine
+
+    Yields:
+        (Tuple[str, str, Any]): the image path, the image hash and the
+            generated colors or the raised exception
+    """
+    futures = {
+        executor.submit(
+            generate_colors, image, engine, make_palette, engine_options, *swatches
+        ): (image, image_hash)
+        for image, image_hash, *swatches in images
+    }
+
+    for future in as_completed(futures):
+        image, image_hash = futures[future]
+        try:
+            yield image, image_hash, future.result()
+        except Exception as exception:  # pylint: disable=broad-except
+            yield image, image_hash, exception
+
+
+def iter_random_images(images: List[str]):
+    """
+    Yield random images, first a few independent picks so a pick is cheap when
+    most images qualify, then every image in a random order so a qualifying
+    image is always found
+
+    Arguments:
+        images (List[str]): the images to pick from
+
+    Yields:
+        (str): the picked images
+    """
+    for _ in range(min(RANDOM_PICK_ATTEMPTS, len(images))):
+        yield random.choice(images)
+
+    yield from random.sample(images, len(images))
+
+
+def create_files_from_templates(
+    template_directory: str,
+    out_path: str,
+    colors: Dict,
+    primary_color: str,
+    template_cache: StatCache = None,
+    jobs: int = 0,
+) -> Dict[str, Union[bool, Exception]]:
+    """
+    Create the file of every template in a directory, the templates are
+    rendered and written on a thread pool so the latency of each file overlaps
+
+    Arguments:
+        template_directory (str): the directory containing the templates
+        out_path (str): the directory to create the files in
+        colors (Dict): the colors to use
+        primary_color (str): the primary color
+        template_cache (StatCache): the cache of compiled templates
+        jobs (int): the amount of threads to use, 0 picks based on the cores
+
+    Returns:
+        (Dict[str, Union[bool, Exception]]): whether the file of each template
+            was written, or the exception creating it raised, in template order
+    """
+    templates = sorted(get_template_files(template_directory))
+
+    def create_file(template: str) -> Union[bool, Exception]:
+        try:
+            return create_file_from_template(
+                os.path.join(template_directory, template),
+                os.path.join(out_path, template[:-5]),
+                colors,
+                primary_color,
+                template_cache,
+            )
+        except Exception as exception:  # pylint: disable=broad-except
+            return exception
+
+    jobs = min(jobs or (os.cpu_count() or 1) + 4, len(templates))
+    if jobs <= 1:
+        return {template: create_file(template) for template in templates}
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return dict(zip(templates, executor.map(create_file, templates)))
+
+
+def get_templates_fingerprint(
+    template_directory: str, template_cache: StatCache = None
+) -> str:
+    """
+    Get a fingerprint of the templates in a directory, it changes when a
+    template is added, removed or changed. Unchanged templates are taken from
+    the template cache without being read
+
+    Arguments:
+        template_directory (str): the directory containing the templates
+        template_cache (StatCache): the cache of compiled templates
+
+    Returns:
+        (str): the fingerprint in hex
+    """
+    try:
+        templates = sorted(get_template_files(template_directory))
+    except FileNotFoundError:
+        templates = []
+
+    fingerprint = hashlib.blake2b(digest_size=8)
+    for template in templates:
+        compiled_template = template_utils.load_template(
+            os.path.join(template_directory, template), template_cache
+        )
+        fingerprint.update(template.encode("utf-8") + b"\0")
+        fingerprint.update(
+            template_utils.join_template(compiled_template).encode("utf-8") + b"\0"
+        )
+
+    return fingerprint.hexdigest()
+
+
+def render_theme(
+    template_directory: str,
+    rendered_path: str,
+    theme_data: Dict,
+    template_cache: StatCache = None,
+) -> Dict[str, Union[bool, Exception]]:
+    """
+    Render the templates of a theme into a directory, the dark and light files
+    go into the dark and light directories within it. Everything is rendered
+    into a new uniquely named directory that the rendered path is then linked
+    to, so the directory is only seen once complete
+
+    Arguments:
+        template_directory (str): the directory containing the templates
+        rendered_path (str): the link to the directory rendered to, an
+                             earlier render is replaced
+        theme_data (Dict): the theme, with the colors and primary color
+        template_cache (StatCache): the cache of compiled templates
+
+    Returns:
+        (Dict[str, Union[bool, Exception]]): whether the file of each template
+            was written, or the exception creating it raised, by the path of
+            the file within the directory
+    """
+    parent_path = os.path.dirname(rendered_path)
+    os.makedirs(parent_path, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(
+        dir=parent_path, prefix=f".{os.path.basename(rendered_path)}."
+    )
+
+    results = {}
+    try:
+        os.chmod(tmp_path, 0o777 & ~file_utils.get_umask())
+        for variant in ("dark", "light"):
+            os.mkdir(os.path.join(tmp_path, variant))
+            try:
+                variant_results = create_files_from_templates(
+                    template_directory,
+                    os.path.join(tmp_path, variant),
+                    theme_data["colors"][variant],
+                    theme_data["primary"],
+                    template_cache,
+                )
+            except FileNotFoundError:
+                logger.warning("No templates files found...")
+                variant_results = {}
+
+            for template, result in variant_results.items():
+                results[os.path.join(variant, template[:-5])] = result
+
+        link_render(tmp_path, rendered_path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    return results
+
+
+def link_render(render_path: str, rendered_path: str):
+    """
+    Point the rendered path of a theme at the directory it was rendered to,
+    then remove the directory it pointed at before. The link is replaced
+    atomically, so the files of the current theme are never missing, even
+    when the theme linked to is rendered again
+
+    Arguments:
+        render_path (str): the uniquely named directory rendered to, next to
+                           the rendered path
+        rendered_path (str): the link to point at it
+    """
+    try:
+        old_render = os.readlink(rendered_path)
+    except FileNotFoundError:
+        old_render = None
+
+    file_utils.atomic_symlink(os.path.basename(render_path), rendered_path)
+    if old_render is not None:
+        shutil.rmtree(
+            os.path.join(os.path.dirname(rendered_path), old_render),
+            ignore_errors=True,
+        )
+
+
+def remove_render(rendered_path: str):
+    """
+    Remove the link to the rendered templates of a theme and the directory
+    they were rendered to
+
+    Arguments:
+        rendered_path (str): the link to the rendered templates
+    """
+    try:
+        render_path = os.readlink(rendered_path)
+        os.unlink(rendered_path)
+    except FileNotFoundError:
+        return
+
+    shutil.rmtree(
+        os.path.join(os.path.dirname(rendered_path), render_path), ignore_errors=True
+    )
+
+
+def remove_rendered_theme(rendered_path: str, image_hash: str, engine_name: str):
+    """
+    Remove the rendered templates of a theme, whatever templates they were
+    rendered with
+
+    Arguments:
+        rendered_path (str): the directory holding the renders
+        image_hash (str): the hash of the image
+        engine_name (str): the name of the engine
+    """
+    try:
+        fingerprints = os.listdir(rendered_path)
+    except FileNotFoundError:
+        return
+
+    for fingerprint in fingerprints:
+        remove_render(
+            os.path.join(rendered_path, fingerprint, f"{image_hash}-{engine_name}")
+        )
+
+
+def remove_stale_renders(rendered_path: str, current_path: str):
+    """
+    Remove the renders of templates other than the current ones
+
+    Arguments:
+        rendered_path (str): the directory holding the renders
+        current_path (str): the directory of the renders of the current
+                            templates
+    """
+    for fingerprint in os.listdir(rendered_path):
+        path = os.path.join(rendered_path, fingerprint)
+        if path != current_path:
+            shutil.rmtree(path, ignore_errors=True)
+
+
 def get_template_files(template_directory: str) -> List[str]:
     """
     Get all templates in the templates folder
@@ -466,49 +1672,41 @@ def get_template_files(template_directory: str) -> List[str]:
     return [f for f in os.listdir(template_directory) if re.match(r".*\.base$", f)]
 
 
-def get_non_generated(image_paths: List[str], theme_directory: str) -> List[str]:
+def get_non_generated(
+    image_paths: List[List[str]], theme_store: ThemeStore, engine_name: str
+) -> List[List[str]]:
     """
     Get the files that have not been generated by the themer
 
     Arguments:
-        image_paths (List[str]): a list containing the paths of images
-        theme_directory (str): the path in which the themes are stored
+        image_paths (List[List[str]]): a list of [image path, image hash] pairs
+        theme_store (ThemeStore): the store of the generated themes
+        engine_name (str): the name of the engine the themes are generated with
 
     Returns:
-        (List[str]): a list containing images that have not had their themes
-                     generated
-    """
-    ungenerated_images = []
-    theme_directory = os.path.expanduser(theme_directory)
-    for image_path in image_paths:
-        filename = image_path[1]
-
-        matched_files = [
-            os.path.join(theme_directory, x.name)
-            for x in os.scandir(theme_directory)
-            if filename in x.name
-        ]
-
-        if len(matched_files) == 0:
-            ungenerated_images.append(image_path)
-
-    return ungenerated_images
+        (List[List[str]]): the pairs of the images that have not had their
+                           themes generated
+    """
+    return [
+        image_path
+        for image_path in image_paths
+        if not theme_store.contains(image_path[1], engine_name)
+    ]
 
 
-def clear_write_data_to_file(file_path: str, data: TextIOWrapper):
+def clear_write_data_to_file(file_path: str, data: str) -> bool:
     """
-    Clear the data in a file and write data to it
+    Replace the data in a file atomically, the file is left untouched when it
+    already holds the data
 
     Arguments:
         file_path (str): the path to the file
-        data (io.TextIOWrapper): the data to write to the file
-    """
-    if os.path.isfile(file_path):
-        with open(os.path.expanduser(file_path), "w", encoding="UTF-8"):
-            pass
+        data (str): the data to write to the file
 
-    with open(os.path.expanduser(file_path), "a", encoding="UTF-8") as file:
-        file.write(data)
+    Returns:
+        (bool): whether the file was written
+    """
+    return file_utils.write_if_changed(file_path, data.encode("utf-8"))
 
 
 def clear_write_json_to_file(file_path: str, json_data):
@@ -530,47 +1728,94 @@ def clear_write_json_to_file(file_path: str, json_data):
 
 
 def create_template_from_palette(
-    palette: Dict, dominant_color: str, image_path: str, out_path: str
+    palette: Dict,
+    dominant_color: str,
+    image_path: str,
+    theme_store: ThemeStore,
+    image_hash: str,
+    engine_name: str,
 ):
     """
-    Create and write the file from a template using a palette
+    Create the theme from a palette and store it
 
     Arguments:
         palette (Dict): the color palette to write
         dominant_color (str): the dominant color generated in hex
         image_path (str): the path to the image used in the theme
-        out_path (str): the path the file will be exported to
+        theme_store (ThemeStore): the store to put the theme in
+        image_hash (str): the hash of the image
+        engine_name (str): the name of the engine the theme was generated with
     """
     file_contents = {}
     file_contents["colors"] = palette
     file_contents["wallpaper"] = image_path
     file_contents["primary"] = dominant_color
 
-    clear_write_json_to_file(out_path, file_contents)
+    theme_store.put(image_hash, engine_name, file_contents)
 
 
 def create_template_from_custom_palette(
-    custom_theme_path: str, dominant_color: str, image_path: str, out_path: str
+    custom_theme_path: str,
+    dominant_color: str,
+    image_path: str,
+    theme_store: ThemeStore,
+    image_hash: str,
+    engine_name: str,
 ):
     custom_theme_data = {}
     with open(custom_theme_path, "r+", encoding="UTF-8") as json_data:
         custom_theme_data = json.load(json_data)
 
     create_template_from_palette(
-        custom_theme_data, dominant_color, image_path, out_path
+        custom_theme_data,
+        dominant_color,
+        image_path,
+        theme_store,
+        image_hash,
+        engine_name,
     )
 
 
+def create_thumbnail(image_path: str) -> "Image.Image":
+    """
+    Create a smaller version of the image in memory so color extraction does not
+    take as long. JPEGs are decoded at a reduced scale and reduced further
+    before resizing, so the work done stays close to the thumbnail size no
+    matter how large the image is. Other formats are always decoded in full,
+    so they are resized directly
+
+    Arguments:
+        image_path (str): the path to the image
+
+    Returns:
+        (Image.Image): the smaller rgb image
+    """
+    from PIL import Image  # pylint: disable=import-outside-toplevel
+
+    with Image.open(image_path) as image:
+        reduced = image
+        if image.format == "JPEG":
+            # Picks the smallest DCT scale still >= THUMBNAIL_SIZE
+            image.draft("RGB", THUMBNAIL_SIZE)
+
+            factor = min(
+                image.width // THUMBNAIL_SIZE[0], image.height // THUMBNAIL_SIZE[1]
+            )
+            if factor > 1 and image.mode in REDUCIBLE_MODES:
+                reduced = image.reduce(factor)
+
+        return reduced.resize(THUMBNAIL_SIZE, Image.Resampling.NEAREST).convert("RGB")
+
+
 def create_tmp_image(image_path: str, out_path: str):
     """
-    Create a smaller version of the image so color extraction does not take as long
+    Create a smaller version of the image and export it
 
     Arguments:
         image_path (str): the path to the image
         out_path (str): where to export the new image to
     """
-    image = Image.open(image_path).resize((100, 50), Image.Resampling.NEAREST).convert("RGB")
-    image.save(out_path)
+    create_thumbnail(image_path).save(out_path)
 
 
 def modify_file_with_template(file_data: str, colors: Dict, primary_color: str) -> str:
@@ -585,18 +1830,9 @@ def modify_file_with_template(file_data: str, colors: Dict, primary_color: str)
     Returns:
         (str): the modified file data
     """
-    for i in range(len(colors)):
-        file_data = file_data.replace(
-            "[color" + str(i) + "]", str(colors["color" + str(i)])
-        )
-
-    file_data = file_data.replace("[background]", str(colors["color0"]))
-    file_data = file_data.replace("[background_light]", str(colors["color8"]))
-    file_data = file_data.replace("[foreground]", str(colors["color15"]))
-    file_data = file_data.replace("[foreground_dark]", str(colors["color7"]))
-    file_data = file_data.replace("[primary]", str(primary_color))
-
-    return file_data
+    return template_utils.render_template(
+        template_utils.compile_template(file_data), colors, primary_color
+    )
 
 
 def symlink_image_path(image_path: str, folder_path: str):
@@ -620,8 +1856,12 @@ def symlink_image_path(image_path: str, folder_path: str):
 
 
 def create_file_from_template(
-    template_file_path: str, out_file: str, colors: Dict, primary_color: str
-):
+    template_file_path: str,
+    out_file: str,
+    colors: Dict,
+    primary_color: str,
+    template_cache: StatCache = None,
+) -> bool:
     """
     Create a file given a template and substitute colors within, export to the
     out file
@@ -631,9 +1871,13 @@ def create_file_from_template(
         out_file (str): where to export the new file
         colors (Dict): the colors to use
         primary_color (str): the primary color
+        template_cache (StatCache): the cache of compiled templates, unchanged
+                                    templates are not read again
+
+    Returns:
+        (bool): whether the out file was written, it is skipped when unchanged
     """
-    with open(template_file_path, "r+", encoding="UTF-8") as template_file:
-        file_data = template_file.read()
-        file_data = modify_file_with_template(file_data, colors, primary_color)
+    compiled_template = template_utils.load_template(template_file_path, template_cache)
+    file_data = template_utils.render_template(compiled_template, colors, primary_color)
 
-        clear_write_data_to_file(out_file, file_data)
+    return clear_write_data_to_file(out_file, file_data)
@@ -0,0 +1,218 @@
+"""Incremental scanning of image directories"""
+import json
+import os
+import time
+from typing import List, Tuple
+
+from kadai.utils import file_utils
+from kadai.utils.stat_cache import RACY_WINDOW_NS, get_file_signature
+
+SCAN_CACHE_VERSION = 1
+IMAGE_FILE_TYPES = ("png", "jpg", "jpeg")
+
+
+class DirectoryScanner:
+    """
+    Lists the images within directories, remembering what each directory held
+    along with its modification time. A directory whose modification time is
+    unchanged had no entries added, removed or renamed, so its cached listing is
+    used without reading it again
+    """
+
+    def __init__(self, cache_file_path: str, validity_cache=None):
+        """
+        Arguments:
+            cache_file_path (str): the path to store the scan cache at
+            validity_cache (kadai.utils.stat_cache.StatCache): the cache of image
+                validity results used when a directory has to be read
+        """
+        self._cache_file_path = cache_file_path
+        self._validity_cache = validity_cache
+        self._directories = {}
+        self._dirty = False
+        self._file_signature = None
+        self.load()
+
+    def scan(
+        self, directory: str, recursive: bool = False
+    ) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Lists the images in a directory, only reading the directories that
+        changed since the last scan
+
+        Arguments:
+            directory (str): the directory to scan
+            recursive (bool): whether to include the images in subdirectories
+
+        Returns:
+            (Tuple[List[str], List[str], List[str]]): the absolute paths of the
+                images, those added since the last scan and those removed
+        """
+        directory = os.path.abspath(os.path.expanduser(directory))
+        previous_images = set(self.get_cached_images(directory, recursive))
+
+        images = []
+        scanned_directories = set()
+        visited = set()
+        pending = [directory]
+        while pending:
+            path = pending.pop()
+            try:
+                stat_result = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            # Symlinked directories can form loops
+            if (stat_result.st_dev, stat_result.st_ino) in visited:
+                continue
+            visited.add((stat_result.st_dev, stat_result.st_ino))
+            scanned_directories.add(path)
+
+            entry = self._directories.get(path)
+            if entry is None or entry["mtime"] != stat_result.st_mtime_ns:
+                entry = self._read_directory(path, stat_result)
+
+            images.extend(os.path.join(path, name) for name in entry["images"])
+            if recursive:
+                pending.extend(
+                    os.path.join(path, name) for name in reversed(entry["directories"])
+                )
+
+        if recursive:
+            for path in list(self._get_cached_directories(directory, recursive)):
+                if path not in scanned_directories:
+                    del self._directories[path]
+                    self._dirty = True
+
+        current_images = set(images)
+        return (
+            sorted(images),
+            sorted(current_images - previous_images),
+            sorted(previous_images - current_images),
+        )
+
+    def get_cached_images(self, directory: str, recursive: bool = False) -> List[str]:
+        """
+        Lists the images in a directory as of the last scan, without touching the
+        filesystem
+
+        Arguments:
+            directory (str): the directory that was scanned
+            recursive (bool): whether to include the images in subdirectories
+
+        Returns:
+            (List[str]): the absolute paths of the images
+        """
+        directory = os.path.abspath(os.path.expanduser(directory))
+        return sorted(
+            os.path.join(path, name)
+            for path in self._get_cached_directories(directory, recursive)
+            for name in self._directories[path]["images"]
+        )
+
+    def invalidate(self, directory: str):
+        """
+        Reads a directory again on the next scan even if its modification time
+        is unchanged, such as when a file in it was only valid once it was
+        completely written
+
+        Arguments:
+            directory (str): the directory
+        """
+        entry = self._directories.get(os.path.abspath(os.path.expanduser(directory)))
+        if entry is not None and entry["mtime"] is not None:
+            entry["mtime"] = None
+            self._dirty = True
+
+    def load(self):
+        """Loads the scan cache from disk, starting empty when missing or corrupt"""
+        self._file_signature = get_file_signature(self._cache_file_path)
+        try:
+            with open(self._cache_file_path, "rb") as cache_file:
+                cache_data = json.load(cache_file)
+            if cache_data["version"] != SCAN_CACHE_VERSION:
+                raise ValueError("Scan cache is out of date")
+            directories = cache_data["directories"]
+        except (OSError, ValueError, KeyError, TypeError):
+            directories = {}
+
+        self._directories = directories
+        self._dirty = False
+
+    def save(self):
+        """Saves the scan cache to disk atomically if it was changed"""
+        if self._validity_cache is not None:
+            self._validity_cache.save()
+
+        if not self._dirty:
+            return
+
+        os.makedirs(os.path.dirname(self._cache_file_path), exist_ok=True)
+        cache_data = {"version": SCAN_CACHE_VERSION, "directories": self._directories}
+        file_utils.atomic_write(
+            self._cache_file_path, json.dumps(cache_data).encode("utf-8")
+        )
+        self._file_signature = get_file_signature(self._cache_file_path)
+        self._dirty = False
+
+    def reload_if_changed(self) -> bool:
+        """
+        Loads the scan cache and the validity cache from disk again when another
+        process saved them since they were last loaded or saved
+
+        Returns:
+            (bool): whether the scan cache was loaded again
+        """
+        if self._validity_cache is not None:
+            self._validity_cache.reload_if_changed()
+
+        if get_file_signature(self._cache_file_path) == self._file_signature:
+            return False
+
+        self.load()
+        return True
+
+    def _get_cached_directories(self, directory: str, recursive: bool):
+        if not recursive:
+            if directory in self._directories:
+                yield directory
+            return
+
+        prefix = os.path.join(directory, "")
+        for path in self._directories:
+            if path == directory or path.startswith(prefix):
+                yield path
+
+    def _read_directory(self, path: str, stat_result: os.stat_result) -> dict:
+        images = []
+        directories = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        directories.append(entry.name)
+                    elif (
+                        entry.name.lower().endswith(IMAGE_FILE_TYPES)
+                        and entry.is_file()
+                        and file_utils.check_if_image_cached(
+                            entry.path, self._validity_cache, entry.stat()
+                        )
+                    ):
+                        images.append(entry.name)
+                except FileNotFoundError:
+                    continue
+
+        # A directory changed within the timestamp granularity could change again
+        # without its modification time moving, so it is read again next time
+        mtime = stat_result.st_mtime_ns
+        if time.time_ns() - mtime < RACY_WINDOW_NS:
+            mtime = None
+
+        entry = {
+            "mtime": mtime,
+            "images": sorted(images),
+            "directories": sorted(directories),
+        }
+        self._directories[path] = entry
+        self._dirty = True
+        return entry
@@ -1,10 +1,28 @@
 """File based utilities"""
 import hashlib
+import itertools
+import logging
 import os
 import re
+import signal
+import stat
 import subprocess
-from typing import List
-from PIL import Image, UnidentifiedImageError
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from kadai import log
+
+HASH_BLOCK_SIZE = 1024 * 1024
+UMASK_LOCK = threading.Lock()
+# The seconds a hook may run for before it is killed
+HOOK_TIMEOUT = 30
+
+logger = log.setup_logger(
+    __name__ + ".default", log.defaultLoggingHandler(), level=logging.WARNING
+)
 
 
 class NoPreGenThemeError(Exception):
@@ -75,14 +93,154 @@ def md5_file(file_path: str) -> str:
     Returns:
         (str): md5 output of the file
     """
+    return hash_file(file_path, "md5")
 
-    hash_md5 = hashlib.md5()
 
-    with open(file_path, "rb") as fin:
-        for chunk in iter(lambda: fin.read(4096), b""):
-            hash_md5.update(chunk)
+def hash_file(file_path: str, algorithm: str = "blake2b") -> str:
+    """
+    Generates a hash of the file parsed, the file is read in large blocks into a
+    reused buffer so hashlib can release the GIL while hashing
 
-    return hash_md5.hexdigest()
+    Arguments:
+        file_path (str): location of the file ('/home/bob/pic.png')
+        algorithm (str): the hashlib algorithm to use ('md5', 'blake2b', ...)
+
+    Returns:
+        (str): the hex digest of the file
+    """
+    file_hash = hashlib.new(algorithm)
+    buffer = bytearray(HASH_BLOCK_SIZE)
+    view = memoryview(buffer)
+
+    with open(file_path, "rb", buffering=0) as fin:
+        for size in iter(lambda: fin.readinto(buffer), 0):
+            file_hash.update(view[:size])
+
+    return file_hash.hexdigest()
+
+
+def hash_files(
+    file_paths: List[str], algorithm: str = "blake2b", jobs: int = 0
+) -> List[str]:
+    """
+    Generates the hashes of many files on a thread pool, so reading one file
+    overlaps with hashing another
+
+    Arguments:
+        file_paths (List[str]): the locations of the files
+        algorithm (str): the hashlib algorithm to use ('md5', 'blake2b', ...)
+        jobs (int): the amount of threads to use, 0 picks based on the cores
+
+    Returns:
+        (List[str]): the hex digests, in the same order as the files
+    """
+    jobs = min(jobs or (os.cpu_count() or 1) + 4, len(file_paths))
+    if jobs <= 1:
+        return [hash_file(file_path, algorithm) for file_path in file_paths]
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(
+            executor.map(lambda file_path: hash_file(file_path, algorithm), file_paths)
+        )
+
+
+def get_umask() -> int:
+    """
+    Gets the umask of the process, the umask can only be read by setting it so
+    this is serialized for the threads writing files
+
+    Returns:
+        (int): the umask
+    """
+    with UMASK_LOCK:
+        umask = os.umask(0)
+        os.umask(umask)
+    return umask
+
+
+def atomic_write(file_path: str, data: bytes):
+    """
+    Write data to a file by writing a temporary file next to it and renaming it
+    over the original, readers either see the old or the new file, never a
+    partially written one. The permissions of an existing file are kept
+
+    Arguments:
+        file_path (str): the path to the file
+        data (bytes): the data to write
+    """
+    file_path = os.path.expanduser(file_path)
+    try:
+        mode = stat.S_IMODE(os.stat(file_path).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~get_umask()
+
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(file_path)),
+        prefix=f".{os.path.basename(file_path)}.",
+    )
+    try:
+        os.fchmod(fd, mode)
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def atomic_symlink(target: str, link_path: str):
+    """
+    Point a symlink at a target by creating a symlink next to it and renaming
+    it over the original, readers either follow the old or the new target and
+    the link is never missing
+
+    Arguments:
+        target (str): the path the link points to
+        link_path (str): the path to the link
+    """
+    link_path = os.path.expanduser(link_path)
+    directory = os.path.dirname(os.path.abspath(link_path))
+    while True:
+        tmp_path = os.path.join(
+            directory, f".{os.path.basename(link_path)}.{os.urandom(4).hex()}"
+        )
+        try:
+            os.symlink(target, tmp_path)
+            break
+        except FileExistsError:
+            continue
+
+    try:
+        os.replace(tmp_path, link_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_if_changed(file_path: str, data: bytes) -> bool:
+    """
+    Atomically write data to a file unless the file already holds exactly that
+    data, so anything watching the file is not woken for nothing. A symlinked
+    file is written through the link
+
+    Arguments:
+        file_path (str): the path to the file
+        data (bytes): the data to write
+
+    Returns:
+        (bool): whether the file was written
+    """
+    file_path = os.path.realpath(os.path.expanduser(file_path))
+    try:
+        if os.stat(file_path).st_size == len(data):
+            with open(file_path, "rb") as existing_file:
+                if existing_file.read() == data:
+                    return False
+    except FileNotFoundError:
+        pass
+
+    atomic_write(file_path, data)
+    return True
 
 
 def check_if_image(image_file_path: str) -> bool:
@@ -95,33 +253,74 @@ def check_if_image(image_file_path: str) -> bool:
     Returns:
         (bool): if the file is valid, returns true, otherwise false
     """
+    from PIL import Image  # pylint: disable=import-outside-toplevel
+
     try:
-        Image.open(image_file_path).verify()
+        with Image.open(image_file_path) as image:
+            image.verify()
         return True
-    except (ImportError, UnidentifiedImageError):
+    except (ImportError, OSError, SyntaxError):
         return False
 
 
-def get_directory_images(image_directory: str) -> List[str]:
+def check_if_image_cached(
+    image_file_path: str, validity_cache=None, stat_result: os.stat_result = None
+) -> bool:
+    """
+    Verifies if the given image file is an image, reusing the result from the
+    validity cache while the file is unchanged. Invalid files are remembered too
+
+    Arguments:
+        image_file_path (str): the path to the image file
+        validity_cache (kadai.utils.stat_cache.StatCache): the cache of results,
+                                                           verifies every time
+                                                           when None
+        stat_result (os.stat_result): the stat of the file, stats the file when
+                                      not given
+
+    Returns:
+        (bool): if the file is valid, returns true, otherwise false
+    """
+    if validity_cache is None:
+        return check_if_image(image_file_path)
+
+    if stat_result is None:
+        stat_result = os.stat(image_file_path)
+
+    valid = validity_cache.get(image_file_path, stat_result)
+    if valid is None:
+        valid = check_if_image(image_file_path)
+        validity_cache.set(image_file_path, valid, stat_result)
+
+    return valid
+
+
+def get_directory_images(image_directory: str, validity_cache=None) -> List[str]:
     """
     Get a list of all images in a directory
 
     Arguments:
         image_directory (str): the directory where the images are stored
+        validity_cache (kadai.utils.stat_cache.StatCache): the cache of image
+                                                           validity results
 
     Returns:
         (List[str]): a list containing the absolute paths to the images
     """
     file_types = ("png", "jpg", "jpeg")
-    return [
-        os.path.abspath(os.path.join(image_directory, image.name))
-        for image in os.scandir(image_directory)
-        if image.name.lower().endswith(file_types)
-        and check_if_image(os.path.join(image_directory, image.name))
-    ]
+    images = []
+    for image in os.scandir(image_directory):
+        if not image.name.lower().endswith(file_types) or not image.is_file():
+            continue
+
+        image_path = os.path.abspath(os.path.join(image_directory, image.name))
+        if check_if_image_cached(image_path, validity_cache, image.stat()):
+            images.append(image_path)
+
+    return images
 
 
-def get_image_list(image_path: str) -> List[str]:
+def get_image_list(image_path: str, validity_cache=None) -> List[str]:
     """
     Get a list of images from the image path, if the path is to an image file
     will only return a list with that one image. Otherwise returns a list of all
@@ -129,19 +328,22 @@ def get_image_list(image_path: str) -> List[str]:
 
     Arguments:
         image_path (str): path to image or image directory
+        validity_cache (kadai.utils.stat_cache.StatCache): the cache of image
+                                                           validity results
 
     Returns:
         (List[str]): the list of images absolute paths
     """
     image_path = os.path.expanduser(image_path)
     if os.path.isfile(image_path):
-        if check_if_image(image_path):
-            return [os.path.abspath(image_path)]
+        image_path = os.path.abspath(image_path)
+        if check_if_image_cached(image_path, validity_cache):
+            return [image_path]
 
         raise ValueError("Specified file is not an image!")
 
     if os.path.isdir(image_path):
-        images = get_directory_images(image_path)
+        images = get_directory_images(image_path, validity_cache)
         if len(images) == 0:
             raise FileNotFoundError("Specified directory does not contain any images!")
 
@@ -175,27 +377,77 @@ def get_hooks(**kwargs) -> List[str]:
     return scripts
 
 
-def run_hooks(**kwargs):
+def run_hooks(**kwargs) -> Dict[str, Optional[int]]:
     """
-    Runs the hooks within a given directory
+    Runs the hooks within a given directory. Hooks sharing a two digit prefix
+    run at the same time, the groups run one after the other in order. A hook
+    that fails or times out does not stop the others
 
     Arguments:
         **use_light_theme (bool): whether to enable light theme options
         **hooks_directory (str): the path to the hooks directory
+        **timeout (float): the seconds a hook may run for before it is killed,
+                           None to wait forever
+
+    Returns:
+        (Dict[str, Optional[int]]): the exit status of each hook, None when it
+            timed out or could not be run
     """
     use_light_theme = kwargs.get("use_light_theme", False)
     hooks_directory = kwargs.get(
         "hooks_directory", os.path.join(get_config_path(), "hooks")
     )
+    timeout = kwargs.get("timeout", HOOK_TIMEOUT)
     scripts = get_hooks(hooks_directory=hooks_directory)
 
-    for script in scripts:
-        script = os.path.join(hooks_directory, script)
-
-        with open(os.devnull, "w", encoding="UTF-8") as devnull:
-            subprocess.run(
-                [script, str(use_light_theme).lower()],
-                stdout=devnull,
+    def run_hook(script: str) -> Optional[int]:
+        start = time.perf_counter()
+        try:
+            # In its own process group, so anything the hook started is killed
+            # along with it when it times out
+            process = subprocess.Popen(
+                [os.path.join(hooks_directory, script), str(use_light_theme).lower()],
+                stdout=subprocess.DEVNULL,
                 stderr=subprocess.STDOUT,
-                check=True,
+                start_new_session=True,
             )
+        except OSError as error:
+            logger.warning("Hook %s could not be run: %s", script, error)
+            return None
+
+        try:
+            returncode = process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning("Hook %s timed out after %ss", script, timeout)
+            kill_process_group(process)
+            return None
+        except BaseException:
+            kill_process_group(process)
+            raise
+
+        duration = time.perf_counter() - start
+        if returncode != 0:
+            logger.warning("Hook %s exited with status %s", script, returncode)
+        logger.info("Hook %s took %.3fs", script, duration)
+        return returncode
+
+    statuses = {}
+    for _, group in itertools.groupby(scripts, key=lambda script: script[:2]):
+        group = list(group)
+        if len(group) == 1:
+            statuses[group[0]] = run_hook(group[0])
+            continue
+
+        with ThreadPoolExecutor(max_workers=len(group)) as executor:
+            statuses.update(zip(group, executor.map(run_hook, group)))
+
+    return statuses
+
+
+def kill_process_group(process: subprocess.Popen):
+    """Kills the process group a process leads and waits for the process"""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    process.wait()
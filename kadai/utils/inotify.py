@@ -0,0 +1,163 @@
+"""Watching directories with inotify through ctypes, where it is available"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+from typing import Dict, List, Optional, Tuple
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+# The wd, mask, cookie and name length preceding the name of each event
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+
+class Inotify:
+    """
+    An inotify instance watching directories, each without its subdirectories
+    """
+
+    def __init__(self, libc: ctypes.CDLL):
+        """
+        Arguments:
+            libc (ctypes.CDLL): the c library providing inotify
+
+        Raises:
+            (OSError): when the instance could not be created
+        """
+        self._libc = libc
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+        self._watches: Dict[int, str] = {}
+        self._paths: Dict[str, int] = {}
+
+    def add_watch(self, path: str):
+        """
+        Watches a directory, directories already watched are skipped
+
+        Arguments:
+            path (str): the path to the directory
+
+        Raises:
+            (OSError): when the directory could not be watched
+        """
+        if path in self._paths:
+            return
+
+        watch = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if watch < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+
+        self._watches[watch] = path
+        self._paths[path] = watch
+
+    def read_events(self, timeout: Optional[float] = None) -> List[Tuple[str, int]]:
+        """
+        Waits for events and reads them. Watches of directories that were
+        removed are dropped
+
+        Arguments:
+            timeout (Optional[float]): the seconds to wait for, waits until
+                                       there is an event when None
+
+        Returns:
+            (List[Tuple[str, int]]): the path each event happened to and its
+                mask, the path is empty when the queue overflowed
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self._fd, READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            watch, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + name_length].rstrip(b"\0")
+            offset += name_length
+
+            if mask & IN_IGNORED:
+                path = self._watches.pop(watch, None)
+                self._paths.pop(path, None)
+                continue
+
+            directory = self._watches.get(watch, "")
+            if mask & IN_Q_OVERFLOW:
+                events.append(("", mask))
+            elif directory:
+                events.append(
+                    (
+                        (
+                            os.path.join(directory, os.fsdecode(name))
+                            if name
+                            else directory
+                        ),
+                        mask,
+                    )
+                )
+
+        return events
+
+    def close(self):
+        """Closes the inotify instance"""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def get_inotify() -> Optional[Inotify]:
+    """
+    Creates an inotify instance
+
+    Returns:
+        (Optional[Inotify]): the instance, None when inotify is not available
+    """
+    library = ctypes.util.find_library("c")
+    if library is None:
+        return None
+
+    try:
+        libc = ctypes.CDLL(library, use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+        return Inotify(libc)
+    except (AttributeError, OSError):
+        return None
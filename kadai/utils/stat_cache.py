@@ -0,0 +1,224 @@
+"""Persistent caches of values derived from files, invalidated by their stat"""
+import json
+import os
+import time
+from typing import Any, Iterator, List, Optional
+
+from kadai.utils import file_utils
+
+# Files modified this recently are not cached, a later change within the same
+# timestamp granularity would otherwise go unnoticed
+RACY_WINDOW_NS = 2 * 10**9
+
+
+class StatCache:
+    """
+    A cache of values computed from files, keyed by path. An entry is only used
+    while the file's (device, inode, size, mtime_ns) signature is unchanged, so
+    a file that is modified or replaced in place is computed again
+    """
+
+    def __init__(self, cache_file_path: str):
+        """
+        Arguments:
+            cache_file_path (str): the path to store the cache at
+        """
+        self._cache_file_path = cache_file_path
+        self._entries = {}
+        self._dirty = False
+        self._file_signature = None
+        self.load()
+
+    def get(self, file_path: str, stat_result: os.stat_result = None) -> Any:
+        """
+        Gets the cached value of a file
+
+        Arguments:
+            file_path (str): the path to the file
+            stat_result (os.stat_result): the stat of the file, stats the file
+                                          when not given
+
+        Returns:
+            (Any): the cached value, None if not cached or the file changed
+        """
+        entry = self._entries.get(file_path)
+        if entry is None:
+            return None
+
+        if stat_result is None:
+            stat_result = os.stat(file_path)
+
+        if entry[0] != get_stat_signature(stat_result):
+            return None
+
+        return entry[1]
+
+    def peek(self, file_path: str) -> Any:
+        """
+        Gets the cached value of a file without checking the file is unchanged,
+        so the file is not touched
+
+        Arguments:
+            file_path (str): the path to the file
+
+        Returns:
+            (Any): the value that was cached, even if the file since changed, None
+                   if it was not cached
+        """
+        entry = self._entries.get(file_path)
+        return None if entry is None else entry[1]
+
+    def set(self, file_path: str, value: Any, stat_result: os.stat_result = None):
+        """
+        Caches the value of a file, files modified within the last couple of
+        seconds are not cached
+
+        Arguments:
+            file_path (str): the path to the file
+            value (Any): the json serializable value
+            stat_result (os.stat_result): the stat of the file when the value was
+                                          computed, stats the file when not given
+        """
+        if stat_result is None:
+            stat_result = os.stat(file_path)
+
+        if time.time_ns() - stat_result.st_mtime_ns < RACY_WINDOW_NS:
+            self.remove(file_path)
+            return
+
+        self._entries[file_path] = [get_stat_signature(stat_result), value]
+        self._dirty = True
+
+    def remove(self, file_path: str) -> Any:
+        """
+        Removes a file from the cache
+
+        Arguments:
+            file_path (str): the path to the file
+
+        Returns:
+            (Any): the value that was cached, even if the file since changed, None
+                   if it was not cached
+        """
+        entry = self._entries.pop(file_path, None)
+        if entry is None:
+            return None
+
+        self._dirty = True
+        return entry[1]
+
+    def paths(self) -> Iterator[str]:
+        """
+        Gets the paths of every cached file
+
+        Returns:
+            (Iterator[str]): the cached paths
+        """
+        return iter(list(self._entries))
+
+    def load(self):
+        """Loads the cache from disk, starting empty when it is missing or corrupt"""
+        self._file_signature = get_file_signature(self._cache_file_path)
+        try:
+            with open(self._cache_file_path, "rb") as cache_file:
+                entries = json.load(cache_file)
+            if not isinstance(entries, dict):
+                raise ValueError("Cache is not a dictionary")
+        except (OSError, ValueError):
+            entries = {}
+
+        self._entries = entries
+        self._dirty = False
+
+    def save(self):
+        """Saves the cache to disk atomically if it was changed"""
+        if not self._dirty:
+            return
+
+        os.makedirs(os.path.dirname(self._cache_file_path), exist_ok=True)
+        file_utils.atomic_write(
+            self._cache_file_path, json.dumps(self._entries).encode("utf-8")
+        )
+        self._file_signature = get_file_signature(self._cache_file_path)
+        self._dirty = False
+
+    def reload_if_changed(self) -> bool:
+        """
+        Loads the cache from disk again when another process saved it since it
+        was last loaded or saved, so saving does not overwrite what it cached
+
+        Returns:
+            (bool): whether the cache was loaded again
+        """
+        if get_file_signature(self._cache_file_path) == self._file_signature:
+            return False
+
+        self.load()
+        return True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def get_stat_signature(stat_result: os.stat_result) -> List[int]:
+    """
+    Gets what identifies the version of a file
+
+    Arguments:
+        stat_result (os.stat_result): the stat of the file
+
+    Returns:
+        (List[int]): the device, inode, size and modification time of the file
+    """
+    return [
+        stat_result.st_dev,
+        stat_result.st_ino,
+        stat_result.st_size,
+        stat_result.st_mtime_ns,
+    ]
+
+
+def get_file_signature(file_path: str) -> Optional[List[int]]:
+    """
+    Gets what identifies the version of a file without failing when it is missing
+
+    Arguments:
+        file_path (str): the path to the file
+
+    Returns:
+        (Optional[List[int]]): the signature of the file, None if it is missing
+    """
+    try:
+        return get_stat_signature(os.stat(file_path))
+    except FileNotFoundError:
+        return None
+
+
+def get_cached(
+    cache: Optional[StatCache], file_path: str, compute, stat_result=None
+) -> Any:
+    """
+    Gets the value of a file from a cache, computing and caching it on a miss
+
+    Arguments:
+        cache (Optional[StatCache]): the cache to use, computes every time if None
+        file_path (str): the path to the file
+        compute (Callable[[str], Any]): computes the value from the file path
+        stat_result (os.stat_result): the stat of the file, stats the file when
+                                      not given
+
+    Returns:
+        (Any): the value of the file
+    """
+    if cache is None:
+        return compute(file_path)
+
+    if stat_result is None:
+        stat_result = os.stat(file_path)
+
+    value = cache.get(file_path, stat_result)
+    if value is None:
+        value = compute(file_path)
+        cache.set(file_path, value, stat_result)
+
+    return value
@@ -0,0 +1,135 @@
+"""Compiling and rendering the color templates"""
+import re
+from typing import Dict, List, Optional
+
+from kadai.utils.stat_cache import StatCache, get_cached
+
+PLACEHOLDER_PATTERN = re.compile(
+    r"\[(color[0-9]+|background|background_light|foreground|foreground_dark"
+    r"|primary)\]"
+)
+# The colors the named placeholders are replaced with
+NAMED_PLACEHOLDERS = {
+    "background": "color0",
+    "background_light": "color8",
+    "foreground": "color15",
+    "foreground_dark": "color7",
+}
+
+
+def compile_template(template_data: str) -> List[str]:
+    """
+    Split a template into its literal text and placeholders
+
+    Arguments:
+        template_data (str): the template
+
+    Returns:
+        (List[str]): the literal text at the even indexes and the placeholder
+            names, without their brackets, at the odd indexes
+    """
+    return PLACEHOLDER_PATTERN.split(template_data)
+
+
+def load_template(
+    template_path: str, template_cache: Optional[StatCache] = None
+) -> List[str]:
+    """
+    Load a compiled template, unchanged templates are taken from the cache
+    without being read
+
+    Arguments:
+        template_path (str): the path to the template
+        template_cache (Optional[StatCache]): the cache of compiled templates
+
+    Returns:
+        (List[str]): the compiled template
+    """
+
+    def compile_file(file_path: str) -> List[str]:
+        with open(file_path, "r", encoding="UTF-8") as template_file:
+            return compile_template(template_file.read())
+
+    return get_cached(template_cache, template_path, compile_file)
+
+
+def get_placeholder_values(colors: Dict, primary_color: str) -> Dict[str, str]:
+    """
+    Get what each placeholder is replaced with
+
+    Arguments:
+        colors (Dict): a dictionary containing all the colors
+        primary_color (str): the main color to be used
+
+    Returns:
+        (Dict[str, str]): the values by placeholder name
+    """
+    values = {f"color{i}": str(colors[f"color{i}"]) for i in range(len(colors))}
+    for name, color_name in NAMED_PLACEHOLDERS.items():
+        values[name] = str(colors[color_name])
+    values["primary"] = str(primary_color)
+
+    return values
+
+
+def render_template(
+    compiled_template: List[str], colors: Dict, primary_color: str
+) -> str:
+    """
+    Render a compiled template with the colors given
+
+    Arguments:
+        compiled_template (List[str]): the template from compile_template
+        colors (Dict): a dictionary containing all the colors
+        primary_color (str): the main color to be used
+
+    Returns:
+        (str): the rendered template
+    """
+    values = get_placeholder_values(colors, primary_color)
+    segments = list(compiled_template)
+
+    # A value holding a placeholder is replaced again by the placeholders
+    # after it, which only replacing them one after the other reproduces
+    if any("[" in value for value in values.values()):
+        return replace_placeholders(join_template(segments), values)
+
+    for i in range(1, len(segments), 2):
+        name = segments[i]
+        segments[i] = values.get(name, f"[{name}]")
+
+    return "".join(segments)
+
+
+def join_template(compiled_template: List[str]) -> str:
+    """
+    Get the template a compiled template was compiled from
+
+    Arguments:
+        compiled_template (List[str]): the template from compile_template
+
+    Returns:
+        (str): the template
+    """
+    return "".join(
+        f"[{segment}]" if i % 2 else segment
+        for i, segment in enumerate(compiled_template)
+    )
+
+
+def replace_placeholders(template_data: str, values: Dict[str, str]) -> str:
+    """
+    Replace the placeholders of a template one after the other
+
+    Arguments:
+        template_data (str): the template
+        values (Dict[str, str]): the values by placeholder name, in the order
+                                 they are replaced
+
+    Returns:
+        (str): the rendered template
+    """
+    for name, value in values.items():
+        template_data = template_data.replace(f"[{name}]", value)
+
+    return template_data
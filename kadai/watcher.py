@@ -0,0 +1,379 @@
+"""
+Watches an image directory, generating themes for images as they arrive
+
+kadai - Simple wallpaper manager for tiling window managers.
+Copyright (C) 2020  slapelachie
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+Find the full license in the root of this project
+"""
+import logging
+import os
+import signal
+import time
+from typing import Dict, List, Optional, Tuple
+
+from kadai import log
+from kadai.themer import Themer
+from kadai.utils import inotify
+from kadai.utils.directory_scanner import IMAGE_FILE_TYPES
+from kadai.utils.stat_cache import RACY_WINDOW_NS, get_stat_signature
+
+# Seconds a file must stay unchanged before it is taken as completely copied
+SETTLE_TIME = 2.0
+# Seconds between polls when inotify is not available
+POLL_INTERVAL = 5.0
+# Events after which the directories are polled, rather than only the files
+# the events happened to being checked
+POLL_EVENTS = (
+    inotify.IN_Q_OVERFLOW
+    | inotify.IN_ISDIR
+    | inotify.IN_DELETE_SELF
+    | inotify.IN_MOVE_SELF
+)
+
+logger = log.setup_logger(
+    __name__ + ".default", log.defaultLoggingHandler(), level=logging.WARNING
+)
+
+
+class Watcher:
+    """
+    Watches the image directory of a themer for added, changed and removed
+    images. Changes are found with inotify when it is available, otherwise by
+    polling: only directories whose modification time changed are read again
+    and the images are compared by their stat. An added or changed image is
+    generated once it stopped changing for the settle time, so partially
+    copied files are not generated, and the themes of removed images are
+    removed
+    """
+
+    def __init__(
+        self,
+        themer: Themer,
+        settle_time: float = SETTLE_TIME,
+        poll_interval: float = POLL_INTERVAL,
+        use_inotify: bool = True,
+    ):
+        """
+        Arguments:
+            themer (Themer): the themer to generate with, its image path is the
+                             directory watched
+            settle_time (float): the seconds a file must stay unchanged before
+                                 it is generated
+            poll_interval (float): the seconds between polls without inotify
+            use_inotify (bool): whether to use inotify when it is available
+
+        Raises:
+            (NotADirectoryError): when the image path is not a directory
+        """
+        self._directory = os.path.abspath(os.path.expanduser(themer.get_image_path()))
+        if not os.path.isdir(self._directory):
+            raise NotADirectoryError(f"{self._directory} is not a directory")
+
+        self._themer = themer
+        self._recursive = themer.get_recursive()
+        self._settle_time = settle_time
+        self._poll_interval = poll_interval
+        self._inotify = inotify.get_inotify() if use_inotify else None
+        self._directories: Dict[str, Dict] = {}
+        self._files: Dict[str, List[int]] = {}
+        # The signature of each changed file, when it changed and when it
+        # left the racy window
+        self._pending: Dict[str, Tuple[List[int], float, float]] = {}
+
+        self._poll()
+
+    def get_directory(self) -> str:
+        """
+        Gets the directory watched
+
+        Returns:
+            (str): the absolute path to the directory
+        """
+        return self._directory
+
+    def uses_inotify(self) -> bool:
+        """
+        Checks if changes are found with inotify rather than by polling
+
+        Returns:
+            (bool): whether inotify is used
+        """
+        return self._inotify is not None
+
+    def run(self):
+        """
+        Generates the themes missing from the directory, then generates those
+        of images as they arrive until interrupted
+        """
+        try:
+            self._themer.generate()
+        except FileNotFoundError:
+            pass
+
+        logger.info("Watching %s", self._directory)
+        while True:
+            self.check(self._get_timeout())
+
+    def check(self, timeout: Optional[float] = 0) -> Tuple[List[str], List[str]]:
+        """
+        Waits for changes, then removes the themes of removed images and
+        generates the themes of images that settled
+
+        Arguments:
+            timeout (Optional[float]): the seconds to wait for changes, waits
+                                       until there is one when None, or for
+                                       the poll interval when polling
+
+        Returns:
+            (Tuple[List[str], List[str]]): the images generated and removed
+        """
+        if self._inotify is None:
+            time.sleep(self._poll_interval if timeout is None else timeout)
+            added, changed, removed = self._poll()
+        else:
+            events = self._inotify.read_events(timeout)
+            if any(mask & POLL_EVENTS for _, mask in events):
+                added, changed, removed = self._poll()
+            else:
+                added, changed, removed = self._check_paths(
+                    {path for path, _ in events}
+                )
+
+        for path in added + changed:
+            try:
+                self._set_pending(path, self._files[path])
+            except FileNotFoundError:
+                continue
+        for path in removed:
+            self._pending.pop(path, None)
+
+        if removed:
+            logger.info("Removing the themes of %s images", len(removed))
+            self._themer.clean_removed_images(removed)
+
+        return self._generate(self._get_settled()), removed
+
+    def close(self):
+        """Stops watching the directory"""
+        if self._inotify is not None:
+            self._inotify.close()
+
+    def _get_timeout(self) -> Optional[float]:
+        timeout = None if self._inotify is not None else self._poll_interval
+        if self._pending:
+            settled_at = min(
+                max(changed_at + self._settle_time, cached_at)
+                for _, changed_at, cached_at in self._pending.values()
+            )
+            settle_timeout = max(settled_at - time.monotonic(), 0)
+            timeout = (
+                settle_timeout if timeout is None else min(timeout, settle_timeout)
+            )
+
+        return timeout
+
+    def _set_pending(self, path: str, signature: List[int], stat_result=None):
+        stat_result = stat_result or os.stat(path)
+        now = time.monotonic()
+        # The hash of a file is only cached once it left the racy window, the
+        # themes of a file removed before then could not be found
+        cached_at = (
+            now + (stat_result.st_mtime_ns + RACY_WINDOW_NS - time.time_ns()) / 10**9
+        )
+        self._pending[path] = (signature, now, cached_at)
+
+    def _get_settled(self) -> List[str]:
+        now = time.monotonic()
+        settled = []
+        for path, (signature, changed_at, cached_at) in list(self._pending.items()):
+            if now - changed_at < self._settle_time or now < cached_at:
+                continue
+
+            try:
+                stat_result = os.stat(path)
+            except FileNotFoundError:
+                del self._pending[path]
+                continue
+
+            # Still being written to, so the settle time starts again
+            current_signature = get_stat_signature(stat_result)
+            if current_signature != signature:
+                self._files[path] = current_signature
+                self._set_pending(path, current_signature, stat_result)
+                continue
+
+            del self._pending[path]
+            settled.append(path)
+
+        return sorted(settled)
+
+    def _generate(self, image_paths: List[str]) -> List[str]:
+        if not image_paths:
+            return []
+
+        try:
+            self._themer.invalidate_images(image_paths)
+            # Scanning verifies the images and keeps the listing used to pick
+            # random images up to date
+            try:
+                images = set(self._themer.get_image_list())
+            except FileNotFoundError:
+                images = set()
+
+            valid_images = [path for path in image_paths if path in images]
+            if valid_images:
+                self._themer.generate(image_paths=valid_images)
+                logger.info("Generated the themes of %s images", len(valid_images))
+        except OSError as error:
+            logger.error("Failed to generate themes: %s", error)
+            return []
+
+        return valid_images
+
+    def _poll(self) -> Tuple[List[str], List[str], List[str]]:
+        files = {}
+        directories = {}
+        visited = set()
+        pending = [self._directory]
+        while pending:
+            path = pending.pop()
+            try:
+                stat_result = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            # Symlinked directories can form loops
+            if (stat_result.st_dev, stat_result.st_ino) in visited:
+                continue
+            visited.add((stat_result.st_dev, stat_result.st_ino))
+
+            entry = self._directories.get(path)
+            if entry is None or entry["mtime"] != stat_result.st_mtime_ns:
+                try:
+                    entry = read_directory(path, stat_result)
+                except (FileNotFoundError, NotADirectoryError):
+                    continue
+            directories[path] = entry
+
+            if self._inotify is not None:
+                try:
+                    self._inotify.add_watch(path)
+                except OSError as error:
+                    logger.warning("Failed to watch %s: %s", path, error)
+
+            for name in entry["files"]:
+                file_path = os.path.join(path, name)
+                try:
+                    files[file_path] = get_stat_signature(os.stat(file_path))
+                except FileNotFoundError:
+                    continue
+
+            if self._recursive:
+                pending.extend(
+                    os.path.join(path, name) for name in entry["directories"]
+                )
+
+        self._directories = directories
+        added = sorted(set(files) - set(self._files))
+        removed = sorted(set(self._files) - set(files))
+        changed = sorted(
+            path
+            for path, signature in files.items()
+            if path in self._files and self._files[path] != signature
+        )
+        self._files = files
+
+        return added, changed, removed
+
+    def _check_paths(self, paths: set) -> Tuple[List[str], List[str], List[str]]:
+        added, changed, removed = [], [], []
+        for path in sorted(paths):
+            if (
+                not path.lower().endswith(IMAGE_FILE_TYPES)
+                or os.path.dirname(path) not in self._directories
+            ):
+                continue
+
+            try:
+                stat_result = os.stat(path)
+            except FileNotFoundError:
+                if self._files.pop(path, None) is not None:
+                    removed.append(path)
+                continue
+
+            signature = get_stat_signature(stat_result)
+            if path not in self._files:
+                added.append(path)
+            elif self._files[path] != signature:
+                changed.append(path)
+            self._files[path] = signature
+
+        return added, changed, removed
+
+
+def read_directory(path: str, stat_result: os.stat_result) -> Dict:
+    """
+    Lists the files that could be images and the subdirectories of a directory
+
+    Arguments:
+        path (str): the path to the directory
+        stat_result (os.stat_result): the stat of the directory
+
+    Returns:
+        (Dict): the modification time of the directory, None when it could
+                change again without the time moving, and the names of the
+                files and directories
+    """
+    files = []
+    directories = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    directories.append(entry.name)
+                elif entry.name.lower().endswith(IMAGE_FILE_TYPES) and entry.is_file():
+                    files.append(entry.name)
+            except FileNotFoundError:
+                continue
+
+    mtime = stat_result.st_mtime_ns
+    if time.time_ns() - mtime < RACY_WINDOW_NS:
+        mtime = None
+
+    return {"mtime": mtime, "files": sorted(files), "directories": sorted(directories)}
+
+
+def run_watcher(themer: Themer):
+    """
+    Watches the image directory of a themer in the foreground until it is
+    interrupted or terminated
+
+    Arguments:
+        themer (Themer): the themer to generate with
+
+    Raises:
+        (NotADirectoryError): when the image path is not a directory
+    """
+
+    def terminate(*_):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, terminate)
+    watcher = Watcher(themer)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
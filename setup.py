@@ -23,6 +23,6 @@ setup(
     packages=["kadai", "kadai.engine", "kadai.utils"],
     entry_points={"console_scripts": ["kadai=kadai.__main__:main"]},
     include_package_data=True,
-    install_requires=["Pillow>=9.1.0", "tqdm", "colorthief"],
+    install_requires=["Pillow>=9.1.0", "tqdm", "colorthief", "numpy"],
     zip_safe=False,
 )
@@ -33,7 +33,7 @@ class TestConfigHandler(unittest.TestCase):
         self.assertEqual(self._config_handler.get_config(), config)
 
     def test_setget_config_items(self):
-        self.assertEqual(len(self._config_handler.get_config()), 8)
+        self.assertEqual(len(self._config_handler.get_config()), 17)
 
         shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
 
@@ -55,6 +55,31 @@ class TestConfigHandler(unittest.TestCase):
 
         shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
 
+    def test_load_baseline_config(self):
+        # Written before keys such as jobs were added to the default config
+        self._config_handler.load_config("tests/assets/config.json")
+        config = self._config_handler.get_config()
+
+        self.assertEqual(set(config), set(config_handler.DEFAULT_CONFIG))
+        self.assertEqual(config["jobs"], config_handler.DEFAULT_CONFIG["jobs"])
+        self.assertEqual(config["cache_directory"], "/tmp/github-runner-kadai/")
+
+    def test_unsaved_changes(self):
+        config_path = os.path.join(OUT_DIR, "config.json")
+        self._config_handler.set_config_file_path(config_path)
+        self._config_handler.set_config_file_out_path(config_path)
+        self.assertTrue(self._config_handler.has_unsaved_changes())
+
+        self._config_handler.save_config()
+        self.assertFalse(self._config_handler.has_unsaved_changes())
+
+        self._config_handler.set_config_file_path(config_path)
+        self.assertFalse(self._config_handler.has_unsaved_changes())
+        self._config_handler.get_config()["light"] = True
+        self.assertTrue(self._config_handler.has_unsaved_changes())
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
 
 class TestConfigHandlerFunctions(unittest.TestCase):
     def test_parse_config(self):
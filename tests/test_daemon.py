@@ -0,0 +1,192 @@
+import unittest
+import os
+import shutil
+import signal
+import socket
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from kadai import client, daemon
+from kadai.config_handler import ConfigHandler
+from kadai.themer import Themer
+
+OUT_DIR = "/tmp/github-runner-kadai/"
+ASSETS_DIR = "tests/assets/"
+SOCKET_PATH = os.path.join(OUT_DIR, "run", "kadai.sock")
+CLOSING_SOCKET_PATH = os.path.join(OUT_DIR, "closing.sock")
+
+
+def get_config_handler():
+    config_handler = ConfigHandler()
+    config_handler.set_config_file_path(os.path.join(ASSETS_DIR, "config.json"))
+    config_handler.set_config(
+        {**config_handler.get_config(), "data_directory": OUT_DIR}
+    )
+    return config_handler
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+        self._daemon = daemon.Daemon(
+            SOCKET_PATH,
+            get_config_handler(),
+            run_hooks=False,
+            cache_path=OUT_DIR,
+            user_template_path="examples/templates/",
+        )
+        self._thread = threading.Thread(target=self._daemon.serve_forever)
+        self._thread.start()
+
+        for _ in range(100):
+            if client.is_listening(SOCKET_PATH):
+                break
+            time.sleep(0.05)
+
+    def tearDown(self):
+        self._daemon.shutdown()
+        self._thread.join()
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def test_update(self):
+        image_path = os.path.abspath(os.path.join(ASSETS_DIR, "test.jpg"))
+        request = {"action": "update", "image_path": image_path, "options": {}}
+
+        self.assertEqual(client.send_request(request, SOCKET_PATH), {"status": "ok"})
+        self.assertEqual(os.readlink(os.path.join(OUT_DIR, "image")), image_path)
+        self.assertTrue(os.path.isfile(os.path.join(OUT_DIR, "colors.sh")))
+
+        # The last image is preserved
+        request = {"action": "preserve", "options": {"use_light_theme": True}}
+        self.assertEqual(client.send_request(request, SOCKET_PATH), {"status": "ok"})
+
+    def make_library(self, name):
+        library_path = os.path.join(OUT_DIR, name)
+        os.makedirs(library_path)
+        shutil.copy(os.path.join(ASSETS_DIR, "test.png"), library_path)
+        mtime = time.time() - 60
+        os.utime(library_path, (mtime, mtime))
+        return library_path
+
+    def test_reload_caches(self):
+        request = {"action": "generate", "image_path": self.make_library("first")}
+        self.assertEqual(client.send_request(request, SOCKET_PATH), {"status": "ok"})
+
+        # Another process, such as kadai --no-daemon, scans a library meanwhile
+        library_path = self.make_library("second")
+        Themer(library_path, cache_path=OUT_DIR).get_image_list()
+
+        request = {"action": "generate", "image_path": self.make_library("third")}
+        self.assertEqual(client.send_request(request, SOCKET_PATH), {"status": "ok"})
+        self.assertEqual(
+            Themer(OUT_DIR, cache_path=OUT_DIR)._directory_scanner.get_cached_images(
+                library_path
+            ),
+            [os.path.join(library_path, "test.png")],
+        )
+
+    def test_error(self):
+        request = {
+            "action": "update",
+            "image_path": os.path.join(OUT_DIR, "missing.jpg"),
+            "options": {},
+        }
+        response = client.send_request(request, SOCKET_PATH)
+        self.assertEqual(response["status"], "error")
+        self.assertEqual(response["error"], "ValueError")
+
+    def test_executor_jobs(self):
+        executor = self._daemon.get_executor(2)
+        self.assertIs(self._daemon.get_executor(2), executor)
+        self.assertIsNot(self._daemon.get_executor(3), executor)
+        self.assertIsNone(self._daemon.get_executor(1))
+
+    def test_broken_executor(self):
+        executor = self._daemon.get_executor(2)
+        os.kill(executor.submit(os.getpid).result(), signal.SIGKILL)
+        with self.assertRaises(BrokenProcessPool):
+            for _ in range(100):
+                executor.submit(os.getpid).result()
+                time.sleep(0.05)
+
+        image_path = os.path.abspath(os.path.join(ASSETS_DIR, "test.jpg"))
+        request = {"action": "update", "image_path": image_path, "options": {"jobs": 2}}
+        self.assertEqual(client.send_request(request, SOCKET_PATH), {"status": "ok"})
+        self.assertIsNot(self._daemon.get_executor(2), executor)
+
+    def test_already_running(self):
+        with self.assertRaises(daemon.DaemonAlreadyRunning):
+            daemon.Daemon(SOCKET_PATH, get_config_handler()).serve_forever()
+
+    def test_not_running(self):
+        self.assertIsNone(
+            client.send_request(
+                {"action": "preserve"}, os.path.join(OUT_DIR, "missing.sock")
+            )
+        )
+
+
+class TestClient(unittest.TestCase):
+    def setUp(self):
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+        os.makedirs(OUT_DIR)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(CLOSING_SOCKET_PATH)
+        self._server.listen()
+
+    def tearDown(self):
+        self._server.close()
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def test_closed_after_request(self):
+        def accept_and_close():
+            connection, _ = self._server.accept()
+            with connection, connection.makefile("rb") as request_file:
+                request_file.readline()
+
+        thread = threading.Thread(target=accept_and_close)
+        thread.start()
+        response = client.send_request({"action": "preserve"}, CLOSING_SOCKET_PATH)
+        thread.join()
+
+        # The request may have run, so it must not be run again in process
+        self.assertEqual(response["status"], "error")
+        self.assertEqual(response["error"], "ConnectionError")
+
+
+class TestRunRequest(unittest.TestCase):
+    def tearDown(self):
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def test_invalid_last_image(self):
+        config = get_config_handler().get_config()
+        themer = Themer(OUT_DIR, config=config, run_hooks=False, cache_path=OUT_DIR)
+
+        with self.assertRaises(daemon.InvalidLastImage):
+            daemon.run_request(themer, {"action": "preserve"}, config)
+        themer.close()
+
+    def test_options(self):
+        config = get_config_handler().get_config()
+        themer = Themer(OUT_DIR, config=config, run_hooks=False, cache_path=OUT_DIR)
+        image_path = os.path.join(ASSETS_DIR, "test.jpg")
+
+        daemon.run_request(
+            themer,
+            {
+                "action": "generate",
+                "image_path": image_path,
+                "options": {"engine_name": "hue", "jobs": 1},
+            },
+            config,
+        )
+        self.assertEqual(themer.get_engine_name(), "hue")
+        self.assertEqual(themer.get_jobs(), 1)
+        self.assertEqual(themer.get_image_path(), image_path)
+        themer.get_theme(image_path)
+        themer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,9 @@
 import unittest
 import warnings
-from kadai.engine import vibrance, hue, base_engine, color_thief_engine, pastel
+from unittest import mock
+from PIL import Image
+from kadai.engine import vibrance, hue, base_engine, color_thief_engine, pastel, mmcq
+from kadai.engine import kmeans, pillow_engine
 from kadai.utils import color_utils
 
 TEST_IMAGE = "tests/assets/test.jpg"
@@ -62,7 +65,62 @@ class TestColorThiefEngine(TestEngine):
     def test_get_dominant_color(self):
         color = self._engine.get_dominant_color()
         self.assertIsInstance(color, tuple)
-        self.assertEqual(color, (128, 178, 178))
+        self.assertEqual(color, (123, 164, 178))
+
+    def test_image_input(self):
+        image = Image.open(TEST_IMAGE).convert("RGB")
+        image_engine = color_thief_engine.ColorThiefEngine(image)
+        buffer_engine = color_thief_engine.ColorThiefEngine(image.tobytes())
+
+        self.assertEqual(image_engine.generate(), self._engine.generate())
+        self.assertEqual(buffer_engine.generate(), self._engine.generate())
+
+    def test_numpy_quantizer(self):
+        numpy_engine = color_thief_engine.ColorThiefEngine(
+            TEST_IMAGE, quantizer="numpy"
+        )
+        self.assertEqual(numpy_engine.generate(), self._engine.generate())
+        self.assertEqual(
+            numpy_engine.get_dominant_color(), self._engine.get_dominant_color()
+        )
+
+        with self.assertRaises(ValueError):
+            color_thief_engine.ColorThiefEngine(TEST_IMAGE, quantizer="unknown")
+
+
+class TestMMCQ(unittest.TestCase):
+    def test_get_swatches(self):
+        image = Image.open(TEST_IMAGE).convert("RGB")
+        for color_count in (2, 8, 16):
+            for quality in (1, 3, 10):
+                self.assertEqual(
+                    mmcq.get_swatches(image, color_count, quality),
+                    color_thief_engine.get_swatches(image, color_count, quality),
+                )
+
+    def test_get_pixels(self):
+        image = Image.new("RGBA", (4, 1), (10, 20, 30, 255))
+        image.putpixel((1, 0), (255, 255, 255, 255))
+        image.putpixel((2, 0), (10, 20, 30, 0))
+
+        pixels = mmcq.get_pixels(image)
+        self.assertEqual(pixels.tolist(), [[10, 20, 30], [10, 20, 30]])
+        self.assertEqual(len(mmcq.get_pixels(image, 2)), 1)
+
+    def test_get_histo(self):
+        pixels = mmcq.get_pixels(Image.new("RGB", (3, 3), (255, 8, 0)))
+        histo = mmcq.get_histo(pixels)
+
+        self.assertEqual(histo.shape, (32, 32, 32))
+        self.assertEqual(histo[31, 1, 0], 9)
+        self.assertEqual(histo.sum(), 9)
+
+    def test_quantize_errors(self):
+        pixels = mmcq.get_pixels(Image.new("RGB", (3, 3), (255, 8, 0)))
+        with self.assertRaises(ValueError):
+            mmcq.quantize(pixels[:0], 16)
+        with self.assertRaises(ValueError):
+            mmcq.quantize(pixels, 1)
 
 
 class TestHueEngine(TestEngine):
@@ -74,6 +132,18 @@ class TestHueEngine(TestEngine):
         self.assertIsInstance(colors, list)
         self.assertEqual(len(colors), 7)
 
+    def test_quantize_once(self):
+        with mock.patch.object(
+            color_thief_engine.MMCQ,
+            "quantize",
+            wraps=color_thief_engine.MMCQ.quantize,
+        ) as quantize:
+            engine = hue.HueEngine(TEST_IMAGE)
+            engine.get_palette()
+            engine.get_dominant_color()
+
+        self.assertEqual(quantize.call_count, 1)
+
 
 class TestHue_functions(unittest.TestCase):
     def setUp(self):
@@ -144,7 +214,7 @@ class TestPastelEngine(TestEngine):
 
     def test_get_dominant_color(self):
         color = self._engine.get_dominant_color()
-        self.assertEqual(color, (153, 255, 255))
+        self.assertEqual(color, (153, 227, 255))
 
 
 class TestVibranceEngine(TestEngine):
@@ -158,6 +228,78 @@ class TestVibranceEngine(TestEngine):
         self.assertIsInstance(colors, list)
 
 
+class TestPillowEngine(TestEngine):
+    def setUp(self):
+        super().setUp()
+        self._engine = pillow_engine.PillowEngine(TEST_IMAGE)
+
+    def test_generate(self):
+        colors = self._engine.generate()
+        self.assertEqual(len(colors), 7)
+        self.assertIsInstance(colors, list)
+
+    def test_get_dominant_color(self):
+        self.assertEqual(self._engine.get_dominant_color(), (118, 151, 178))
+
+    def test_too_few_colors(self):
+        with self.assertRaises(color_thief_engine.TooFewColors):
+            pillow_engine.PillowEngine("tests/assets/one-color.jpg")
+
+    def test_get_swatches(self):
+        image = Image.new("RGB", (4, 1), (255, 0, 0))
+        image.putpixel((0, 0), (0, 0, 255))
+
+        self.assertEqual(
+            pillow_engine.get_swatches(image), [((255, 0, 0), 3), ((0, 0, 255), 1)]
+        )
+
+
+class TestKMeansEngine(TestEngine):
+    def setUp(self):
+        super().setUp()
+        self._engine = kmeans.KMeansEngine(TEST_IMAGE)
+
+    def test_generate(self):
+        colors = self._engine.generate()
+        self.assertEqual(len(colors), 7)
+        self.assertEqual(colors, kmeans.KMeansEngine(TEST_IMAGE).generate())
+
+    def test_get_palette(self):
+        palette = self._engine.get_palette()
+        self.assertEqual(len(palette["dark"]), 16)
+        self.assertEqual(len(palette["light"]), 16)
+
+    def test_too_few_colors(self):
+        with self.assertRaises(color_thief_engine.TooFewColors):
+            kmeans.KMeansEngine("tests/assets/one-color.jpg")
+
+    def test_options(self):
+        image = Image.open(TEST_IMAGE).convert("RGB")
+        with mock.patch.object(
+            kmeans, "mini_batch_kmeans", wraps=kmeans.mini_batch_kmeans
+        ) as mini_batch_kmeans:
+            kmeans.KMeansEngine(image, kmeans_iterations=3, kmeans_sample_size=500)
+
+        pixels, _, iterations = mini_batch_kmeans.call_args[0]
+        self.assertLessEqual(len(pixels), 500)
+        self.assertEqual(iterations, 3)
+
+
+class TestKMeans_functions(unittest.TestCase):
+    def test_sample_pixels(self):
+        pixels = kmeans.np.arange(300).reshape(100, 3)
+        self.assertEqual(len(kmeans.sample_pixels(pixels, 10)), 10)
+        self.assertEqual(len(kmeans.sample_pixels(pixels, 33)), 25)
+        self.assertEqual(len(kmeans.sample_pixels(pixels, 1000)), 100)
+
+    def test_mini_batch_kmeans(self):
+        pixels = kmeans.np.array(
+            [[0, 0, 0]] * 50 + [[200, 0, 0]] * 50, dtype=kmeans.np.float64
+        )
+        centers = kmeans.mini_batch_kmeans(pixels, cluster_count=2)
+        self.assertEqual(sorted(map(tuple, centers.tolist())), [(0, 0, 0), (200, 0, 0)])
+
+
 class TestVibrance_functions(unittest.TestCase):
     def test_sort_by_vibrance(self):
         sorted_colors = vibrance.sort_by_vibrance(
@@ -169,6 +311,7 @@ class TestVibrance_functions(unittest.TestCase):
     def test_calculate_vibrance(self):
         color_vibrance = vibrance.calculate_vibrance((200, 0, 0))
         self.assertAlmostEqual(color_vibrance, 0.94068627)
+        self.assertEqual(vibrance.calculate_vibrance((0, 0, 0)), float("-inf"))
 
     def test_calculate_vibrance_with_list(self):
         colors = [(200, 0, 0), (100, 100, 100)]
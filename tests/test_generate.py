@@ -2,11 +2,15 @@ import unittest
 import warnings
 import os
 import shutil
+from unittest import mock
 
 from PIL import Image
 
 from kadai import themer
+from kadai.engine import color_thief_engine
 from kadai.config_handler import ConfigHandler
+from kadai import theme_store as theme_stores
+from kadai.theme_index import ThemeIndex
 
 OUT_DIR = "/tmp/github-runner-kadai/"
 ASSETS_DIR = "tests/assets/"
@@ -81,6 +85,14 @@ class TestEngines(unittest.TestCase):
         self._themer.set_user_template_path("/tmp")
         self.assertEqual(self._themer.get_user_template_path(), "/tmp")
 
+    def test_setget_hash_algorithm(self):
+        self._themer.set_hash_algorithm("md5")
+        self.assertEqual(self._themer.get_hash_algorithm(), "md5")
+
+    def test_setget_jobs(self):
+        self._themer.set_jobs(4)
+        self.assertEqual(self._themer.get_jobs(), 4)
+
     def test_setget_user_hooks_path(self):
         self._themer.set_user_hooks_path("/tmp")
         self.assertEqual(self._themer.get_user_hooks_path(), "/tmp")
@@ -89,13 +101,157 @@ class TestEngines(unittest.TestCase):
         warnings.warn("Test not implemented")
 
     def test_generate(self):
-        warnings.warn("Test not implemented")
+        self._themer = themer.Themer(
+            ASSETS_DIR,
+            config=config,
+            override=True,
+            run_hooks=False,
+            out_path=OUT_DIR,
+            cache_path=OUT_DIR,
+            jobs=2,
+        )
+        self._themer.generate()
+
+        theme_store = theme_stores.SqliteThemeStore(OUT_DIR)
+        self.assertEqual(len(theme_store), 4)
+        theme_store.close()
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
 
     def test_update(self):
         warnings.warn("Test not implemented")
 
+    def test_get_random_image(self):
+        image_dir = os.path.join(OUT_DIR, "images")
+        os.makedirs(image_dir)
+        themed_path = os.path.join(image_dir, "test.jpg")
+        unthemed_path = os.path.join(image_dir, "one-color.jpg")
+        shutil.copy2(os.path.join(ASSETS_DIR, "test.jpg"), themed_path)
+        shutil.copy2(os.path.join(ASSETS_DIR, "one-color.jpg"), unthemed_path)
+
+        self._themer = themer.Themer(
+            image_dir,
+            config=config,
+            run_hooks=False,
+            out_path=OUT_DIR,
+            cache_path=OUT_DIR,
+        )
+        self._themer.generate()
+
+        theme_store = theme_stores.SqliteThemeStore(OUT_DIR)
+        theme_store.remove(self._themer.get_image_hash(unthemed_path), "vibrance")
+        theme_store.close()
+
+        with mock.patch.object(self._themer, "get_image_list") as get_image_list:
+            for _ in range(10):
+                self.assertEqual(self._themer.get_random_image(), themed_path)
+        get_image_list.assert_not_called()
+
+        # The listing is out of date, so the directory is scanned again
+        os.remove(themed_path)
+        self.assertEqual(self._themer.get_random_image(), unthemed_path)
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
     def test_get_engine(self):
-        warnings.warn("Test not implemented")
+        self.assertEqual(themer.get_engine("hue").__name__, "HueEngine")
+        self.assertEqual(themer.get_engine("pillow").__name__, "PillowEngine")
+        self.assertEqual(themer.get_engine("kmeans").__name__, "KMeansEngine")
+        self.assertEqual(themer.get_engine("unknown").__name__, "VibranceEngine")
+
+    def test_get_engine_options(self):
+        self._themer.set_kmeans_iterations(5)
+        self._themer.set_kmeans_sample_size(100)
+        self.assertEqual(self._themer.get_kmeans_iterations(), 5)
+        self.assertEqual(self._themer.get_kmeans_sample_size(), 100)
+        self.assertEqual(
+            self._themer.get_engine_options(),
+            {
+                "quantizer": "colorthief",
+                "kmeans_iterations": 5,
+                "kmeans_sample_size": 100,
+            },
+        )
+
+    def test_generate_theme_colors_iter(self):
+        images = [
+            [os.path.join(ASSETS_DIR, "test.txt"), "invalid"],
+            [os.path.join(ASSETS_DIR, "test.jpg"), "valid"],
+        ]
+        results = {
+            filename: result
+            for _, filename, result in themer.generate_theme_colors_iter(
+                images, themer.get_engine("vibrance"), jobs=2
+            )
+        }
+
+        self.assertIsInstance(results["invalid"], Exception)
+        palette, dominant_color = results["valid"]
+        self.assertEqual(len(palette["dark"]), 16)
+        self.assertRegex(dominant_color, r"^#[0-9a-f]{6}$")
+
+    def test_generate_themes_colors(self):
+        image_path = os.path.join(ASSETS_DIR, "test.jpg")
+        engines = {name: themer.get_engine(name) for name in themer.ENGINE_NAMES}
+
+        with mock.patch.object(
+            color_thief_engine,
+            "get_quantizer",
+            wraps=color_thief_engine.get_quantizer,
+        ) as mock_get_quantizer:
+            results, swatches = themer.generate_themes_colors(image_path, engines)
+        self.assertEqual(mock_get_quantizer.call_count, 1)
+        self.assertEqual(sorted(swatches), ["kmeans-50-2048", "mmcq", "pillow"])
+
+        for engine_name, engine in engines.items():
+            self.assertEqual(
+                results[engine_name], themer.generate_theme_colors(image_path, engine)
+            )
+
+        # Cached swatches give the same themes without decoding the image
+        with mock.patch.object(themer, "create_thumbnail") as mock_create_thumbnail:
+            self.assertEqual(
+                themer.generate_themes_colors(image_path, engines, swatches=swatches),
+                (results, swatches),
+            )
+        mock_create_thumbnail.assert_not_called()
+
+    def test_generate_cached_swatches(self):
+        self._themer.set_engine_name("hue")
+        self._themer.generate()
+
+        theme_store = theme_stores.SqliteThemeStore(OUT_DIR)
+        image_hash = self._themer.get_image_hash("tests/assets/test.jpg")
+        self.assertIsNotNone(theme_store.get_swatches(image_hash, "mmcq"))
+        theme_store.close()
+
+        self._themer.set_engine_name("vibrance")
+        self._themer.set_override(True)
+        with mock.patch.object(themer, "create_thumbnail") as mock_create_thumbnail:
+            self._themer.generate()
+        mock_create_thumbnail.assert_not_called()
+
+        theme_store = theme_stores.SqliteThemeStore(OUT_DIR)
+        self.assertTrue(theme_store.contains(image_hash, "vibrance"))
+        theme_store.close()
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def test_generate_all(self):
+        self._themer.set_engine_name("all")
+        self.assertEqual(self._themer.get_engine_names(), list(themer.ENGINE_NAMES))
+        self._themer.generate()
+
+        theme_store = theme_stores.SqliteThemeStore(OUT_DIR)
+        self.assertEqual(
+            theme_store.get_engine_names(
+                self._themer.get_image_hash("tests/assets/test.jpg")
+            ),
+            sorted(themer.ENGINE_NAMES),
+        )
+        theme_store.close()
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
 
     def test_get_template_files(self):
         # Test if can find all 2 template files
@@ -104,17 +260,213 @@ class TestEngines(unittest.TestCase):
         )
         self.assertEqual(len(template_files), 2)
 
+    def test_migrate_legacy_themes(self):
+        legacy_themer = themer.Themer(
+            "tests/assets/test.jpg",
+            config=config,
+            run_hooks=False,
+            out_path=OUT_DIR,
+            cache_path=OUT_DIR,
+            hash_algorithm="md5",
+            jobs=1,
+        )
+        legacy_themer.generate()
+        legacy_palette = legacy_themer.get_color_palette()
+        theme_store = theme_stores.SqliteThemeStore(OUT_DIR)
+        self.assertTrue(theme_store.contains("31084f2c8577234aeb55", "vibrance"))
+
+        self._themer.set_hash_algorithm("blake2b")
+        self.assertEqual(self._themer.get_color_palette(), legacy_palette)
+        self.assertFalse(theme_store.contains("31084f2c8577234aeb55", "vibrance"))
+        theme_store.close()
+
+        # Once every legacy theme is migrated the legacy names are not looked for
+        self.assertFalse(self._themer.has_legacy_themes())
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def test_migrate_untouched_legacy_themes(self):
+        image_dir = os.path.join(OUT_DIR, "images")
+        os.makedirs(image_dir)
+        generated_path = os.path.join(image_dir, "test.jpg")
+        untouched_path = os.path.join(image_dir, "one-color.jpg")
+        shutil.copy2(os.path.join(ASSETS_DIR, "test.jpg"), generated_path)
+        shutil.copy2(os.path.join(ASSETS_DIR, "one-color.jpg"), untouched_path)
+
+        legacy_themer = themer.Themer(
+            image_dir,
+            config=config,
+            run_hooks=False,
+            out_path=OUT_DIR,
+            cache_path=OUT_DIR,
+            hash_algorithm="md5",
+            jobs=1,
+        )
+        legacy_themer.generate()
+        legacy_theme = legacy_themer.get_theme(untouched_path)
+        legacy_themer.close()
+
+        self._themer = themer.Themer(
+            image_dir,
+            config=config,
+            run_hooks=False,
+            out_path=OUT_DIR,
+            cache_path=OUT_DIR,
+            hash_algorithm="blake2b",
+            jobs=1,
+        )
+        self._themer.generate(image_paths=[generated_path])
+        self.assertTrue(self._themer.has_legacy_themes())
+
+        # The theme of an image the generate did not cover is still found
+        with mock.patch.object(themer, "generate_theme_colors_iter") as generate:
+            self.assertEqual(self._themer.get_theme(untouched_path), legacy_theme)
+        generate.assert_not_called()
+        self.assertFalse(self._themer.has_legacy_themes())
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def test_no_legacy_themes(self):
+        self._themer.generate()
+
+        self.assertFalse(self._themer.has_legacy_themes())
+        self.assertFalse(os.path.exists(os.path.join(OUT_DIR, "hashes-md5.json")))
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def test_clean_removed_images(self):
+        library = os.path.join(OUT_DIR, "library")
+        os.makedirs(library)
+        image_path = os.path.join(library, "test.jpg")
+        kept_path = os.path.join(library, "one-color.jpg")
+        shutil.copy(os.path.join(ASSETS_DIR, "test.jpg"), image_path)
+        shutil.copy(os.path.join(ASSETS_DIR, "one-color.jpg"), kept_path)
+        os.utime(image_path, (0, 0))
+        os.utime(kept_path, (0, 0))
+
+        self._themer = themer.Themer(
+            library,
+            config=config,
+            run_hooks=False,
+            out_path=OUT_DIR,
+            cache_path=OUT_DIR,
+            jobs=1,
+        )
+        self._themer.generate()
+        image_hash = self._themer.get_image_hash(image_path)
+        self.assertEqual(self._themer.get_theme(image_path)["wallpaper"], image_path)
+
+        os.remove(image_path)
+        self.assertEqual(self._themer.get_image_list(), [kept_path])
+        theme_store = theme_stores.SqliteThemeStore(OUT_DIR)
+        self.assertFalse(theme_store.contains(image_hash, "vibrance"))
+        theme_store.close()
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def test_empty_directory_keeps_themes(self):
+        library = os.path.join(OUT_DIR, "library")
+        unmounted = os.path.join(OUT_DIR, "unmounted")
+        os.makedirs(library)
+        image_path = os.path.join(library, "test.jpg")
+        shutil.copy(os.path.join(ASSETS_DIR, "test.jpg"), image_path)
+        os.utime(image_path, (0, 0))
+
+        self._themer = themer.Themer(
+            library,
+            config=config,
+            run_hooks=False,
+            out_path=OUT_DIR,
+            cache_path=OUT_DIR,
+            jobs=1,
+        )
+        self._themer.generate()
+        theme = self._themer.get_theme(image_path)
+
+        # Like a drive that is not mounted, the directory is empty for a while
+        os.rename(library, unmounted)
+        os.makedirs(library)
+        with self.assertRaises(FileNotFoundError):
+            self._themer.get_image_list()
+        os.rmdir(library)
+        os.rename(unmounted, library)
+
+        self.assertEqual(self._themer.get_image_list(), [image_path])
+        self.assertEqual(self._themer.get_theme(image_path), theme)
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def test_setget_recursive(self):
+        self._themer.set_recursive(True)
+        self.assertTrue(self._themer.get_recursive())
+
+    def test_setget_theme_store_name(self):
+        self._themer.set_theme_store_name("json")
+        self.assertEqual(self._themer.get_theme_store_name(), "json")
+
+    def test_json_theme_store(self):
+        self._themer.set_theme_store_name("json")
+        self._themer.generate()
+        self.assertTrue(os.listdir(os.path.join(OUT_DIR, "themes")))
+        self.assertEqual(len(self._themer.get_color_palette()), 16)
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def test_setget_quantizer(self):
+        self._themer.set_quantizer("numpy")
+        self.assertEqual(self._themer.get_quantizer(), "numpy")
+
     def test_get_non_generated(self):
-        warnings.warn("Test not implemented")
+        theme_index = ThemeIndex(OUT_DIR)
+        theme_index.add("abc123", "vibrance")
+        images = [["generated.jpg", "abc123"], ["new.jpg", "def456"]]
+
+        self.assertEqual(
+            themer.get_non_generated(images, theme_index, "vibrance"),
+            [["new.jpg", "def456"]],
+        )
+        self.assertEqual(themer.get_non_generated(images, theme_index, "hue"), images)
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
 
     def test_clear_write_data_to_file(self):
-        warnings.warn("Test not implemented")
+        os.makedirs(OUT_DIR, exist_ok=True)
+        file_path = os.path.join(OUT_DIR, "colors.sh")
+
+        self.assertTrue(themer.clear_write_data_to_file(file_path, "a longer line"))
+        self.assertTrue(themer.clear_write_data_to_file(file_path, "short"))
+        self.assertFalse(themer.clear_write_data_to_file(file_path, "short"))
+        with open(file_path, "r", encoding="UTF-8") as file:
+            self.assertEqual(file.read(), "short")
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
 
     def test_clear_write_json_to_file(self):
         warnings.warn("Test not implemented")
 
     def test_create_template_from_palette(self):
-        warnings.warn("Test not implemented")
+        theme_store = theme_stores.SqliteThemeStore(OUT_DIR)
+        palette = {"dark": {"color0": "#000000"}, "light": {"color0": "#ffffff"}}
+        themer.create_template_from_palette(
+            palette, "#123456", "image.jpg", theme_store, "abc123", "vibrance"
+        )
+
+        self.assertEqual(
+            theme_store.get("abc123", "vibrance"),
+            {"colors": palette, "wallpaper": "image.jpg", "primary": "#123456"},
+        )
+        theme_store.close()
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def test_create_thumbnail(self):
+        image = themer.create_thumbnail(os.path.join(ASSETS_DIR, "test.png"))
+        self.assertEqual(image.size, (100, 50))
+        self.assertEqual(image.mode, "RGB")
+
+        # Formats without a reduced decode are resized as they always were
+        with Image.open(os.path.join(ASSETS_DIR, "test.png")) as png_image:
+            resized = png_image.resize((100, 50), Image.Resampling.NEAREST)
+            self.assertEqual(image.tobytes(), resized.convert("RGB").tobytes())
 
     def test_create_tmp_image(self):
         tmp_image_path = os.path.join(OUT_DIR, "test_create_tmp_image.jpg")
@@ -153,6 +505,101 @@ class TestEngines(unittest.TestCase):
     def test_create_file_from_template(self):
         warnings.warn("Test not implemented")
 
+    def test_create_files_from_templates(self):
+        template_dir = os.path.join(OUT_DIR, "templates")
+        out_dir = os.path.join(OUT_DIR, "out")
+        shutil.copytree("examples/templates", template_dir)
+        os.makedirs(os.path.join(template_dir, "broken.base"))
+        os.makedirs(out_dir)
+        colors = {f"color{i}": f"#{i:06x}" for i in range(16)}
+
+        results = themer.create_files_from_templates(
+            template_dir, out_dir, colors, "#ffffff", jobs=4
+        )
+        self.assertEqual(
+            list(results), ["Xdefaults.base", "broken.base", "colors.sh.base"]
+        )
+        self.assertIsInstance(results["broken.base"], IsADirectoryError)
+        self.assertTrue(results["Xdefaults.base"])
+        self.assertTrue(results["colors.sh.base"])
+
+        for template in ("Xdefaults", "colors.sh"):
+            with open(
+                os.path.join(template_dir, template + ".base"), encoding="UTF-8"
+            ) as template_file, open(
+                os.path.join(out_dir, template), encoding="UTF-8"
+            ) as out_file:
+                self.assertEqual(
+                    out_file.read(),
+                    themer.modify_file_with_template(
+                        template_file.read(), colors, "#ffffff"
+                    ),
+                )
+
+        results = themer.create_files_from_templates(
+            template_dir, out_dir, colors, "#ffffff", jobs=4
+        )
+        self.assertFalse(results["Xdefaults.base"])
+        self.assertFalse(results["colors.sh.base"])
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def test_prerender(self):
+        template_dir = os.path.join(OUT_DIR, "templates")
+        shutil.copytree("examples/templates", template_dir)
+        self._themer = themer.Themer(
+            "tests/assets/test.jpg",
+            config=config,
+            run_hooks=False,
+            out_path=OUT_DIR,
+            cache_path=OUT_DIR,
+            user_template_path=template_dir,
+            prerender=True,
+        )
+        self._themer.generate()
+        image_hash = self._themer.get_image_hash("tests/assets/test.jpg")
+        rendered_path = self._themer.get_rendered_theme_path(image_hash)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(rendered_path, "light"))),
+            ["Xdefaults", "colors.sh"],
+        )
+
+        current_path = os.path.join(OUT_DIR, "current")
+        self._themer.update()
+        self.assertEqual(os.readlink(current_path), os.path.join(rendered_path, "dark"))
+        self.assertFalse(os.path.exists(os.path.join(OUT_DIR, "colors.sh")))
+
+        self._themer.set_use_light_theme(True)
+        self._themer.update()
+        self.assertEqual(
+            os.readlink(current_path), os.path.join(rendered_path, "light")
+        )
+
+        # Rendering the linked theme again swaps the link to a new render
+        render_path = os.path.realpath(rendered_path)
+        self._themer.prerender_theme(image_hash, replace=True)
+        self.assertNotEqual(os.path.realpath(rendered_path), render_path)
+        self.assertFalse(os.path.exists(render_path))
+        self.assertTrue(os.path.isfile(os.path.join(current_path, "colors.sh")))
+
+        # Changing a template renders the theme again and drops the old renders
+        with open(
+            os.path.join(template_dir, "colors.sh.base"), "a", encoding="UTF-8"
+        ) as template_file:
+            template_file.write("# [primary]\n")
+        self._themer.update()
+        self.assertNotEqual(
+            self._themer.get_rendered_theme_path(image_hash), rendered_path
+        )
+        self.assertFalse(os.path.exists(rendered_path))
+        with open(os.path.join(current_path, "colors.sh"), encoding="UTF-8") as out:
+            self.assertIn(
+                "# " + self._themer.get_theme("tests/assets/test.jpg")["primary"],
+                out.read(),
+            )
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
 
 if __name__ == "__main__":
     unittest.main()
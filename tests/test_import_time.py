@@ -0,0 +1,89 @@
+import unittest
+import os
+import shutil
+import subprocess
+import sys
+
+OUT_DIR = "/tmp/github-runner-kadai/"
+ASSETS_DIR = "tests/assets/"
+HOME_DIR = os.path.join(OUT_DIR, "home")
+# The modules only needed to generate themes
+GENERATE_MODULES = ("PIL", "numpy", "tqdm", "colorthief", "multiprocessing")
+# The modules -p may import on top of those of the interpreter itself, counting
+# modules rather than timing them does not depend on the load of the machine
+IMPORT_BUDGET = 125
+
+
+def run_kadai(*args: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    env = {
+        key: value for key, value in os.environ.items() if not key.startswith("XDG_")
+    }
+    env["HOME"] = HOME_DIR
+    env["XDG_RUNTIME_DIR"] = os.path.join(HOME_DIR, "run")
+    env["PYTHONPATH"] = os.getcwd()
+
+    return subprocess.run(
+        [sys.executable, *(["-X", "importtime"] if importtime else []), "-m", "kadai"]
+        + list(args),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def get_imports(importtime_output: str) -> set:
+    """The names of the modules imported"""
+    imports = set()
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        imports.add(line.split("|")[-1].strip())
+
+    return imports
+
+
+class TestImportTime(unittest.TestCase):
+    def setUp(self):
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+        shutil.copytree(
+            "examples/templates",
+            os.path.join(HOME_DIR, ".config", "kadai", "templates"),
+        )
+        run_kadai("-i", os.path.join(ASSETS_DIR, "test.jpg"), "--no-daemon")
+
+    def tearDown(self):
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def test_preserve(self):
+        imports = get_imports(run_kadai("-p", "--no-daemon", importtime=True).stderr)
+
+        for name in imports:
+            self.assertNotIn(name.split(".")[0], GENERATE_MODULES)
+
+        interpreter_imports = get_imports(
+            subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", "pass"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stderr
+        )
+        self.assertLessEqual(len(imports - interpreter_imports), IMPORT_BUDGET)
+
+    def test_config_unchanged(self):
+        config_path = os.path.join(HOME_DIR, ".config", "kadai", "config.json")
+        mtime = os.stat(config_path).st_mtime_ns
+
+        run_kadai("-p", "--no-daemon")
+        self.assertEqual(os.stat(config_path).st_mtime_ns, mtime)
+
+    def test_verbose(self):
+        self.assertNotIn("Wrote", run_kadai("-p", "--no-daemon").stderr)
+        self.assertRegex(
+            run_kadai("-p", "-v").stderr, r"Wrote \d+ templates, skipped \d+ unchanged"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import os
+import shutil
+
+from kadai.theme_index import ThemeIndex
+
+OUT_DIR = "/tmp/github-runner-kadai/"
+
+
+class TestThemeIndex(unittest.TestCase):
+    def setUp(self):
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+        self._theme_index = ThemeIndex(OUT_DIR)
+
+    def tearDown(self):
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def write_theme(self, image_hash, engine_name):
+        theme_path = self._theme_index.get_theme_path(image_hash, engine_name)
+        with open(theme_path, "w", encoding="UTF-8") as theme_file:
+            theme_file.write("{}")
+
+    def test_add_remove(self):
+        self.write_theme("abc123", "vibrance")
+        self._theme_index.add("abc123", "vibrance")
+        self.assertTrue(self._theme_index.contains("abc123", "vibrance"))
+        self.assertFalse(self._theme_index.contains("abc123", "hue"))
+
+        self._theme_index.remove("abc123", "vibrance")
+        self.assertFalse(self._theme_index.contains("abc123", "vibrance"))
+
+    def test_persistent(self):
+        self.write_theme("abc123", "pastel_hue")
+        self._theme_index.add("abc123", "pastel_hue")
+
+        theme_index = ThemeIndex(OUT_DIR)
+        self.assertTrue(theme_index.contains("abc123", "pastel_hue"))
+
+    def read_index(self):
+        with open(self._theme_index.get_index_path(), "rb") as index_file:
+            return index_file.read()
+
+    def test_transaction(self):
+        index_data = self.read_index()
+        with self._theme_index.transaction():
+            self.write_theme("abc123", "vibrance")
+            self._theme_index.add("abc123", "vibrance")
+            self.assertEqual(self.read_index(), index_data)
+
+        self.assertTrue(ThemeIndex(OUT_DIR).contains("abc123", "vibrance"))
+
+    def test_rebuild_missing(self):
+        self.write_theme("abc123", "hue")
+        self.write_theme("def456", "pastel_hue")
+        os.remove(self._theme_index.get_index_path())
+
+        theme_index = ThemeIndex(OUT_DIR)
+        self.assertEqual(len(theme_index), 2)
+        self.assertTrue(theme_index.contains("def456", "pastel_hue"))
+
+    def test_rebuild_corrupt(self):
+        self.write_theme("abc123", "hue")
+        self._theme_index.add("abc123", "hue")
+        with open(self._theme_index.get_index_path(), "w", encoding="UTF-8") as index:
+            index.write('{"version": 1, "themes": ')
+
+        self.assertTrue(ThemeIndex(OUT_DIR).contains("abc123", "hue"))
+
+    def test_rebuild_outside_change(self):
+        self._theme_index.add("abc123", "hue")
+        self.write_theme("def456", "hue")
+
+        theme_index = ThemeIndex(OUT_DIR)
+        self.assertTrue(theme_index.contains("def456", "hue"))
+        self.assertFalse(theme_index.contains("abc123", "hue"))
+
+
+if __name__ == "__main__":
+    unittest.main()
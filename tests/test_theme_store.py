@@ -0,0 +1,199 @@
+import unittest
+import json
+import os
+import shutil
+import sqlite3
+from unittest import mock
+
+from kadai import theme_store
+
+OUT_DIR = "/tmp/github-runner-kadai/"
+THEME = {
+    "colors": {"dark": {"color0": "#000000"}, "light": {"color0": "#ffffff"}},
+    "wallpaper": "/path/to/image.jpg",
+    "primary": "#123456",
+}
+SWATCHES = [((12, 34, 56), 100), ((255, 255, 255), 3)]
+
+
+class TestThemeStore(unittest.TestCase):
+    store_name = "sqlite"
+
+    def setUp(self):
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+        self._theme_store = theme_store.get_theme_store(self.store_name, OUT_DIR)
+
+    def tearDown(self):
+        self._theme_store.close()
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def test_put_get(self):
+        self.assertIsNone(self._theme_store.get("abc123", "vibrance"))
+
+        self._theme_store.put("abc123", "vibrance", THEME)
+        self.assertEqual(self._theme_store.get("abc123", "vibrance"), THEME)
+        self.assertTrue(self._theme_store.contains("abc123", "vibrance"))
+        self.assertFalse(self._theme_store.contains("abc123", "hue"))
+        self.assertEqual(len(self._theme_store), 1)
+
+    def test_remove(self):
+        self._theme_store.put("abc123", "vibrance", THEME)
+        self._theme_store.put("abc123", "hue", THEME)
+        self.assertEqual(
+            self._theme_store.get_engine_names("abc123"), ["hue", "vibrance"]
+        )
+
+        self._theme_store.remove("abc123", "vibrance")
+        self.assertEqual(self._theme_store.get_engine_names("abc123"), ["hue"])
+        self._theme_store.remove("abc123", "vibrance")
+
+    def test_rename(self):
+        self._theme_store.put("abc123", "vibrance", THEME)
+
+        self.assertTrue(self._theme_store.rename("abc123", "def456", "vibrance"))
+        self.assertFalse(self._theme_store.contains("abc123", "vibrance"))
+        self.assertEqual(self._theme_store.get("def456", "vibrance"), THEME)
+        self.assertFalse(self._theme_store.rename("abc123", "def456", "vibrance"))
+
+    def test_transaction(self):
+        with self._theme_store.transaction():
+            for i in range(300):
+                self._theme_store.put(f"{i:06x}", "vibrance", THEME)
+            self.assertTrue(self._theme_store.contains("00012b", "vibrance"))
+
+        self.assertEqual(len(self._theme_store), 300)
+
+    def test_persistent(self):
+        self._theme_store.put("abc123", "pastel_hue", THEME)
+        self._theme_store.put_swatches("abc123", "mmcq", SWATCHES)
+        self._theme_store.close()
+
+        self._theme_store = theme_store.get_theme_store(self.store_name, OUT_DIR)
+        self.assertEqual(self._theme_store.get("abc123", "pastel_hue"), THEME)
+        self.assertEqual(self._theme_store.get_swatches("abc123", "mmcq"), SWATCHES)
+
+    def test_swatches(self):
+        self.assertIsNone(self._theme_store.get_swatches("abc123", "mmcq"))
+
+        with self._theme_store.transaction():
+            self._theme_store.put_swatches("abc123", "mmcq", SWATCHES)
+            self._theme_store.put_swatches("abc123", "pillow", SWATCHES[:1])
+        self.assertEqual(self._theme_store.get_swatches("abc123", "mmcq"), SWATCHES)
+        self.assertEqual(
+            self._theme_store.get_swatches("abc123", "pillow"), SWATCHES[:1]
+        )
+
+        self._theme_store.remove_swatches("abc123")
+        self.assertIsNone(self._theme_store.get_swatches("abc123", "mmcq"))
+        self._theme_store.remove_swatches("abc123")
+
+
+class TestJsonThemeStore(TestThemeStore):
+    store_name = "json"
+
+    def test_theme_file(self):
+        self._theme_store.put("abc123", "vibrance", THEME)
+
+        with open(
+            self._theme_store.get_theme_path("abc123", "vibrance"), encoding="UTF-8"
+        ) as theme_file:
+            self.assertEqual(json.load(theme_file), THEME)
+
+
+class TestSqliteThemeStore(TestThemeStore):
+    def test_single_file(self):
+        self._theme_store.put("abc123", "vibrance", THEME)
+        self.assertEqual(os.listdir(OUT_DIR), ["themes.db"])
+
+    def test_import_json(self):
+        self._theme_store.close()
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+        json_store = theme_store.JsonThemeStore(OUT_DIR)
+        json_store.put("abc123", "vibrance", THEME)
+        json_store.put("def456", "hue", THEME)
+        with open(
+            os.path.join(OUT_DIR, "themes", "fed987-vibrance.json"),
+            "w",
+            encoding="UTF-8",
+        ) as theme_file:
+            theme_file.write("{")
+
+        self._theme_store = theme_store.SqliteThemeStore(OUT_DIR)
+        self.assertEqual(len(self._theme_store), 2)
+        self.assertEqual(self._theme_store.get("def456", "hue"), THEME)
+
+    def test_resume_import_json(self):
+        self._theme_store.close()
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+        json_store = theme_store.JsonThemeStore(OUT_DIR)
+        json_store.put("abc123", "vibrance", THEME)
+        json_store.put("def456", "hue", THEME)
+
+        # Interrupted after the first theme was imported
+        json_load = json.load
+        loaded = []
+
+        def interrupted_load(json_data):
+            if loaded:
+                raise KeyboardInterrupt
+            loaded.append(json_data.name)
+            return json_load(json_data)
+
+        with mock.patch("json.load", side_effect=interrupted_load):
+            with self.assertRaises(KeyboardInterrupt):
+                theme_store.SqliteThemeStore(OUT_DIR)
+
+        self._theme_store = theme_store.SqliteThemeStore(OUT_DIR)
+        self.assertEqual(len(self._theme_store), 2)
+
+    def test_rollback(self):
+        with self.assertRaises(KeyError):
+            with self._theme_store.transaction():
+                self._theme_store.put("abc123", "vibrance", THEME)
+                self._theme_store.put_swatches("abc123", "mmcq", SWATCHES)
+                self.assertTrue(self._theme_store.contains("abc123", "vibrance"))
+                raise KeyError("abc123")
+
+        self.assertFalse(self._theme_store.contains("abc123", "vibrance"))
+        self.assertIsNone(self._theme_store.get_swatches("abc123", "mmcq"))
+        self._theme_store.put("abc123", "vibrance", THEME)
+        self.assertEqual(self._theme_store.get("abc123", "vibrance"), THEME)
+
+    def test_upgrade_schema(self):
+        self._theme_store.put("abc123", "vibrance", THEME)
+        connection = sqlite3.connect(self._theme_store.get_database_path())
+        connection.execute("DROP TABLE swatches")
+        connection.execute("PRAGMA user_version = 1")
+        connection.commit()
+        connection.close()
+        self._theme_store.close()
+
+        self._theme_store = theme_store.SqliteThemeStore(OUT_DIR)
+        self.assertEqual(self._theme_store.get("abc123", "vibrance"), THEME)
+        self._theme_store.put_swatches("abc123", "mmcq", SWATCHES)
+        self.assertEqual(self._theme_store.get_swatches("abc123", "mmcq"), SWATCHES)
+
+    def test_upgrade_keeps_newer_themes(self):
+        json_store = theme_store.JsonThemeStore(OUT_DIR)
+        json_store.put("abc123", "vibrance", {**THEME, "primary": "#000000"})
+        json_store.put("def456", "hue", THEME)
+        self._theme_store.put("abc123", "vibrance", THEME)
+        connection = sqlite3.connect(self._theme_store.get_database_path())
+        connection.execute("PRAGMA user_version = 1")
+        connection.commit()
+        connection.close()
+        self._theme_store.close()
+
+        self._theme_store = theme_store.SqliteThemeStore(OUT_DIR)
+        self.assertEqual(self._theme_store.get("abc123", "vibrance"), THEME)
+        self.assertFalse(self._theme_store.contains("def456", "hue"))
+
+    def test_unknown_store(self):
+        with self.assertRaises(ValueError):
+            theme_store.get_theme_store("unknown", OUT_DIR)
+
+
+if __name__ == "__main__":
+    unittest.main()
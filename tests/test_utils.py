@@ -1,5 +1,19 @@
 import unittest
-from kadai.utils import file_utils, color_utils
+import os
+import shutil
+import time
+from unittest import mock
+from kadai.engine import VibranceEngine
+from kadai.utils import (
+    file_utils,
+    color_utils,
+    stat_cache,
+    directory_scanner,
+    template_utils,
+)
+
+OUT_DIR = "/tmp/github-runner-kadai/"
+TEMPLATE_DIR = "examples/templates/"
 
 
 class TestFileUtils(unittest.TestCase):
@@ -11,10 +25,77 @@ class TestFileUtils(unittest.TestCase):
         file_md5 = file_utils.md5_file("tests/assets/test.jpg")
         self.assertEqual(file_md5, "31084f2c8577234aeb5563b95a2786a8")
 
+    def test_hash_file(self):
+        file_hash = file_utils.hash_file("tests/assets/test.jpg", "md5")
+        self.assertEqual(file_hash, "31084f2c8577234aeb5563b95a2786a8")
+
+        file_hash = file_utils.hash_file("tests/assets/test.jpg")
+        self.assertEqual(len(file_hash), 128)
+        self.assertNotEqual(file_hash[:32], "31084f2c8577234aeb5563b95a2786a8")
+
+    def test_hash_files(self):
+        file_paths = ["tests/assets/test.jpg", "tests/assets/test.png"] * 4
+        file_hashes = file_utils.hash_files(file_paths, "md5", jobs=4)
+        self.assertEqual(
+            file_hashes, [file_utils.md5_file(file_path) for file_path in file_paths]
+        )
+
     def test_get_directory_images(self):
         images = file_utils.get_directory_images("tests/assets/")
         self.assertEqual(len(images), 4)
 
+    def test_get_directory_images_cached(self):
+        os.makedirs(OUT_DIR, exist_ok=True)
+        shutil.copy("tests/assets/test.jpg", OUT_DIR)
+        with open(os.path.join(OUT_DIR, "bad.jpg"), "w", encoding="UTF-8") as file:
+            file.write("not an image")
+        for name in ("test.jpg", "bad.jpg"):
+            os.utime(os.path.join(OUT_DIR, name), (0, 0))
+
+        validity_cache = stat_cache.StatCache(os.path.join(OUT_DIR, "images.json"))
+        images = file_utils.get_directory_images(OUT_DIR, validity_cache)
+        self.assertEqual(images, [os.path.abspath(os.path.join(OUT_DIR, "test.jpg"))])
+
+        with mock.patch.object(file_utils, "check_if_image") as check_if_image:
+            self.assertEqual(
+                file_utils.get_directory_images(OUT_DIR, validity_cache), images
+            )
+            check_if_image.assert_not_called()
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def test_write_if_changed(self):
+        os.makedirs(OUT_DIR, exist_ok=True)
+        file_path = os.path.join(OUT_DIR, "colors.sh")
+        link_path = os.path.join(OUT_DIR, "link.sh")
+        os.symlink(file_path, link_path)
+
+        self.assertTrue(file_utils.write_if_changed(link_path, b"first"))
+        self.assertTrue(os.path.islink(link_path))
+        inode = os.stat(file_path).st_ino
+
+        self.assertFalse(file_utils.write_if_changed(file_path, b"first"))
+        self.assertEqual(os.stat(file_path).st_ino, inode)
+
+        self.assertTrue(file_utils.write_if_changed(file_path, b"FIRST"))
+        with open(file_path, "rb") as file:
+            self.assertEqual(file.read(), b"FIRST")
+        self.assertEqual(sorted(os.listdir(OUT_DIR)), ["colors.sh", "link.sh"])
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def test_atomic_symlink(self):
+        os.makedirs(OUT_DIR, exist_ok=True)
+        link_path = os.path.join(OUT_DIR, "current")
+
+        file_utils.atomic_symlink("dark", link_path)
+        self.assertEqual(os.readlink(link_path), "dark")
+        file_utils.atomic_symlink("light", link_path)
+        self.assertEqual(os.readlink(link_path), "light")
+        self.assertEqual(os.listdir(OUT_DIR), ["current"])
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
     def test_get_image_list_one(self):
         images = file_utils.get_image_list("tests/assets/test.jpg")
         self.assertEqual(len(images), 1)
@@ -35,6 +116,213 @@ class TestFileUtils(unittest.TestCase):
         scripts = file_utils.get_hooks(hooks_directory="tests/assets/hooks/")
         self.assertEqual(len(scripts), 1)
 
+    def write_hook(self, hooks_directory, name, script):
+        hook_path = os.path.join(hooks_directory, name)
+        with open(hook_path, "w", encoding="UTF-8") as hook_file:
+            hook_file.write("#!/bin/sh\n" + script + "\n")
+        os.chmod(hook_path, 0o755)
+
+    def test_run_hooks(self):
+        hooks_directory = os.path.join(OUT_DIR, "hooks")
+        os.makedirs(hooks_directory)
+        out_file = os.path.join(OUT_DIR, "out")
+        self.write_hook(
+            hooks_directory, "00-first", f"sleep 0.4; echo $1 >> {out_file}"
+        )
+        self.write_hook(hooks_directory, "00-second", "sleep 0.4")
+        self.write_hook(
+            hooks_directory, "01-fail", f"echo second >> {out_file}; exit 3"
+        )
+        self.write_hook(hooks_directory, "02-hang", "exec sleep 10")
+
+        start = time.perf_counter()
+        statuses = file_utils.run_hooks(
+            hooks_directory=hooks_directory, use_light_theme=True, timeout=0.5
+        )
+        duration = time.perf_counter() - start
+
+        self.assertEqual(
+            statuses, {"00-first": 0, "00-second": 0, "01-fail": 3, "02-hang": None}
+        )
+        # The two 00 hooks ran together and the hanging hook was killed
+        self.assertLess(duration, 1.5)
+        with open(out_file, "r", encoding="UTF-8") as file:
+            self.assertEqual(file.read(), "true\nsecond\n")
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def test_run_hooks_timeout_children(self):
+        hooks_directory = os.path.join(OUT_DIR, "hooks")
+        os.makedirs(hooks_directory)
+        out_file = os.path.join(OUT_DIR, "out")
+        self.write_hook(
+            hooks_directory, "00-spawn", f"(sleep 0.5; echo child >> {out_file}) & wait"
+        )
+
+        statuses = file_utils.run_hooks(hooks_directory=hooks_directory, timeout=0.2)
+        self.assertEqual(statuses, {"00-spawn": None})
+
+        # The child of the hook was killed along with it
+        time.sleep(0.5)
+        self.assertFalse(os.path.exists(out_file))
+
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+
+class TestStatCache(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(OUT_DIR, exist_ok=True)
+        self._cache_path = os.path.join(OUT_DIR, "cache.json")
+        self._file_path = os.path.join(OUT_DIR, "file.txt")
+        self.write_file("first")
+        self._cache = stat_cache.StatCache(self._cache_path)
+
+    def tearDown(self):
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def write_file(self, data, age=60):
+        with open(self._file_path, "w", encoding="UTF-8") as file:
+            file.write(data)
+        mtime = time.time() - age
+        os.utime(self._file_path, (mtime, mtime))
+
+    def test_get_cached(self):
+        compute = mock.Mock(return_value="digest")
+        self.assertEqual(
+            stat_cache.get_cached(self._cache, self._file_path, compute), "digest"
+        )
+        self.assertEqual(
+            stat_cache.get_cached(self._cache, self._file_path, compute), "digest"
+        )
+        self.assertEqual(compute.call_count, 1)
+
+    def test_persistent(self):
+        self._cache.set(self._file_path, "digest")
+        self._cache.save()
+        self.assertEqual(
+            stat_cache.StatCache(self._cache_path).get(self._file_path), "digest"
+        )
+
+    def test_reload_if_changed(self):
+        self.assertFalse(self._cache.reload_if_changed())
+
+        other_cache = stat_cache.StatCache(self._cache_path)
+        other_cache.set(self._file_path, "digest")
+        other_cache.save()
+
+        self.assertTrue(self._cache.reload_if_changed())
+        self.assertEqual(self._cache.get(self._file_path), "digest")
+        self.assertFalse(self._cache.reload_if_changed())
+
+    def test_modified(self):
+        self._cache.set(self._file_path, "digest")
+        self.write_file("second", age=30)
+        self.assertIsNone(self._cache.get(self._file_path))
+
+    def test_replaced(self):
+        self._cache.set(self._file_path, "digest")
+        mtime_ns = os.stat(self._file_path).st_mtime_ns
+
+        # Same size and modification time, but a different file
+        replacement_path = os.path.join(OUT_DIR, "replacement.txt")
+        with open(replacement_path, "w", encoding="UTF-8") as file:
+            file.write("FIRST")
+        os.utime(replacement_path, ns=(mtime_ns, mtime_ns))
+        os.replace(replacement_path, self._file_path)
+
+        self.assertIsNone(self._cache.get(self._file_path))
+
+    def test_peek(self):
+        self.assertIsNone(self._cache.peek(self._file_path))
+        self._cache.set(self._file_path, "digest")
+        self.write_file("second", age=30)
+        self.assertEqual(self._cache.peek(self._file_path), "digest")
+
+    def test_recently_modified(self):
+        self.write_file("second", age=0)
+        self._cache.set(self._file_path, "digest")
+        self.assertIsNone(self._cache.get(self._file_path))
+
+    def test_corrupt(self):
+        with open(self._cache_path, "w", encoding="UTF-8") as file:
+            file.write("{")
+        self.assertEqual(len(stat_cache.StatCache(self._cache_path)), 0)
+
+
+class TestDirectoryScanner(unittest.TestCase):
+    def setUp(self):
+        self._library = os.path.join(OUT_DIR, "library")
+        os.makedirs(os.path.join(self._library, "nested", "deeper"))
+        shutil.copy("tests/assets/test.jpg", self._library)
+        shutil.copy("tests/assets/test.png", os.path.join(self._library, "nested"))
+        shutil.copy(
+            "tests/assets/test.jpeg", os.path.join(self._library, "nested", "deeper")
+        )
+        shutil.copy("tests/assets/test.txt", self._library)
+        self.age_library()
+
+        self._scanner = directory_scanner.DirectoryScanner(
+            os.path.join(OUT_DIR, "library.json")
+        )
+
+    def tearDown(self):
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def age_library(self):
+        # Keep the directories older than the racy window, yet still changing
+        self._mtime = getattr(self, "_mtime", 0) + 1
+        for path, _, _ in os.walk(self._library):
+            os.utime(path, (self._mtime, self._mtime))
+
+    def test_scan(self):
+        images, added, removed = self._scanner.scan(self._library)
+        self.assertEqual(images, [os.path.join(self._library, "test.jpg")])
+        self.assertEqual(added, images)
+        self.assertEqual(removed, [])
+
+        images, added, removed = self._scanner.scan(self._library, recursive=True)
+        self.assertEqual(len(images), 3)
+        self.assertEqual(len(added), 2)
+
+    def test_scan_unchanged(self):
+        images, _, _ = self._scanner.scan(self._library, recursive=True)
+        self._scanner.save()
+
+        scanner = directory_scanner.DirectoryScanner(
+            os.path.join(OUT_DIR, "library.json")
+        )
+        with mock.patch.object(directory_scanner.os, "scandir") as scandir:
+            self.assertEqual(
+                scanner.scan(self._library, recursive=True), (images, [], [])
+            )
+            scandir.assert_not_called()
+
+    def test_scan_changes(self):
+        self._scanner.scan(self._library, recursive=True)
+
+        removed_image = os.path.join(self._library, "nested", "test.png")
+        added_image = os.path.join(self._library, "nested", "deeper", "new.jpg")
+        os.remove(removed_image)
+        shutil.copy("tests/assets/test.jpg", added_image)
+        self.age_library()
+
+        images, added, removed = self._scanner.scan(self._library, recursive=True)
+        self.assertEqual(len(images), 3)
+        self.assertEqual(added, [added_image])
+        self.assertEqual(removed, [removed_image])
+
+    def test_scan_removed_directory(self):
+        self._scanner.scan(self._library, recursive=True)
+        shutil.rmtree(os.path.join(self._library, "nested"))
+        self.age_library()
+
+        images, added, removed = self._scanner.scan(self._library, recursive=True)
+        self.assertEqual(images, [os.path.join(self._library, "test.jpg")])
+        self.assertEqual(len(removed), 2)
+        self.assertEqual(
+            self._scanner.get_cached_images(self._library, recursive=True), images
+        )
+
 
 class TestColorUtils(unittest.TestCase):
     def setUp(self):
@@ -131,5 +419,95 @@ class TestColorUtils(unittest.TestCase):
         self.assertEqual(color, "#7f3f3f")
 
 
+def replace_sequentially(file_data, colors, primary_color):
+    """The replacements modify_file_with_template originally made"""
+    for i in range(len(colors)):
+        file_data = file_data.replace(
+            "[color" + str(i) + "]", str(colors["color" + str(i)])
+        )
+
+    file_data = file_data.replace("[background]", str(colors["color0"]))
+    file_data = file_data.replace("[background_light]", str(colors["color8"]))
+    file_data = file_data.replace("[foreground]", str(colors["color15"]))
+    file_data = file_data.replace("[foreground_dark]", str(colors["color7"]))
+    file_data = file_data.replace("[primary]", str(primary_color))
+
+    return file_data
+
+
+class TestTemplateUtils(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(OUT_DIR, exist_ok=True)
+        engine = VibranceEngine("tests/assets/test.jpg")
+        self._palettes = list(engine.get_palette().values())
+        self._primary_color = color_utils.rgb_to_hex(engine.get_dominant_color())
+
+    def tearDown(self):
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def assertRendersIdentically(self, template_data, colors, primary_color):
+        self.assertEqual(
+            template_utils.render_template(
+                template_utils.compile_template(template_data), colors, primary_color
+            ),
+            replace_sequentially(template_data, colors, primary_color),
+        )
+
+    def test_example_templates(self):
+        for template_name in sorted(os.listdir(TEMPLATE_DIR)):
+            with open(
+                os.path.join(TEMPLATE_DIR, template_name), "r", encoding="UTF-8"
+            ) as template_file:
+                template_data = template_file.read()
+
+            for colors in self._palettes:
+                with self.subTest(template=template_name):
+                    self.assertRendersIdentically(
+                        template_data, colors, self._primary_color
+                    )
+
+    def test_edge_cases(self):
+        template_data = (
+            "[[color1]] [color01] [color16] [color1] [color10] [primary][primary]"
+            " [background_light] [foreground_dark] [Color2] [color 3] [primary"
+        )
+        colors = self._palettes[0]
+        self.assertRendersIdentically(template_data, colors, self._primary_color)
+        self.assertRendersIdentically(
+            template_data, {**colors, "color16": "#123456"}, self._primary_color
+        )
+
+        # Values that are themselves placeholders are replaced again
+        self.assertRendersIdentically(
+            template_data, {**colors, "color1": "[color10]"}, "[background]"
+        )
+
+    def test_join_template(self):
+        template_data = "[color0] [color99] [primary] [other]"
+        self.assertEqual(
+            template_utils.join_template(
+                template_utils.compile_template(template_data)
+            ),
+            template_data,
+        )
+
+    def test_load_template(self):
+        template_path = os.path.join(TEMPLATE_DIR, "colors.sh.base")
+        template_cache = stat_cache.StatCache(os.path.join(OUT_DIR, "templates.json"))
+
+        with mock.patch.object(
+            template_utils,
+            "compile_template",
+            wraps=template_utils.compile_template,
+        ) as compile_template:
+            first = template_utils.load_template(template_path, template_cache)
+            second = template_utils.load_template(template_path, template_cache)
+        self.assertEqual(compile_template.call_count, 1)
+        self.assertEqual(first, second)
+
+        with open(template_path, "r", encoding="UTF-8") as template_file:
+            self.assertEqual(template_utils.join_template(first), template_file.read())
+
+
 if __name__ == "__main__":
     unittest.main()
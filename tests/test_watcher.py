@@ -0,0 +1,122 @@
+import unittest
+import os
+import shutil
+
+from kadai.config_handler import ConfigHandler
+from kadai.themer import Themer
+from kadai.utils import file_utils, inotify
+from kadai.watcher import Watcher
+
+OUT_DIR = "/tmp/github-runner-kadai/"
+ASSETS_DIR = "tests/assets/"
+WATCH_DIR = os.path.join(OUT_DIR, "wallpapers")
+
+config_handler = ConfigHandler()
+config_handler.set_config_file_path(os.path.join(ASSETS_DIR, "config.json"))
+config = config_handler.get_config()
+
+
+def read_asset(name: str) -> bytes:
+    with open(os.path.join(ASSETS_DIR, name), "rb") as asset_file:
+        return asset_file.read()
+
+
+class TestWatcher(unittest.TestCase):
+    use_inotify = False
+
+    def setUp(self):
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+        os.makedirs(WATCH_DIR)
+        self._themer = Themer(
+            WATCH_DIR,
+            config=config,
+            run_hooks=False,
+            out_path=OUT_DIR,
+            cache_path=OUT_DIR,
+            jobs=1,
+        )
+        self._watcher = Watcher(self._themer, 0, 0, self.use_inotify)
+
+    def tearDown(self):
+        self._watcher.close()
+        self._themer.close()
+        shutil.rmtree(OUT_DIR, ignore_errors="FileNotFoundError")
+
+    def check(self):
+        return self._watcher.check(1 if self.use_inotify else 0)
+
+    def write_image(self, image_path: str, data: bytes, mode: str = "wb"):
+        with open(image_path, mode) as image_file:
+            image_file.write(data)
+        # Files modified within the racy window wait until they leave it
+        os.utime(image_path, (0, 0))
+
+    def test_added_removed(self):
+        image_path = os.path.join(WATCH_DIR, "test.jpg")
+        self.write_image(image_path, read_asset("test.jpg"))
+
+        self.assertEqual(self.check(), ([image_path], []))
+        self.assertIn(image_path, self._themer.get_image_list())
+        self.assertEqual(self._themer.get_theme(image_path)["wallpaper"], image_path)
+
+        os.remove(image_path)
+        self.assertEqual(self.check(), ([], [image_path]))
+        with self.assertRaises(file_utils.NoPreGenThemeError):
+            self._themer.get_theme(os.path.join(ASSETS_DIR, "test.jpg"))
+
+    def test_partial_copy(self):
+        image_path = os.path.join(WATCH_DIR, "test.jpg")
+        image_data = read_asset("test.jpg")
+
+        self.write_image(image_path, image_data[:100])
+        self.assertEqual(self.check(), ([], []))
+
+        self.write_image(image_path, image_data[100:], "ab")
+        self.assertEqual(self.check(), ([image_path], []))
+        self.assertIn(image_path, self._themer.get_image_list())
+
+    def test_changed(self):
+        image_path = os.path.join(WATCH_DIR, "test.jpg")
+        self.write_image(image_path, read_asset("test.jpg"))
+        self.check()
+        previous_hash = self._themer.get_image_hash(image_path)
+
+        self.write_image(image_path, read_asset("one-color.jpg"))
+
+        self.assertEqual(self.check(), ([image_path], []))
+        self.assertNotEqual(self._themer.get_image_hash(image_path), previous_hash)
+        self.assertEqual(self._themer.get_theme(image_path)["wallpaper"], image_path)
+        with self.assertRaises(file_utils.NoPreGenThemeError):
+            self._themer.get_theme(os.path.join(ASSETS_DIR, "test.jpg"))
+
+    def test_settle_time(self):
+        self._watcher.close()
+        self._watcher = Watcher(self._themer, 60, 0, self.use_inotify)
+        self.write_image(os.path.join(WATCH_DIR, "test.jpg"), read_asset("test.jpg"))
+
+        self.assertEqual(self.check(), ([], []))
+
+    def test_racy_window(self):
+        image_path = os.path.join(WATCH_DIR, "test.jpg")
+        shutil.copyfile(os.path.join(ASSETS_DIR, "test.jpg"), image_path)
+
+        self.assertEqual(self.check(), ([], []))
+        os.utime(image_path, (0, 0))
+        self.assertEqual(self.check(), ([image_path], []))
+
+    def test_not_directory(self):
+        self._themer.set_image_path(os.path.join(ASSETS_DIR, "test.jpg"))
+        with self.assertRaises(NotADirectoryError):
+            Watcher(self._themer)
+
+
+@unittest.skipIf(inotify.get_inotify() is None, "inotify is not available")
+class TestInotifyWatcher(TestWatcher):
+    use_inotify = True
+
+    def test_uses_inotify(self):
+        self.assertTrue(self._watcher.uses_inotify())
+
+
+if __name__ == "__main__":
+    unittest.main()